@@ -1,21 +1,69 @@
 import sqlite3
+import inspect
 import functools
-from datetime import datetime
+import time
+
+import query_profiler
+
+def _query_and_params(args, kwargs):
+    """Find the query and its parameters in a call's arguments"""
+    # Look for query in kwargs first
+    query = kwargs.get('query')
+    params = kwargs.get('params', ())
+    if not query and args:
+        # Look for query in positional arguments
+        query = args[0] if args and isinstance(args[0], str) else None
+        if query and len(args) > 1 and isinstance(args[1], (tuple, list, dict)):
+            params = args[1]
+    return query, params
+
+def log_queries(func=None, *, profiler=None):
+    """Decorator that profiles the SQL query a function runs
+
+    Records wall time, rows returned and the query fingerprint in the
+    shared query_profiler.profiler (or the given profiler) for a sample of
+    calls, and always for calls over its slow-query threshold, together
+    with their EXPLAIN QUERY PLAN (read in a background thread, off the
+    timed call). See profiler.report() and
+    query_profiler.start_log_writer() for the output. Async functions
+    are profiled into the same statistics.
+    """
+    if func is None:
+        return lambda func: log_queries(func, profiler=profiler)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            # Same as wrapper below
+            query, params = _query_and_params(args, kwargs)
+            if not query:
+                return await func(*args, **kwargs)
+            
+            started = time.perf_counter()
+            result = await func(*args, **kwargs)
+            elapsed = time.perf_counter() - started
+            
+            active = profiler or query_profiler.profiler
+            if active.should_record(elapsed):
+                active.record(query, elapsed, query_profiler.row_count(result), params)
+            return result
+        return async_wrapper
 
-def log_queries(func):
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        # Look for query in kwargs first
-        query = kwargs.get('query')
-        if not query and args:
-            # Look for query in positional arguments
-            query = args[0] if args and isinstance(args[0], str) else None
+        query, params = _query_and_params(args, kwargs)
+        
+        if not query:
+            return func(*args, **kwargs)
         
-        if query:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            print(f"[{timestamp}] Executing SQL Query: {query}")
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - started
         
-        return func(*args, **kwargs)
+        active = profiler or query_profiler.profiler
+        if active.should_record(elapsed):
+            active.record(query, elapsed, query_profiler.row_count(result), params)
+        return result
     return wrapper
 
 @log_queries
@@ -1,20 +1,30 @@
-import sqlite3
+import inspect
 import functools
 
+import connection_pool
+
 def with_db_connection(func):
-    """Decorator that automatically handles database connections"""
+    """Decorator that automatically handles database connections
+
+    Connections are borrowed from a shared pool and reset when returned,
+    instead of being opened and closed around every call; see
+    connection_pool.pool_stats() for reuse statistics. Async functions
+    are given an aiosqlite connection.
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            # Coroutines get an aiosqlite connection instead
+            async with connection_pool.connect_async(connection_pool.DATABASE) as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        # Open database connection
-        conn = sqlite3.connect('users.db')
-        
-        try:
+        # Borrow a database connection from the pool
+        with connection_pool.get_pool(connection_pool.DATABASE).connection() as conn:
             # Call the original function with the connection as first argument
-            result = func(conn, *args, **kwargs)
-            return result
-        finally:
-            # Always close the connection
-            conn.close()
+            return func(conn, *args, **kwargs)
     
     return wrapper
 
@@ -1,27 +1,326 @@
+import time
+import queue
+import asyncio
 import sqlite3
+import inspect
+import operator
 import functools
+import itertools
+import threading
+import concurrent.futures
+from concurrent.futures import Future
+
+import cache_engine
+import connection_pool
 
 def with_db_connection(func):
-    """Decorator that automatically handles database connections"""
+    """Decorator that automatically handles database connections
+
+    Connections are borrowed from a shared pool and reset when returned,
+    instead of being opened and closed around every call; see
+    connection_pool.pool_stats() for reuse statistics. Async functions
+    are given an aiosqlite connection.
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            # Coroutines get an aiosqlite connection instead
+            async with connection_pool.connect_async(connection_pool.DATABASE) as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        # Open database connection
-        conn = sqlite3.connect('users.db')
-        
-        try:
+        # Borrow a database connection from the pool
+        with connection_pool.get_pool(connection_pool.DATABASE).connection() as conn:
             # Call the original function with the connection as first argument
-            result = func(conn, *args, **kwargs)
-            return result
-        finally:
-            # Always close the connection
-            conn.close()
+            return func(conn, *args, **kwargs)
     
     return wrapper
 
-def transactional(func):
-    """Decorator that manages database transactions"""
+def invalidate_written_tables(statements):
+    """Drop the cached query results that read a table the statements wrote"""
+    written = set()
+    for statement in statements:
+        written.update(cache_engine.tables_written(statement))
+    cache_engine.invalidate_tables(written)
+
+class StatementRecorder:
+    """Stands in for the connection while a batched write function runs
+
+    execute and executemany (on the recorder or on its cursor()) only
+    record the statement; it runs later as part of a group commit.
+    Anything else, such as fetching rows, is unavailable because nothing
+    has executed yet.
+    """
+
+    def __init__(self):
+        self.statements = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=()):
+        self.statements.append((sql, params))
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        for params in seq_of_params:
+            self.execute(sql, params)
+        return self
+
+    def __getattr__(self, name):
+        raise TypeError(f"{name} is not available in a batched transaction, "
+                        "which may only execute writes")
+
+class AsyncStatementRecorder(StatementRecorder):
+    """StatementRecorder for async functions: cursor() and execute are awaited"""
+
+    async def cursor(self):
+        return self
+
+    async def execute(self, sql, params=()):
+        return StatementRecorder.execute(self, sql, params)
+
+    async def executemany(self, sql, seq_of_params):
+        for params in seq_of_params:
+            StatementRecorder.execute(self, sql, params)
+        return self
+
+class _PendingWrite:
+    __slots__ = ("statements", "result", "future", "queued_at")
+
+    def __init__(self, statements, result):
+        self.statements = statements
+        self.result = result
+        self.future = Future()
+        self.queued_at = time.monotonic()
+
+    @property
+    def signature(self):
+        return tuple(sql for sql, _ in self.statements)
+
+class GroupCommitter:
+    """Runs queued writes from many callers in shared transactions
+
+    A background thread collects writes until max_batch are waiting or
+    the oldest has waited max_delay seconds, then runs them all in one
+    transaction, so one commit (and fsync) covers the whole batch. Writes
+    run in submission order; consecutive single-statement writes with the
+    same statement go through executemany together, and every other write
+    runs its statements in sequence inside its own savepoint. If a group
+    fails, its writes are retried one by one inside savepoints, so only
+    the failing callers see the exception.
+    """
+
+    def __init__(self, database=connection_pool.DATABASE, max_batch=100, max_delay=0.005):
+        self.database = database
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {"batches": 0, "writes": 0, "grouped_writes": 0,
+                       "fallbacks": 0, "failed_commits": 0}
+
+    def submit(self, statements, result=None):
+        """
+        Queue a caller's statements for the next group commit
+
+        Args:
+            statements (list): (sql, params) pairs to run in order
+            result: Value the future resolves to once committed
+
+        Returns:
+            Future: Resolves to result after the commit, or to the error
+            that made this caller's statements fail
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+        pending = _PendingWrite(statements, result)
+        self._queue.put(pending)
+        return pending.future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = batch[0].queued_at + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._flush(batch)
+            except Exception:
+                # Every future is already resolved; keep serving the queue
+                pass
+
+    def _flush(self, batch):
+        # Writes cancelled while queued (e.g. a timed-out await) are dropped
+        batch = [pending for pending in batch
+                 if pending.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            committed = self._commit(batch)
+        except BaseException as e:
+            self._stats["failed_commits"] += 1
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        self._stats["batches"] += 1
+        self._stats["writes"] += len(committed)
+        try:
+            invalidate_written_tables(sql for pending in committed for sql in pending.signature)
+        finally:
+            for pending in committed:
+                pending.future.set_result(pending.result)
+
+    def _commit(self, batch):
+        """Run the batch in one transaction; return the writes committed"""
+        committed = []
+        with connection_pool.get_pool(self.database).connection() as conn:
+            try:
+                conn.execute("BEGIN")
+                # Only consecutive writes are grouped, so writes still run
+                # in the order they were submitted
+                for signature, writes in itertools.groupby(
+                        batch, key=operator.attrgetter("signature")):
+                    committed += self._apply_group(conn, signature, list(writes))
+                conn.commit()
+            except BaseException:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+        return committed
+
+    def _apply_group(self, conn, signature, writes):
+        """Run writes sharing the same statements; return those that succeeded"""
+        # executemany runs one statement for every caller, so only writes
+        # of a single statement can share it; with more, a later statement
+        # of one caller would run after earlier ones of the next caller
+        if len(writes) > 1 and len(signature) == 1:
+            conn.execute("SAVEPOINT group_write")
+            try:
+                for index, sql in enumerate(signature):
+                    conn.executemany(sql, [pending.statements[index][1] for pending in writes])
+                conn.execute("RELEASE group_write")
+                self._stats["grouped_writes"] += len(writes)
+                return writes
+            except sqlite3.Error:
+                # Find out which callers' writes fail by running them singly
+                conn.execute("ROLLBACK TO group_write")
+                conn.execute("RELEASE group_write")
+                self._stats["fallbacks"] += 1
+
+        succeeded = []
+        for pending in writes:
+            conn.execute("SAVEPOINT single_write")
+            try:
+                for sql, params in pending.statements:
+                    conn.execute(sql, params)
+            except sqlite3.Error as e:
+                conn.execute("ROLLBACK TO single_write")
+                pending.future.set_exception(e)
+            else:
+                succeeded.append(pending)
+            conn.execute("RELEASE single_write")
+        return succeeded
+
+    def stats(self):
+        """Return batch, write, grouping and fallback counters"""
+        stats = dict(self._stats, queued=self._queue.qsize())
+        stats["mean_batch"] = stats["writes"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+# Shared by every batched transactional function unless given its own
+group_committer = GroupCommitter()
+
+def transactional(func=None, *, batch=False, committer=None, timeout=30.0):
+    """Decorator that manages database transactions
+
+    After a successful commit, cached query results that read any table
+    the transaction wrote are invalidated in every query cache.
+
+    With batch=True the function is run against a StatementRecorder and
+    its writes are queued on a GroupCommitter (group_committer unless
+    committer is given), which commits many callers' writes together;
+    each call blocks until its writes are committed and then returns the
+    function's result, or raises its own error. A call still waiting
+    after timeout seconds raises TimeoutError; its writes are dropped if
+    they are still queued, but may commit if their batch already started. Batched functions supply their own connection (no
+    with_db_connection) and may only write.
+
+    Async functions get the same behaviour on an aiosqlite connection;
+    batched ones await their group commit without blocking the loop.
+    """
+    if func is None:
+        return lambda func: transactional(func, batch=batch, committer=committer,
+                                          timeout=timeout)
+
+    if batch and inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_batched(*args, **kwargs):
+            recorder = AsyncStatementRecorder()
+            result = await func(recorder, *args, **kwargs)
+            if not recorder.statements:
+                return result
+            future = (committer or group_committer).submit(recorder.statements, result)
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        return async_batched
+
+    if batch:
+        @functools.wraps(func)
+        def batched(*args, **kwargs):
+            recorder = StatementRecorder()
+            result = func(recorder, *args, **kwargs)
+            if not recorder.statements:
+                return result
+            future = (committer or group_committer).submit(recorder.statements, result)
+            try:
+                return future.result(timeout)
+            except concurrent.futures.TimeoutError:
+                # Drop the writes if they have not started yet
+                future.cancel()
+                raise
+        return batched
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(conn, *args, **kwargs):
+            # Same as wrapper below, on an aiosqlite connection
+            statements = []
+            await conn.set_trace_callback(statements.append)
+            try:
+                await conn.execute("BEGIN")
+                result = await func(conn, *args, **kwargs)
+                await conn.commit()
+            except BaseException as e:
+                # Cancellation too, or the connection keeps the open transaction
+                await conn.rollback()
+                raise e
+            finally:
+                await conn.set_trace_callback(None)
+            invalidate_written_tables(statements)
+            return result
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(conn, *args, **kwargs):
+        # Record every statement so the tables written are known at commit
+        statements = []
+        conn.set_trace_callback(statements.append)
         try:
             # Start transaction by ensuring autocommit is off
             conn.execute("BEGIN")
@@ -31,12 +330,17 @@ def transactional(func):
             
             # If no exception occurred, commit the transaction
             conn.commit()
-            return result
             
         except Exception as e:
             # If an exception occurred, rollback the transaction
             conn.rollback()
             raise e  # Re-raise the exception
+        finally:
+            conn.set_trace_callback(None)
+        
+        # Drop only the cached results the committed writes made stale
+        invalidate_written_tables(statements)
+        return result
     
     return wrapper
 
@@ -46,5 +350,10 @@ def update_user_email(conn, user_id, new_email):
     cursor = conn.cursor()
     cursor.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
 
+@transactional(batch=True)
+def update_user_email_batched(conn, user_id, new_email):
+    cursor = conn.cursor()
+    cursor.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
+
 # Update user's email with automatic transaction handling
 update_user_email(user_id=1, new_email='Crawford_Cartwright@hotmail.com')
@@ -1 +1,220 @@
+import time
+import random
+import sqlite3
+import functools
+import threading
+from collections import deque
 
+import connection_pool
+
+def with_db_connection(func):
+    """Decorator that automatically handles database connections
+
+    Connections are borrowed from a shared pool and reset when returned,
+    instead of being opened and closed around every call; see
+    connection_pool.pool_stats() for reuse statistics.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # Borrow a database connection from the pool
+        with connection_pool.get_pool(connection_pool.DATABASE).connection() as conn:
+            # Call the original function with the connection as first argument
+            return func(conn, *args, **kwargs)
+
+    return wrapper
+
+# SQLite result codes for a busy or locked database
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+# SQLite's messages for those codes, for errors raised without a code
+TRANSIENT_MESSAGES = ('database is locked', 'database table is locked')
+
+def is_transient(error):
+    """Return True for errors worth retrying: a busy or locked database
+
+    A PoolTimeoutError is not one: the pool being exhausted says nothing
+    about the database, and retrying would only add to the queue.
+    """
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        # Extended codes keep the primary code in the low byte
+        return code & 0xFF in (SQLITE_BUSY, SQLITE_LOCKED)
+    return str(error).lower().startswith(TRANSIENT_MESSAGES)
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the database while the circuit is open"""
+
+class CircuitBreaker:
+    """Fail fast once too many recent attempts hit transient errors
+
+    Closed: calls go through and their outcomes are kept for window
+    seconds. Once at least min_calls were seen and the share of failures
+    reaches failure_rate, the circuit opens and calls raise
+    CircuitOpenError for reset_timeout seconds. Then a single trial call
+    is let through (half-open): success closes the circuit, failure opens
+    it again. Only transient failures and real successes are outcomes;
+    an attempt ending any other way is released without one.
+    """
+
+    def __init__(self, failure_rate=0.5, min_calls=10, window=30.0, reset_timeout=10.0):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.opened = 0
+        self._outcomes = deque()  # (time, failed)
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            _, failed = self._outcomes.popleft()
+            self._failures -= failed
+
+    def allow(self):
+        """Return True if a call may go ahead now"""
+        with self._lock:
+            if self.state == 'open':
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = 'half-open'
+                self._trial_running = False
+            if self.state == 'half-open':
+                if self._trial_running:
+                    return False
+                self._trial_running = True
+            return True
+
+    def record(self, failed):
+        """Record the outcome of an attempt that was allowed"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == 'half-open':
+                self._trial_running = False
+                if failed:
+                    self._open(now)
+                else:
+                    self.state = 'closed'
+                    self._outcomes.clear()
+                    self._failures = 0
+                return
+            self._outcomes.append((now, failed))
+            self._failures += failed
+            self._trim(now)
+            calls = len(self._outcomes)
+            if calls >= self.min_calls and self._failures / calls >= self.failure_rate:
+                self._open(now)
+
+    def release(self):
+        """End an allowed attempt that had no outcome, freeing the trial slot"""
+        with self._lock:
+            if self.state == 'half-open':
+                self._trial_running = False
+
+    def _open(self, now):
+        self.state = 'open'
+        self.opened += 1
+        self._opened_at = now
+        self._outcomes.clear()
+        self._failures = 0
+
+class RetryMetrics:
+    """Counters for one retrying function"""
+
+    def __init__(self):
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.gave_up = 0
+        self.short_circuited = 0
+        self.backoff_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self):
+        with self._lock:
+            return {name: value for name, value in vars(self).items()
+                    if not name.startswith('_')}
+
+def retry_on_failure(retries=3, delay=1, max_delay=30, deadline=None, jitter=True,
+                     classify=is_transient, breaker=None):
+    """Decorator that retries a function when it hits a transient database error
+
+    Waits delay * 2 ** attempt seconds (capped at max_delay, and drawn
+    uniformly below that with jitter) between attempts, gives up after
+    retries retries or once the next wait would pass deadline seconds
+    from the first attempt, and re-raises other errors immediately. A
+    CircuitBreaker (one per decorated function unless one is shared)
+    makes calls fail fast with CircuitOpenError while the database keeps
+    failing. Works on either side of with_db_connection; below it an
+    open transaction is rolled back before the retry. The wrapper exposes
+    .metrics (RetryMetrics) and .breaker.
+    """
+    def decorator(func):
+        metrics = RetryMetrics()
+        circuit = breaker if breaker is not None else CircuitBreaker()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            metrics.add(calls=1)
+            started = time.monotonic()
+            attempt = 0
+            while True:
+                if not circuit.allow():
+                    metrics.add(short_circuited=1)
+                    raise CircuitOpenError(f"Circuit open for {func.__name__}")
+                try:
+                    result = func(*args, **kwargs)
+                except BaseException as e:
+                    if not isinstance(e, Exception) or not classify(e):
+                        # Says nothing about the database's health, and an
+                        # interrupted trial must not keep the circuit shut
+                        circuit.release()
+                        raise
+                    circuit.record(True)
+                    metrics.add(failures=1)
+
+                    # Exponential backoff with full jitter
+                    wait = min(max_delay, delay * 2 ** attempt)
+                    if jitter:
+                        wait = random.uniform(0, wait)
+                    out_of_time = (deadline is not None
+                                   and time.monotonic() - started + wait > deadline)
+                    if attempt >= retries or out_of_time:
+                        metrics.add(gave_up=1)
+                        raise
+
+                    # Start the next attempt from a clean transaction
+                    if args and isinstance(args[0], sqlite3.Connection) and args[0].in_transaction:
+                        args[0].rollback()
+                    time.sleep(wait)
+                    attempt += 1
+                    metrics.add(retries=1, backoff_seconds=wait)
+                    continue
+                circuit.record(False)
+                return result
+
+        wrapper.metrics = metrics
+        wrapper.breaker = circuit
+        return wrapper
+    return decorator
+
+@with_db_connection
+@retry_on_failure(retries=3, delay=1)
+def fetch_users_with_retry(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM users")
+    return cursor.fetchall()
+
+# Attempt to fetch users with automatic retry on failure
+users = fetch_users_with_retry()
+print(users)
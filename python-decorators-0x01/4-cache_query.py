@@ -1,50 +1,118 @@
 import time
-import sqlite3
+import inspect
 import functools
 
+import cache_engine
+import connection_pool
+
 def with_db_connection(func):
-    """Decorator that automatically handles database connections"""
+    """Decorator that automatically handles database connections
+
+    Connections are borrowed from a shared pool and reset when returned,
+    instead of being opened and closed around every call; see
+    connection_pool.pool_stats() for reuse statistics. Async functions
+    are given an aiosqlite connection.
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            # Coroutines get an aiosqlite connection instead
+            async with connection_pool.connect_async(connection_pool.DATABASE) as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        # Open database connection
-        conn = sqlite3.connect('users.db')
-        
-        try:
+        # Borrow a database connection from the pool
+        with connection_pool.get_pool(connection_pool.DATABASE).connection() as conn:
             # Call the original function with the connection as first argument
-            result = func(conn, *args, **kwargs)
-            return result
-        finally:
-            # Always close the connection
-            conn.close()
+            return func(conn, *args, **kwargs)
     
     return wrapper
 
-query_cache = {}
+query_cache = cache_engine.query_cache
+
+def _query_and_params(args, kwargs):
+    """Find the query (after the connection) and the remaining arguments"""
+    if len(args) > 1 and isinstance(args[1], str):
+        return args[1], (args[2:], kwargs)
+    if 'query' in kwargs:
+        return kwargs['query'], (args[1:], {k: v for k, v in kwargs.items() if k != 'query'})
+    return None, ()
+
+def cache_query(func=None, *, ttl=None, cache=None, negative_ttl=None, error_ttl=None):
+    """Decorator that caches query results based on the SQL query and its parameters
+
+    Can be used bare (@cache_query) or with options
+    (@cache_query(ttl=60, cache=QueryCache(max_entries=100))). Results
+    expire after ttl seconds and the cache evicts least recently used
+    entries beyond its entry and byte limits. Entries are tagged with the
+    tables the query reads, so transactional writes to those tables drop them.
+
+    Concurrent misses on the same query are coalesced into one execution
+    (counted as "coalesced" in the cache stats). Empty results can be kept
+    for a shorter negative_ttl, and errors cached for error_ttl seconds.
+
+    Setting query_cache.disk = cache_engine.DiskCache() adds a
+    persistent tier that survives restarts and is ignored as soon as the
+    database file changes. Async functions share the same cache, and
+    their coalesced misses wait without blocking the event loop.
+    """
+    if func is None:
+        return lambda func: cache_query(func, ttl=ttl, cache=cache,
+                                        negative_ttl=negative_ttl, error_ttl=error_ttl)
+    store = cache if cache is not None else query_cache
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            # Same as wrapper below, awaiting the query and any coalesced
+            # miss on the event loop
+            query, params = _query_and_params(args, kwargs)
+            if not query:
+                return await func(*args, **kwargs)
+            executed = False
+            
+            def execute():
+                nonlocal executed
+                executed = True
+                return func(*args, **kwargs)
+            
+            key = cache_engine.make_key(query, params)
+            result = await store.load_async(key, execute, ttl, cache_engine.tables_read(query),
+                                            negative_ttl, error_ttl)
+            if executed:
+                print(f"Caching result for query: {query}")
+            else:
+                print(f"Cache hit for query: {query}")
+            return result
+        return async_wrapper
 
-def cache_query(func):
-    """Decorator that caches query results based on the SQL query string"""
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         # Extract query from args or kwargs to use as cache key
-        query = None
-        if len(args) > 1 and isinstance(args[1], str):
-            query = args[1]
-        elif 'query' in kwargs:
-            query = kwargs['query']
+        query, params = _query_and_params(args, kwargs)
         
-        # If query is found and cached, return cached result
-        if query and query in query_cache:
-            print(f"Cache hit for query: {query}")
-            return query_cache[query]
+        # Without a query there is nothing to key on
+        if not query:
+            return func(*args, **kwargs)
         
-        # If not cached, execute the function
-        result = func(*args, **kwargs)
+        # Return the cached result, or execute the function once for all
+        # concurrent callers and cache its result
+        executed = False
         
-        # Cache the result if we have a query
-        if query:
-            print(f"Caching result for query: {query}")
-            query_cache[query] = result
+        def execute():
+            nonlocal executed
+            executed = True
+            return func(*args, **kwargs)
         
+        key = cache_engine.make_key(query, params)
+        result = store.load(key, execute, ttl, cache_engine.tables_read(query),
+                            negative_ttl, error_ttl)
+        if executed:
+            print(f"Caching result for query: {query}")
+        else:
+            print(f"Cache hit for query: {query}")
         return result
     
     return wrapper
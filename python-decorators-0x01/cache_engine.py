@@ -0,0 +1,813 @@
+"""
+Bounded query result cache shared by the cache_query decorators
+
+Entries are keyed on the normalized SQL text plus the bound parameters,
+expire after a time-to-live and are evicted least recently used first
+once the cache holds too many entries or too many (approximate) bytes.
+Each entry is tagged with the tables its query reads, so a committed
+write can drop exactly the results it made stale. Concurrent misses on
+the same key are coalesced: one caller runs the query and the others
+wait for its result. An optional DiskCache tier keeps results across
+restarts for as long as the database file is unchanged.
+"""
+
+import asyncio
+import copy
+import functools
+import hashlib
+import os
+import pickle
+import re
+import sqlite3
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import connection_pool
+
+# Single-quoted SQL literals ('' is an escaped quote inside one)
+_LITERAL = re.compile(r"('(?:[^']|'')*')")
+# Anything quoted: literals plus "..." and `...` (identifiers in standard
+# SQL and MySQL, but string literals in some modes and case-sensitive
+# either way)
+_QUOTED = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|`(?:[^`]|``)*`)""")
+_WHITESPACE = re.compile(r"\s+")
+_IDENTIFIER = r'[`"\[]?([\w.]+)[`"\]]?'
+_FROM = re.compile(r"\bfrom\b", re.IGNORECASE)
+_JOIN_TABLES = re.compile(r"\bjoin\s+" + _IDENTIFIER, re.IGNORECASE)
+# One entry of a FROM list: table [[AS] alias] [,]
+_TABLE_REF = re.compile(r"\s*" + _IDENTIFIER + r"(?:\s+(?:as\s+)?(\w+))?\s*(,)?",
+                        re.IGNORECASE)
+# Words that end a FROM entry rather than name its alias
+_CLAUSE_WORDS = frozenset(
+    "where join inner left right full outer cross natural on using group order "
+    "limit union having window except intersect".split())
+_WRITE_TABLES = re.compile(
+    r"\b(?:insert(?:\s+or\s+\w+)?\s+into|replace\s+into|update(?:\s+or\s+\w+)?"
+    r"|delete\s+from)\s+" + _IDENTIFIER, re.IGNORECASE)
+
+# Tag for queries whose tables could not be parsed: any write drops them
+ALL_TABLES = "*"
+
+# Returned by QueryCache.get on a miss, since None is a valid result
+MISSING = object()
+
+
+def normalize_sql(query):
+    """Collapse whitespace and case outside quoted strings and identifiers"""
+    parts = _QUOTED.split(query)
+    for index in range(0, len(parts), 2):
+        parts[index] = _WHITESPACE.sub(" ", parts[index]).lower()
+    return "".join(parts).strip().rstrip(";").rstrip()
+
+
+def _from_list(text, position):
+    """
+    Yield the table names of the comma-separated FROM list at position
+
+    Yields ALL_TABLES when an entry after a comma is not a plain table
+    name (a subquery, say), since later entries cannot be told apart.
+    """
+    while True:
+        match = _TABLE_REF.match(text, position)
+        if match is None:
+            if position != 0 and text[position - 1] == ",":
+                yield ALL_TABLES
+            return
+        yield match.group(1)
+        alias = match.group(2)
+        if not match.group(3) or (alias and alias.lower() in _CLAUSE_WORDS):
+            return
+        position = match.end()
+
+
+def _table_set(names):
+    """Lower-case names without their schema, or {ALL_TABLES} if none"""
+    names = {name.split(".")[-1].lower() for name in names}
+    return frozenset(names) or frozenset([ALL_TABLES])
+
+
+def tables_read(query):
+    """
+    Tables named after FROM (every one of a comma-separated list) or
+    JOIN, or {ALL_TABLES} if none are found
+    """
+    names = set()
+    for part in _LITERAL.split(query)[::2]:
+        names.update(match.group(1) for match in _JOIN_TABLES.finditer(part))
+        for match in _FROM.finditer(part):
+            names.update(_from_list(part, match.end()))
+    return _table_set(names)
+
+
+def tables_written(query):
+    """Tables an INSERT, REPLACE, UPDATE or DELETE writes, or an empty set"""
+    names = {match.group(1) for part in _LITERAL.split(query)[::2]
+             for match in _WRITE_TABLES.finditer(part)}
+    return _table_set(names) if names else frozenset()
+
+
+def _freeze(value):
+    """Turn parameters into something hashable"""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        frozen = tuple(_freeze(item) for item in value)
+        return tuple(sorted(frozen, key=repr)) if isinstance(value, (set, frozenset)) else frozen
+    return value
+
+
+def make_key(query, params=()):
+    """Build a cache key from a query and its parameters"""
+    return normalize_sql(query), _freeze(params)
+
+
+def approximate_size(value):
+    """Estimate the memory held by a result (rows of tuples, dicts, strings)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approximate_size(key) + approximate_size(item)
+                    for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approximate_size(item) for item in value)
+    return size
+
+
+class CoalescedError(Exception):
+    """Raised to callers sharing an error that cannot be copied"""
+
+
+def shared_error(error):
+    """
+    Return a fresh exception for one caller of an error shared by many
+
+    Raising the same instance in every caller would stack each raise onto
+    its traceback, so callers get a copy (or a CoalescedError when the
+    type cannot be rebuilt) to raise from the original.
+    """
+    try:
+        fresh = copy.copy(error)
+    except Exception:
+        fresh = None
+    if type(fresh) is not type(error):
+        fresh = CoalescedError(f"{type(error).__name__}: {error}")
+    return fresh
+
+
+class CachedError:
+    """An exception cached for a short time in place of a result"""
+
+    __slots__ = ("error",)
+
+    def __init__(self, error):
+        self.error = error
+
+
+def is_negative(value):
+    """Whether a result is empty: no row or no rows"""
+    return value is None or value == [] or value == ()
+
+
+class Flight:
+    """A query being run for one key that other callers can wait on"""
+
+    def __init__(self, generation):
+        self.generation = generation
+        # Thread of the leader; for an async leader, that of its event loop
+        self.thread = threading.get_ident()
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        # Set when the leader was interrupted; a waiter must take over
+        self.abandoned = False
+        self._waiters = []  # (loop, future) of coroutines waiting
+        self._lock = threading.Lock()
+
+    def resolve(self, value, error, abandoned=False):
+        """Publish the outcome and wake every waiting thread and coroutine"""
+        with self._lock:
+            self.value, self.error, self.abandoned = value, error, abandoned
+            self.done.set()
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:  # the waiter's loop has been closed
+                pass
+
+    async def wait_async(self):
+        """Wait for the outcome without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.done.is_set():
+                return
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+        await future
+
+    def outcome(self):
+        """Return the leader's result, or raise a copy of its error"""
+        if self.error is not None:
+            raise shared_error(self.error) from self.error
+        return self.value
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+# Header bytes of the write-ahead log and of its shared-memory index that
+# SQLite changes on commits: the WAL's checkpoint sequence and salts
+# (new after every reset) and the index's change counter and frame count
+# (bumped by every WAL commit)
+WAL_HEADER_SIZE = 32
+WAL_INDEX_HEADER_SIZE = 48
+
+
+def database_version(path):
+    """
+    Return a token that changes whenever a SQLite database file is written
+
+    PRAGMA data_version only means something within one connection, so
+    it cannot validate entries across restarts. The token combines the
+    file change counter from the database header (bumped by every commit
+    in rollback-journal mode) with the size and mtime of the file, and
+    the headers, sizes and mtimes of its write-ahead log and its index,
+    which every WAL-mode commit changes instead even when it rewrites
+    log frames in place or lands within the mtime resolution.
+
+    Returns:
+        str: The token, or None if the database does not exist
+    """
+    try:
+        with open(path, "rb") as f:
+            f.seek(24)
+            counter = f.read(4).hex()
+            stat = os.fstat(f.fileno())
+    except FileNotFoundError:
+        return None
+    parts = [counter, stat.st_size, stat.st_mtime_ns]
+    for suffix, header_size in (("-wal", WAL_HEADER_SIZE), ("-shm", WAL_INDEX_HEADER_SIZE)):
+        try:
+            with open(path + suffix, "rb") as f:
+                header = f.read(header_size)
+                stat = os.fstat(f.fileno())
+        except FileNotFoundError:
+            continue
+        parts += [header.hex(), stat.st_size, stat.st_mtime_ns]
+    return ":".join(str(part) for part in parts)
+
+
+class DiskCache:
+    """Persistent result tier in a SQLite side file next to the database
+
+    Results are pickled into a separate file (writing them into the
+    database itself would change its version), stamped with the
+    database_version they were read at, and only served while the
+    database still has that version. Rows are keyed on the normalized
+    SQL plus a SHA-256 of the pickled parameters. The file is capped at
+    max_bytes of results; least recently used entries are evicted beyond
+    it. Reads never write: their access times are kept in memory and
+    saved with the next set(), or once touch_every have piled up, and
+    stale rows are only removed when a result is stored.
+    """
+
+    def __init__(self, database=connection_pool.DATABASE, path=None,
+                 max_bytes=256 * 1024 * 1024, touch_every=64):
+        """
+        Args:
+            database (str): Database file the cached results come from
+            path (str): Cache file, defaults to the database path plus
+                "-querycache"
+            max_bytes (int): Most bytes of pickled results kept
+            touch_every (int): Pending access times that trigger a write
+        """
+        self.database = os.path.abspath(database)
+        self.path = path or self.database + "-querycache"
+        self.max_bytes = max_bytes
+        self.touch_every = touch_every
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self._touched = {}  # (query, params_hash) -> last read time
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Rows of earlier releases were keyed on repr() of the key
+        self._conn.execute("DROP TABLE IF EXISTS cache_entries")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_results (
+                query TEXT NOT NULL,
+                params_hash TEXT NOT NULL,
+                version TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (query, params_hash)
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS cache_results_accessed ON cache_results (accessed_at)")
+
+    @staticmethod
+    def _row_key(key):
+        """Return the (query, params_hash) primary key for a make_key key"""
+        query, params = key
+        blob = pickle.dumps(params, protocol=4)
+        return query, hashlib.sha256(blob).hexdigest()
+
+    def version(self):
+        """Current version token of the database"""
+        return database_version(self.database)
+
+    def get(self, key):
+        """Return the stored result for key if still valid, or MISSING"""
+        now = time.time()
+        row_key = self._row_key(key)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, value, expires_at FROM cache_results "
+                "WHERE query = ? AND params_hash = ?", row_key).fetchone()
+            if row is None:
+                self.misses += 1
+                return MISSING
+            version, value, expires_at = row
+            if version != self.version() or (expires_at is not None and expires_at <= now):
+                self.stale += 1
+                self.misses += 1
+                return MISSING
+            self.hits += 1
+            self._touched[row_key] = now
+            if len(self._touched) >= self.touch_every:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._save_touches()
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        return pickle.loads(value)
+
+    def set(self, key, value, ttl, version):
+        """
+        Store a result read while the database had the given version
+
+        Args:
+            key: Key from make_key
+            value: The result, which must be picklable
+            ttl (float): Seconds the result stays valid, None for ever
+            version (str): database_version taken before the query ran
+        """
+        if version is None:
+            return
+        try:
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._save_touches()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache_results "
+                    "(query, params_hash, version, value, size, expires_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (*self._row_key(key), version, blob, len(blob), expires_at, now))
+                self._evict(now)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _save_touches(self):
+        """Write the pending access times, inside the caller's transaction"""
+        if not self._touched:
+            return
+        self._conn.executemany(
+            "UPDATE cache_results SET accessed_at = MAX(accessed_at, ?) "
+            "WHERE query = ? AND params_hash = ?",
+            [(accessed_at, query, params_hash)
+             for (query, params_hash), accessed_at in self._touched.items()])
+        self._touched.clear()
+
+    def _evict(self, now):
+        """Drop stale and expired entries, then LRU entries over max_bytes"""
+        self._conn.execute(
+            "DELETE FROM cache_results WHERE version != ? OR expires_at <= ?",
+            (self.version(), now))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for query, params_hash, size in self._conn.execute(
+                "SELECT query, params_hash, size FROM cache_results "
+                "ORDER BY accessed_at").fetchall():
+            self._conn.execute("DELETE FROM cache_results WHERE query = ? AND params_hash = ?",
+                               (query, params_hash))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        """Drop every stored result"""
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute("DELETE FROM cache_results")
+
+    def stats(self):
+        """Return hit, miss, stale and eviction counters and stored size"""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_results").fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits,
+                "misses": self.misses, "stale": self.stale, "evictions": self.evictions}
+
+    def close(self):
+        with self._lock:
+            try:
+                self._save_touches()
+            finally:
+                self._conn.close()
+
+
+# Every live QueryCache, so writes reach the caches given to cache_query
+# as well as query_cache
+_caches = weakref.WeakSet()
+_caches_lock = threading.Lock()
+
+
+def invalidate_tables(tables):
+    """
+    Drop the entries read from any of the given tables in every cache
+
+    Args:
+        tables (iterable): Names of tables that were written
+
+    Returns:
+        int: Number of entries dropped
+    """
+    tables = frozenset(tables)
+    if not tables:
+        return 0
+    with _caches_lock:
+        caches = list(_caches)
+    return sum(cache.invalidate_tables(tables) for cache in caches)
+
+
+class _Entry:
+    __slots__ = ("value", "size", "expires_at", "tables")
+
+    def __init__(self, value, size, expires_at, tables):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.tables = tables
+
+
+class QueryCache:
+    """Thread-safe LRU cache with a TTL and entry and byte limits"""
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=300,
+                 clock=time.monotonic, disk=None):
+        """
+        Args:
+            max_entries (int): Most results kept at once
+            max_bytes (int): Most approximate bytes of results kept at once
+            ttl (float): Default seconds a result stays valid, None for ever
+            clock (callable): Monotonic time source
+            disk (DiskCache): Persistent tier consulted on a miss, if any
+        """
+        self.disk = disk
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._by_table = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.coalesced = 0
+        self.cached_errors = 0
+        self._flights = {}
+        # Bumped by every invalidation, so a result computed across one is
+        # not stored (it may predate the write)
+        self._generation = 0
+        with _caches_lock:
+            _caches.add(self)
+
+    def get(self, key):
+        """Return the cached value for key, or MISSING"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at is not None \
+                    and entry.expires_at <= self.clock():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def set(self, key, value, ttl=None, tables=(ALL_TABLES,)):
+        """
+        Store a value, evicting least recently used entries to make room
+
+        Args:
+            key: Key from make_key
+            value: The result to cache
+            ttl (float): Seconds the value stays valid, defaults to self.ttl
+            tables (iterable): Tables the result was read from, see
+                tables_read; writes to any of them invalidate it
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl is not None and ttl <= 0:
+            return
+        size = approximate_size(value)
+        if size > self.max_bytes:
+            return
+        expires_at = self.clock() + ttl if ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            tables = frozenset(tables)
+            self._entries[key] = _Entry(value, size, expires_at, tables)
+            self._bytes += size
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        for table in entry.tables:
+            keys = self._by_table[table]
+            keys.discard(key)
+            if not keys:
+                del self._by_table[table]
+
+    def invalidate(self, key):
+        """Drop one entry if present"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def invalidate_tables(self, tables):
+        """
+        Drop the entries read from any of the given tables
+
+        Entries whose tables could not be parsed are dropped by any write.
+
+        Args:
+            tables (iterable): Names of tables that were written
+
+        Returns:
+            int: Number of entries dropped
+        """
+        tables = {table.lower() for table in tables}
+        if not tables:
+            return 0
+        with self._lock:
+            keys = set(self._by_table.get(ALL_TABLES, ()))
+            for table in tables:
+                keys.update(self._by_table.get(table, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            self._generation += 1
+            return len(keys)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self._bytes = 0
+            self._generation += 1
+        if self.disk is not None:
+            self.disk.clear()
+
+    def begin_flight(self, key):
+        """
+        Join or start the computation of a missing key
+
+        Returns:
+            tuple: (flight, leader); the leader must run the query and call
+            finish_flight, everyone else waits on flight.done
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            flight = self._flights[key] = Flight(self._generation)
+            return flight, True
+
+    def finish_flight(self, key, flight, value=MISSING, error=None, ttl=None,
+                      tables=(ALL_TABLES,), negative_ttl=None, error_ttl=None,
+                      version=None):
+        """
+        Store the leader's outcome and release the callers waiting on it
+
+        Args:
+            key: Key of the flight
+            flight (Flight): From begin_flight
+            value: The computed result, unless error is set
+            error (Exception): What the query raised instead
+            ttl (float): Seconds the result stays valid
+            tables (iterable): Tables the result was read from
+            negative_ttl (float): Seconds an empty result stays valid,
+                None to use ttl and 0 not to cache it
+            error_ttl (float): Seconds an error is cached and re-raised,
+                None or 0 not to cache errors
+            version (str): Database version the value was computed at, to
+                also store it in the disk tier; None to keep it in memory
+        """
+        store = False
+        with self._lock:
+            if self._generation == flight.generation:
+                if error is not None:
+                    if error_ttl:
+                        self.set(key, CachedError(error), error_ttl, tables)
+                else:
+                    if is_negative(value) and negative_ttl is not None:
+                        ttl = negative_ttl
+                    self.set(key, value, ttl, tables)
+                    store = ttl is None or ttl > 0
+            del self._flights[key]
+        if store and version is not None and self.disk is not None:
+            self.disk.set(key, value, self.ttl if ttl is None else ttl, version)
+        flight.resolve(value, error)
+
+    def load(self, key, compute, ttl=None, tables=(ALL_TABLES,), negative_ttl=None,
+             error_ttl=None):
+        """
+        Return the cached result for key, computing it once on a miss
+
+        Concurrent callers missing the same key wait for the first one's
+        result (or error) instead of each running the query; if the first
+        is interrupted or cancelled, one of them runs it instead. A caller on
+        the thread of the leader (a synchronous call made inside a
+        coroutine while another coroutine on that loop leads) runs the
+        query itself instead, since it would otherwise block the leader.
+
+        Args:
+            key: Key from make_key
+            compute (callable): Runs the query, called with no arguments
+            ttl, tables, negative_ttl, error_ttl: See finish_flight
+
+        Returns:
+            The cached or computed result
+        """
+        while True:
+            value = self._cached(key)
+            if value is not MISSING:
+                return value
+            flight, leader = self.begin_flight(key)
+            if leader:
+                break
+            if flight.thread == threading.get_ident():
+                # The leader is a coroutine on the event loop this call
+                # blocks; waiting for it would never end, so run the query
+                # uncached
+                return compute()
+            flight.done.wait()
+            if not flight.abandoned:
+                return flight.outcome()
+        try:
+            version, value = self._read_disk(key)
+            if value is MISSING:
+                value = compute()
+        except BaseException as e:
+            self._fail_flight(key, flight, e, tables, error_ttl)
+            raise
+        self.finish_flight(key, flight, value, ttl=ttl, tables=tables,
+                           negative_ttl=negative_ttl, version=version)
+        return value
+
+    async def load_async(self, key, compute, ttl=None, tables=(ALL_TABLES,),
+                         negative_ttl=None, error_ttl=None):
+        """
+        Coroutine version of load, sharing its entries and flights
+
+        Args:
+            key: Key from make_key
+            compute (callable): Returns an awaitable that runs the query
+            ttl, tables, negative_ttl, error_ttl: See finish_flight
+
+        Returns:
+            The cached or computed result
+        """
+        while True:
+            value = self._cached(key)
+            if value is not MISSING:
+                return value
+            flight, leader = self.begin_flight(key)
+            if leader:
+                break
+            await flight.wait_async()
+            if not flight.abandoned:
+                return flight.outcome()
+        version = None
+        try:
+            if self.disk is not None:
+                version, value = await asyncio.to_thread(self._read_disk, key)
+            if value is MISSING:
+                value = await compute()
+        except BaseException as e:
+            self._fail_flight(key, flight, e, tables, error_ttl)
+            raise
+        if version is not None:
+            # Writing the disk tier is file I/O, keep it off the loop
+            await asyncio.to_thread(functools.partial(
+                self.finish_flight, key, flight, value, ttl=ttl, tables=tables,
+                negative_ttl=negative_ttl, version=version))
+        else:
+            self.finish_flight(key, flight, value, ttl=ttl, tables=tables,
+                               negative_ttl=negative_ttl)
+        return value
+
+    def _cached(self, key):
+        """Return the value in memory for key, raising a cached error"""
+        value = self.get(key)
+        if isinstance(value, CachedError):
+            with self._lock:
+                self.cached_errors += 1
+            raise shared_error(value.error) from value.error
+        return value
+
+    def _read_disk(self, key):
+        """
+        Return (version, value) from the disk tier
+
+        version is the database version to store a computed result under,
+        None when there is no disk tier or the value was found there.
+        """
+        if self.disk is None:
+            return None, MISSING
+        # Read the version first: a write after it makes the stored result
+        # look stale, never a stale result look current
+        version = self.disk.version()
+        value = self.disk.get(key)
+        return (None, value) if value is not MISSING else (version, MISSING)
+
+    def _fail_flight(self, key, flight, error, tables, error_ttl):
+        if isinstance(error, Exception):
+            self.finish_flight(key, flight, error=error, tables=tables,
+                               error_ttl=error_ttl)
+            return
+        # Interrupts and cancellations belong to the leader alone: never
+        # store or share them, and let a waiter run the query instead
+        with self._lock:
+            del self._flights[key]
+        flight.resolve(MISSING, None, abandoned=True)
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current size"""
+        with self._lock:
+            stats = {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "coalesced": self.coalesced,
+                "cached_errors": self.cached_errors,
+            }
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (
+                entry.expires_at is None or entry.expires_at > self.clock())
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Cache used by cache_query unless a decorator is given its own
+query_cache = QueryCache()
@@ -0,0 +1,198 @@
+"""
+Bounded pool of reusable SQLite connections for with_db_connection
+
+Opening a connection and closing it again around every decorated call
+costs more than a quick primary-key lookup. The pool keeps up to max_size
+connections per database file, hands an idle one to each borrower and
+resets it on return, so a borrower never sees another caller's open
+transaction, row factory or hooks.
+
+Coroutines get an aiosqlite connection from connect_async instead.
+"""
+
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+try:
+    import aiosqlite
+except ImportError:  # aiosqlite is only needed by the async decorators
+    aiosqlite = None
+
+# Database file the decorators connect to
+DATABASE = 'users.db'
+
+
+class PoolTimeoutError(TimeoutError):
+    """Raised when no pooled connection frees up within the pool's timeout"""
+
+
+# Every pool not yet garbage collected, for the fork hook below
+_live_pools = weakref.WeakSet()
+
+
+class ConnectionPool:
+    """Thread-safe pool of connections to one SQLite database file"""
+
+    def __init__(self, database, max_size=8, timeout=30.0):
+        """
+        Args:
+            database (str): Path of the database file
+            max_size (int): Most connections open at once; further
+                borrowers wait for one to be returned
+            timeout (float): Seconds a borrower waits before PoolTimeoutError
+        """
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self._condition = threading.Condition()
+        self._reset()
+        _live_pools.add(self)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = []
+        self._size = 0
+        self._stats = {"hits": 0, "misses": 0, "waits": 0, "wait_seconds": 0.0,
+                       "discarded": 0}
+
+    def _connect(self):
+        # Borrowers get exclusive use, so handing a connection to another
+        # thread than the one that opened it is safe
+        return sqlite3.connect(self.database, check_same_thread=False)
+
+    def acquire(self):
+        """Borrow a connection, waiting up to timeout seconds for one"""
+        with self._condition:
+            started = time.perf_counter()
+            waited = False
+            while not self._idle and self._size >= self.max_size:
+                remaining = self.timeout - (time.perf_counter() - started)
+                if remaining <= 0:
+                    raise PoolTimeoutError(
+                        f"Timed out waiting for a connection to {self.database}")
+                waited = True
+                self._stats["waits"] += 1
+                self._condition.wait(remaining)
+            if waited:
+                self._stats["wait_seconds"] += time.perf_counter() - started
+            if self._idle:
+                self._stats["hits"] += 1
+                return self._idle.pop()
+            self._size += 1
+            self._stats["misses"] += 1
+
+        try:
+            return self._connect()
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+    def _reset_state(self, conn):
+        """Undo anything a borrower left behind on the connection"""
+        if conn.in_transaction:
+            conn.rollback()
+        conn.row_factory = None
+        conn.text_factory = str
+        conn.isolation_level = ""
+        conn.set_trace_callback(None)
+        conn.set_authorizer(None)
+        conn.set_progress_handler(None, 0)
+
+    def release(self, conn, discard=False):
+        """Return a borrowed connection, or close it if discard is set"""
+        if not discard:
+            try:
+                self._reset_state(conn)
+            except sqlite3.Error:
+                discard = True
+        with self._condition:
+            if self._pid != os.getpid():
+                # Borrowed before a fork; the child's pool never counted it
+                return
+            if discard:
+                self._size -= 1
+                self._stats["discarded"] += 1
+            else:
+                self._idle.append(conn)
+            self._condition.notify()
+        if discard:
+            conn.close()
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Borrow a connection for a with block"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        """Return hit, miss and wait counters plus current sizes"""
+        with self._condition:
+            in_use = self._size - len(self._idle)
+            return dict(self._stats, size=self._size, idle=len(self._idle), in_use=in_use)
+
+    def close(self):
+        """Close every idle connection"""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn in idle:
+            conn.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _after_fork_in_child():
+    """Give every pool in a forked child a fresh lock and empty counters
+
+    The parent's lock may have been held by another thread at fork time
+    and its connections and counters belong to the parent, so reusing any
+    of them could deadlock the child or let it exceed max_size.
+    """
+    global _pools_lock
+    _pools_lock = threading.Lock()
+    for pool in list(_live_pools):
+        pool._condition = threading.Condition()
+        pool._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def get_pool(database=DATABASE):
+    """Return the shared pool for a database file, creating it on first use"""
+    path = os.path.abspath(database)
+    with _pools_lock:
+        if path not in _pools:
+            _pools[path] = ConnectionPool(path)
+        return _pools[path]
+
+
+def pool_stats(database=DATABASE):
+    """Return the statistics of the shared pool for a database file"""
+    return get_pool(database).stats()
+
+
+def connect_async(database=DATABASE):
+    """
+    Open an aiosqlite connection for a coroutine (use with async with)
+
+    These are not pooled: every aiosqlite connection owns a worker thread
+    that keeps the process alive until it is closed, so idle ones cannot
+    be left behind when the event loop finishes. Like get_pool, the path
+    is made absolute, so a later chdir does not change the file opened.
+    """
+    if aiosqlite is None:
+        raise ImportError("aiosqlite is required to decorate async functions")
+    return aiosqlite.connect(os.path.abspath(database))
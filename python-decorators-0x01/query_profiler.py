@@ -0,0 +1,285 @@
+"""
+In-memory query profiler shared by the sync and async log_queries decorators
+
+Every profiled call is timed; a sample of them is fingerprinted (literals
+replaced by ?) and added to a per-fingerprint latency histogram along
+with the rows it returned. Calls slower than the slow-query threshold are
+always recorded, and their EXPLAIN QUERY PLAN is captured by a background
+thread on a pooled connection, after the call has been timed and
+returned. Log records go through a QueueHandler, so the file is written
+by a background listener thread and never on the caller's path.
+"""
+
+import bisect
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sqlite3
+import threading
+
+import cache_engine
+import connection_pool
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+# Upper bounds of the latency buckets: 1us, 2us, 4us ... about 67s
+BUCKETS = tuple(2 ** power / 1000000 for power in range(27))
+
+logger = logging.getLogger("query_profiler")
+logger.addHandler(logging.NullHandler())
+
+
+def fingerprint(query):
+    """Normalize a query and replace its literal values with ?"""
+    query = _LITERAL.sub("?", cache_engine.normalize_sql(query))
+    return _IN_LIST.sub("(?)", _NUMBER.sub("?", query))
+
+
+def row_count(result):
+    """Rows in a result: a list of rows, one row, or None"""
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple):
+        return 1
+    return None
+
+
+class Histogram:
+    """Latency histogram with power-of-two buckets"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding quantile q, or None if empty"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                return BUCKETS[index] if index < len(BUCKETS) else self.max
+        return self.max
+
+
+class _FingerprintStats:
+    __slots__ = ("query", "histogram", "rows", "slow", "plan")
+
+    def __init__(self, query):
+        self.query = query
+        self.histogram = Histogram()
+        self.rows = 0
+        self.slow = 0
+        self.plan = None
+
+
+class QueryProfiler:
+    """Per-fingerprint latency, row and slow-query statistics"""
+
+    def __init__(self, sample_rate=0.1, slow_threshold=0.1,
+                 database=connection_pool.DATABASE):
+        """
+        Args:
+            sample_rate (float): Share of calls recorded (0 to 1); slow
+                calls are always recorded
+            slow_threshold (float): Seconds above which a call is slow and
+                its plan is captured
+            database (str): Database file EXPLAIN runs against
+        """
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.database = database
+        self.calls = 0
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._explains = queue.Queue()
+        self._explaining = set()  # fingerprints with a plan pending
+        self._explainer = None
+        self._explainer_pid = None
+
+    def should_record(self, seconds):
+        """Count a call and decide whether it is recorded: always when slow"""
+        with self._lock:
+            self.calls += 1
+        return (seconds >= self.slow_threshold or self.sample_rate >= 1
+                or random.random() < self.sample_rate)
+
+    def explain(self, query, params=()):
+        """Return the EXPLAIN QUERY PLAN rows of a query, or None on error"""
+        try:
+            with connection_pool.get_pool(self.database).connection() as conn:
+                return conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        except sqlite3.Error:
+            return None
+
+    def record(self, query, seconds, rows=None, params=()):
+        """
+        Add one call to the statistics and log it
+
+        Never blocks on the database: the plan of a slow query is read in
+        a background thread, at most one at a time per fingerprint.
+
+        Args:
+            query (str): SQL that ran
+            seconds (float): Wall time of the call
+            rows (int): Rows returned, None if unknown
+            params (tuple): Parameters, used to EXPLAIN slow queries
+        """
+        key = fingerprint(query)
+        slow = seconds >= self.slow_threshold
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _FingerprintStats(query)
+            stats.histogram.add(seconds)
+            stats.rows += rows or 0
+            if slow:
+                stats.slow += 1
+            explain = slow and key not in self._explaining
+            if explain:
+                self._explaining.add(key)
+                self._start_explainer()
+        record = {"fingerprint": key, "seconds": round(seconds, 6), "rows": rows}
+        if explain:
+            # Logged by the explainer once the plan is known
+            self._explains.put((key, query, params, record))
+        elif slow:
+            self._log(logging.WARNING, dict(record, plan=stats.plan))
+        else:
+            self._log(logging.INFO, record)
+
+    def _start_explainer(self):
+        """Start the EXPLAIN thread, again in a forked child; lock held"""
+        if self._explainer is not None and self._explainer_pid == os.getpid():
+            return
+        self._explainer_pid = os.getpid()
+        self._explainer = threading.Thread(target=self._explain_loop,
+                                           name="query-profiler-explain", daemon=True)
+        self._explainer.start()
+
+    def _explain_loop(self):
+        while True:
+            key, query, params, record = self._explains.get()
+            try:
+                plan = self.explain(query, params)
+                with self._lock:
+                    self._explaining.discard(key)
+                    stats = self._stats.get(key)
+                    if stats is not None:
+                        stats.plan = plan
+                self._log(logging.WARNING, dict(record, plan=plan))
+            finally:
+                self._explains.task_done()
+
+    def drain(self):
+        """Wait until the plans of every slow call so far are captured"""
+        self._explains.join()
+
+    @staticmethod
+    def _log(level, record):
+        if logger.isEnabledFor(level):
+            logger.log(level, json.dumps(record, default=str))
+
+    def report(self):
+        """
+        Summarize every fingerprint, most total time first
+
+        Counts and totals cover the sampled calls plus every slow call.
+
+        Returns:
+            list: One dict per fingerprint
+        """
+        with self._lock:
+            items = list(self._stats.items())
+        rows = []
+        for key, stats in items:
+            histogram = stats.histogram
+            rows.append({
+                "fingerprint": key,
+                "example": stats.query,
+                "count": histogram.count,
+                "total_seconds": histogram.total,
+                "mean_seconds": histogram.total / histogram.count,
+                "p50_seconds": histogram.percentile(0.5),
+                "p95_seconds": histogram.percentile(0.95),
+                "p99_seconds": histogram.percentile(0.99),
+                "max_seconds": histogram.max,
+                "rows": stats.rows,
+                "slow": stats.slow,
+                "plan": stats.plan,
+                "histogram": dict(zip(BUCKETS + (float("inf"),), histogram.counts)),
+            })
+        rows.sort(key=lambda row: row["total_seconds"], reverse=True)
+        return rows
+
+    def dump(self, path):
+        """Write the report to a JSON file, once pending plans are in"""
+        self.drain()
+        with open(path, "w") as f:
+            json.dump({"calls": self.calls, "sample_rate": self.sample_rate,
+                       "fingerprints": self.report()}, f, indent=2, default=str)
+
+    def reset(self):
+        """Forget every statistic"""
+        with self._lock:
+            self._stats.clear()
+            self.calls = 0
+
+
+_listener = None
+
+
+def start_log_writer(path='queries.log'):
+    """
+    Send profiler log records to a file from a background thread
+
+    Args:
+        path (str): File the records are appended to as JSON lines
+
+    Returns:
+        logging.handlers.QueueListener: The running listener
+    """
+    global _listener
+    stop_log_writer()
+    records = queue.SimpleQueue()
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    _listener = logging.handlers.QueueListener(records, handler)
+    logger.handlers = [logging.handlers.QueueHandler(records)]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    _listener.start()
+    return _listener
+
+
+def stop_log_writer():
+    """Flush and stop the background log writer, if running"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    logger.handlers = [logging.NullHandler()]
+
+
+# Profiler used by log_queries unless a decorator is given its own
+profiler = QueryProfiler()
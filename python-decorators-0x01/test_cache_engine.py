@@ -0,0 +1,505 @@
+#!/usr/bin/env python3
+"""Unit tests for the cache_engine module."""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+from parameterized import parameterized
+import cache_engine
+from cache_engine import (ALL_TABLES, MISSING, CoalescedError, DiskCache,
+                          QueryCache, database_version, invalidate_tables,
+                          make_key, normalize_sql, shared_error, tables_read,
+                          tables_written)
+
+
+class FakeClock:
+    """Clock the tests move forward by hand."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestNormalizeSql(unittest.TestCase):
+    """Test cases for normalize_sql."""
+
+    @parameterized.expand([
+        ("SELECT *\n  FROM users ;", "select * from users"),
+        ("select * from users where name = 'Ann  LEE'",
+         "select * from users where name = 'Ann  LEE'"),
+        ("SELECT * FROM users WHERE name = 'It''s'",
+         "select * from users where name = 'It''s'"),
+        ('SELECT "Name"  FROM "Users"', 'select "Name" from "Users"'),
+        ("SELECT `Name`  FROM `Users`", "select `Name` from `Users`"),
+        ("SELECT * FROM users WHERE note = \"A  b\"",
+         "select * from users where note = \"A  b\""),
+    ])
+    def test_normalize_sql(self, query, expected):
+        """Test that only whitespace and case outside quotes change."""
+        self.assertEqual(normalize_sql(query), expected)
+
+    def test_quoted_case_distinguishes_keys(self):
+        """Test that differently cased quoted tokens get different keys."""
+        self.assertNotEqual(make_key('SELECT * FROM "Users"'),
+                            make_key('SELECT * FROM "users"'))
+        self.assertNotEqual(make_key("SELECT 1 WHERE x = \"A\""),
+                            make_key("SELECT 1 WHERE x = \"a\""))
+
+
+class TestMakeKey(unittest.TestCase):
+    """Test cases for make_key."""
+
+    def test_params_are_part_of_the_key(self):
+        """Test that the same query with other parameters is another key."""
+        query = "SELECT * FROM users WHERE id = ?"
+        self.assertNotEqual(make_key(query, (1,)), make_key(query, (2,)))
+        self.assertEqual(make_key(query, (1,)), make_key(" " + query.lower(), (1,)))
+
+    def test_unhashable_params(self):
+        """Test that list, dict and set parameters are frozen."""
+        key = make_key("SELECT ?", {"b": [1, 2], "a": {3}})
+        self.assertEqual(key, make_key("SELECT ?", {"a": {3}, "b": [1, 2]}))
+        hash(key)
+
+
+class TestQueryCacheEviction(unittest.TestCase):
+    """Test cases for the LRU and TTL limits of QueryCache."""
+
+    def setUp(self):
+        """Build a small cache on a fake clock."""
+        self.clock = FakeClock()
+        self.cache = QueryCache(max_entries=2, ttl=10, clock=self.clock)
+
+    def test_least_recently_used_is_evicted(self):
+        """Test that a read keeps an entry over an older unread one."""
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.get("a")
+        self.cache.set("c", 3)
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertIs(self.cache.get("b"), MISSING)
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_byte_limit(self):
+        """Test that entries are evicted to stay under max_bytes."""
+        cache = QueryCache(max_bytes=2000)
+        cache.set("a", "x" * 900)
+        cache.set("b", "y" * 900)
+        cache.set("c", "z" * 900)
+        self.assertLessEqual(cache.stats()["bytes"], 2000)
+        self.assertNotIn("a", cache)
+        cache.set("huge", "h" * 5000)
+        self.assertNotIn("huge", cache)
+
+    def test_ttl(self):
+        """Test that entries expire after their time to live."""
+        self.cache.set("a", 1)
+        self.cache.set("b", 2, ttl=100)
+        self.clock.now = 10
+        self.assertIs(self.cache.get("a"), MISSING)
+        self.assertEqual(self.cache.get("b"), 2)
+        self.assertEqual(self.cache.stats()["expirations"], 1)
+
+    def test_zero_ttl_is_not_stored(self):
+        """Test that a ttl of 0 skips caching."""
+        self.cache.set("a", 1, ttl=0)
+        self.assertNotIn("a", self.cache)
+
+
+class TestTables(unittest.TestCase):
+    """Test cases for tables_read and tables_written."""
+
+    @parameterized.expand([
+        ("SELECT * FROM users", {"users"}),
+        ("SELECT * FROM users u, orders o WHERE u.id = o.user_id",
+         {"users", "orders"}),
+        ("SELECT * FROM main.users AS u , `orders` JOIN items i ON 1",
+         {"users", "orders", "items"}),
+        ("SELECT * FROM users WHERE id IN (SELECT id FROM bans, blocks)",
+         {"users", "bans", "blocks"}),
+        ("SELECT * FROM users WHERE name = 'x from orders'", {"users"}),
+        ("SELECT * FROM a, (SELECT * FROM b) c, d", {"a", "b", ALL_TABLES}),
+        ("SELECT 1", {ALL_TABLES}),
+    ])
+    def test_tables_read(self, query, expected):
+        """Test that every table read is found, or ALL_TABLES if unsure."""
+        self.assertEqual(tables_read(query), expected)
+
+    @parameterized.expand([
+        ("INSERT INTO users VALUES (1)", {"users"}),
+        ("INSERT OR REPLACE INTO Users VALUES (1)", {"users"}),
+        ("UPDATE users SET email = 'a' WHERE id = 1", {"users"}),
+        ("DELETE FROM main.orders", {"orders"}),
+        ("SELECT * FROM users", set()),
+    ])
+    def test_tables_written(self, query, expected):
+        """Test that the tables a statement writes are found."""
+        self.assertEqual(tables_written(query), expected)
+
+
+class TestInvalidation(unittest.TestCase):
+    """Test cases for table-tag invalidation."""
+
+    def test_only_tagged_entries_dropped(self):
+        """Test that a write drops results of its tables and untagged ones."""
+        cache = QueryCache()
+        cache.set("users", 1, tables=tables_read("SELECT * FROM users"))
+        cache.set("join", 2, tables=tables_read(
+            "SELECT * FROM orders o, users u WHERE o.user_id = u.id"))
+        cache.set("items", 3, tables=tables_read("SELECT * FROM items"))
+        cache.set("unknown", 4, tables=tables_read("SELECT 1"))
+        self.assertEqual(cache.invalidate_tables({"orders"}), 2)
+        self.assertEqual(cache.get("users"), 1)
+        self.assertEqual(cache.get("items"), 3)
+        self.assertNotIn("join", cache)
+        self.assertNotIn("unknown", cache)
+
+    def test_every_live_cache_is_invalidated(self):
+        """Test that module-level invalidation reaches every cache."""
+        first, second = QueryCache(), QueryCache()
+        first.set("a", 1, tables={"users"})
+        second.set("b", 2, tables={"users"})
+        self.assertGreaterEqual(invalidate_tables({"USERS"}), 2)
+        self.assertNotIn("a", first)
+        self.assertNotIn("b", second)
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Test cases for the coalesced loading of QueryCache.load."""
+
+    def setUp(self):
+        """Build an empty cache."""
+        self.cache = QueryCache()
+
+    def wait_for_coalesced(self, count):
+        """Wait until count callers are waiting on a flight."""
+        deadline = time.monotonic() + 5
+        while self.cache.stats()["coalesced"] < count:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+
+    def test_concurrent_misses_coalesced(self):
+        """Test that concurrent misses of one key run the query once."""
+        release = threading.Event()
+        compute = Mock(side_effect=lambda: release.wait(5) and "rows")
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(self.cache.load("key", compute)))
+            for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        self.wait_for_coalesced(4)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ["rows"] * 5)
+        self.assertEqual(compute.call_count, 1)
+        self.assertEqual(self.cache.get("key"), "rows")
+
+    def test_error_reaches_waiters(self):
+        """Test that waiters get the leader's error, cached for error_ttl."""
+        release = threading.Event()
+
+        def fail():
+            release.wait(5)
+            raise ValueError("boom")
+
+        errors = []
+
+        def load():
+            try:
+                self.cache.load("key", fail, error_ttl=60)
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=load) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        self.wait_for_coalesced(2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 3)
+        original, = (error for error in errors if error.__cause__ is None)
+        for error in errors:
+            self.assertEqual(error.args, ("boom",))
+            if error is not original:
+                self.assertIs(error.__cause__, original)
+        compute = Mock(return_value="rows")
+        with self.assertRaises(ValueError) as first:
+            self.cache.load("key", compute)
+        with self.assertRaises(ValueError) as second:
+            self.cache.load("key", compute)
+        self.assertIsNot(first.exception, second.exception)
+        self.assertIs(first.exception.__cause__, second.exception.__cause__)
+        compute.assert_not_called()
+        self.assertEqual(self.cache.stats()["cached_errors"], 2)
+
+    def test_base_exception_not_cached(self):
+        """Test that an interrupted leader leaves nothing cached behind."""
+        with self.assertRaises(KeyboardInterrupt):
+            self.cache.load("key", Mock(side_effect=KeyboardInterrupt),
+                            error_ttl=60)
+        self.assertNotIn("key", self.cache)
+        self.assertEqual(self.cache.load("key", Mock(return_value="rows")), "rows")
+
+    def test_interrupted_leader_hands_over(self):
+        """Test that a waiter reruns the query after the leader is interrupted."""
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            if len(calls) == 1:
+                release.wait(5)
+                raise KeyboardInterrupt
+            return "rows"
+
+        outcomes = []
+
+        def load():
+            try:
+                outcomes.append(self.cache.load("key", compute))
+            except KeyboardInterrupt as e:
+                outcomes.append(e)
+
+        leader = threading.Thread(target=load)
+        leader.start()
+        while not calls:
+            time.sleep(0.001)
+        waiter = threading.Thread(target=load)
+        waiter.start()
+        self.wait_for_coalesced(1)
+        release.set()
+        leader.join()
+        waiter.join()
+        self.assertIsInstance(outcomes[0], KeyboardInterrupt)
+        self.assertEqual(outcomes[1:], ["rows"])
+        self.assertEqual(len(calls), 2)
+
+    def test_cancelled_leader_task_hands_over(self):
+        """Test that cancelling the leading task does not cancel waiters."""
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            if len(calls) == 1:
+                await asyncio.sleep(10)
+            return "rows"
+
+        async def main():
+            leader = asyncio.create_task(self.cache.load_async("key", compute))
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(self.cache.load_async("key", compute))
+            await asyncio.sleep(0)
+            leader.cancel()
+            result = await waiter
+            self.assertTrue(leader.cancelled())
+            self.assertFalse(waiter.cancelled())
+            return result
+
+        self.assertEqual(asyncio.run(main()), "rows")
+        self.assertEqual(len(calls), 2)
+
+    def test_shared_error_uncopyable(self):
+        """Test that an error that cannot be rebuilt is wrapped."""
+        class NeedsTwo(Exception):
+            def __init__(self, first, second):
+                super().__init__(first)
+                self.second = second
+
+        error = shared_error(NeedsTwo("a", "b"))
+        self.assertIsInstance(error, CoalescedError)
+        self.assertIn("NeedsTwo", str(error))
+
+    def test_invalidation_during_flight_not_stored(self):
+        """Test that a result computed across a write is not cached."""
+        def compute():
+            self.cache.invalidate_tables({"users"})
+            return "stale"
+
+        self.assertEqual(self.cache.load("key", compute, tables={"users"}), "stale")
+        self.assertNotIn("key", self.cache)
+        self.assertEqual(self.cache.load("key", Mock(return_value="fresh"),
+                                         tables={"users"}), "fresh")
+        self.assertEqual(self.cache.get("key"), "fresh")
+
+    def test_async_callers_coalesced(self):
+        """Test that coroutines missing one key share a single query."""
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "rows"
+
+        async def main():
+            return await asyncio.gather(
+                *(self.cache.load_async("key", compute) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(main()), ["rows"] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_sync_call_under_async_leader(self):
+        """Test that a sync miss on the leading loop's thread runs directly."""
+        results = []
+
+        async def compute():
+            await asyncio.sleep(0.01)
+            return "rows"
+
+        async def blocking_caller():
+            # A synchronous cached call made from inside a coroutine
+            results.append(self.cache.load("key", Mock(return_value="direct")))
+
+        async def main():
+            leader = asyncio.create_task(self.cache.load_async("key", compute))
+            await asyncio.sleep(0)
+            await blocking_caller()
+            results.append(await leader)
+
+        thread = threading.Thread(target=asyncio.run, args=(main(),), daemon=True)
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(results, ["direct", "rows"])
+        self.assertEqual(self.cache.get("key"), "rows")
+
+
+class TestDiskCache(unittest.TestCase):
+    """Test cases for the DiskCache class."""
+
+    def setUp(self):
+        """Create a database file and a disk cache next to it."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.database = os.path.join(directory.name, "users.db")
+        self.write()
+        self.disk = self.open()
+
+    def open(self, **kwargs):
+        """Open a disk cache for the database, closed after the test."""
+        disk = DiskCache(self.database, **kwargs)
+        self.addCleanup(disk.close)
+        return disk
+
+    def write(self):
+        """Commit a write to the database, changing its version."""
+        with sqlite3.connect(self.database) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY)")
+            conn.execute("INSERT INTO users DEFAULT VALUES")
+        conn.close()
+
+    def statements(self, disk):
+        """Return a list that collects the statements a cache runs."""
+        statements = []
+        disk._conn.set_trace_callback(statements.append)
+        return statements
+
+    def test_survives_reopen(self):
+        """Test that a stored result is served by a new instance."""
+        key = make_key("SELECT * FROM users WHERE id = ?", (1,))
+        self.disk.set(key, [(1,)], None, self.disk.version())
+        self.disk.close()
+        self.assertEqual(self.open().get(key), [(1,)])
+
+    def test_rows_keyed_on_query_and_params_hash(self):
+        """Test that each parameter set gets its own row under the SQL."""
+        query = "SELECT * FROM users WHERE id = ?"
+        for user_id in (1, 2):
+            self.disk.set(make_key(query, (user_id,)), user_id, None,
+                          self.disk.version())
+        self.assertEqual(self.disk.get(make_key(query, (2,))), 2)
+        rows = self.disk._conn.execute(
+            "SELECT query, params_hash FROM cache_results").fetchall()
+        self.assertEqual({row[0] for row in rows}, {normalize_sql(query)})
+        self.assertEqual(len({row[1] for row in rows}), 2)
+
+    def test_reads_do_not_write(self):
+        """Test that hits and stale reads only run SELECTs."""
+        key = make_key("SELECT 1")
+        self.disk.set(key, 1, None, self.disk.version())
+        statements = self.statements(self.disk)
+        self.assertEqual(self.disk.get(key), 1)
+        self.write()
+        self.assertIs(self.disk.get(key), MISSING)
+        self.assertTrue(all(sql.lstrip().upper().startswith("SELECT")
+                            for sql in statements))
+        self.assertEqual(self.disk.stats()["stale"], 1)
+        self.assertEqual(self.disk.stats()["entries"], 1)
+
+    def test_touches_saved_after_touch_every(self):
+        """Test that pending access times are written in one batch."""
+        disk = self.open(path=self.database + "-other", touch_every=3)
+        keys = [make_key("SELECT ?", (n,)) for n in range(3)]
+        for key in keys:
+            disk.set(key, 1, None, disk.version())
+        statements = self.statements(disk)
+        for key in keys:
+            disk.get(key)
+        updates = [sql for sql in statements if sql.lstrip().upper().startswith("UPDATE")]
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(disk._touched, {})
+
+    def test_lru_uses_pending_touches(self):
+        """Test that a read since the last write still protects an entry."""
+        disk = self.open(path=self.database + "-small", max_bytes=250)
+        first, second, third = (make_key("SELECT ?", (n,)) for n in range(3))
+        disk.set(first, "a" * 100, None, disk.version())
+        disk.set(second, "b" * 100, None, disk.version())
+        disk.get(first)
+        disk.set(third, "c" * 100, None, disk.version())
+        self.assertEqual(disk.get(first), "a" * 100)
+        self.assertIs(disk.get(second), MISSING)
+        self.assertEqual(disk.stats()["evictions"], 1)
+
+    def test_version_changes_with_every_wal_commit(self):
+        """Test that WAL commits change the version even with frozen mtimes."""
+        real_stat, real_fstat = os.stat, os.fstat
+
+        def frozen(stat):
+            """Return stat with its mtime cleared."""
+            fields = list(stat)
+            fields[8] = 0  # st_mtime
+            return os.stat_result(fields)
+
+        writer = sqlite3.connect(self.database, isolation_level=None)
+        self.addCleanup(writer.close)
+        writer.execute("PRAGMA journal_mode=WAL")
+        versions = []
+        with patch.object(cache_engine.os, "stat",
+                          side_effect=lambda path: frozen(real_stat(path))), \
+                patch.object(cache_engine.os, "fstat",
+                             side_effect=lambda fd: frozen(real_fstat(fd))):
+            for commit in range(20):
+                writer.execute("INSERT INTO users DEFAULT VALUES")
+                if commit == 10:
+                    # Later commits rewrite log frames without growing it
+                    writer.execute("PRAGMA wal_checkpoint(RESTART)")
+                versions.append(database_version(self.database))
+        self.assertEqual(len(set(versions)), len(versions))
+
+    def test_default_database_is_shared(self):
+        """Test that DiskCache defaults to the decorators' database path."""
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(os.path.dirname(self.database))
+        disk = self.open()
+        self.assertEqual(disk.database, self.database)
+
+    def test_stale_rows_removed_on_set(self):
+        """Test that rows of an older database version go at the next set."""
+        self.disk.set(make_key("SELECT 1"), 1, None, self.disk.version())
+        self.write()
+        self.disk.set(make_key("SELECT 2"), 2, None, self.disk.version())
+        self.assertEqual(self.disk.stats()["entries"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
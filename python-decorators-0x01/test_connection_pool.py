@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Unit tests for the connection_pool module."""
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest.mock import Mock, patch
+import connection_pool
+from connection_pool import ConnectionPool, get_pool
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Test cases for the ConnectionPool class."""
+
+    def setUp(self):
+        """Create a database file and a pool of two connections to it."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.database = os.path.join(directory.name, "users.db")
+        with sqlite3.connect(self.database) as conn:
+            conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT)")
+        self.pool = ConnectionPool(self.database, max_size=2, timeout=0.05)
+        self.addCleanup(self.pool.close)
+
+    def test_reuse(self):
+        """Test that a returned connection is handed out again."""
+        with self.pool.connection() as first:
+            pass
+        with self.pool.connection() as second:
+            self.assertIs(second, first)
+        stats = self.pool.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_state_reset_on_release(self):
+        """Test that a borrower never sees the last one's state."""
+        with self.pool.connection() as conn:
+            conn.row_factory = sqlite3.Row
+            conn.execute("INSERT INTO users (email) VALUES ('a@b.c')")
+            self.assertTrue(conn.in_transaction)
+        with self.pool.connection() as conn:
+            self.assertFalse(conn.in_transaction)
+            self.assertIsNone(conn.row_factory)
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM users").fetchone(), (0,))
+
+    def test_bounded(self):
+        """Test that borrowers beyond max_size time out."""
+        self.pool.acquire()
+        self.pool.acquire()
+        with self.assertRaises(TimeoutError):
+            self.pool.acquire()
+
+    def test_waiter_gets_released_connection(self):
+        """Test that a waiting borrower is woken by a release."""
+        pool = ConnectionPool(self.database, max_size=1, timeout=5)
+        first = pool.acquire()
+        timer = threading.Timer(0.05, pool.release, (first,))
+        timer.start()
+        self.assertIs(pool.acquire(), first)
+        timer.join()
+        self.assertEqual(pool.stats()["waits"], 1)
+
+    def test_connect_raises(self):
+        """Test that a failed connect gives its slot back."""
+        with patch.object(self.pool, "_connect", side_effect=sqlite3.OperationalError):
+            with self.assertRaises(sqlite3.OperationalError):
+                self.pool.acquire()
+        self.assertEqual(self.pool.stats()["size"], 0)
+
+    def test_get_pool_by_absolute_path(self):
+        """Test that relative and absolute paths share one pool."""
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(os.path.dirname(self.database))
+        self.assertIs(get_pool("users.db"), get_pool(self.database))
+
+    def test_connect_async_by_absolute_path(self):
+        """Test that async connections open the same file as the pool."""
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(os.path.dirname(self.database))
+        with patch.object(connection_pool, "aiosqlite", Mock()) as aiosqlite:
+            connection_pool.connect_async()
+        aiosqlite.connect.assert_called_once_with(self.database)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs os.fork")
+    def test_fork_resets_pool(self):
+        """Test that a child forked mid-use gets a fresh, unlocked pool."""
+        self.pool.acquire()
+        self.pool.acquire()
+        # Another thread holds the pool's lock while the parent forks
+        locked, done = threading.Event(), threading.Event()
+
+        def hold_lock():
+            with self.pool._condition:
+                locked.set()
+                done.wait(5)
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        locked.wait(5)
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                if self.pool._condition.acquire(timeout=1):
+                    self.pool._condition.release()
+                    conn = self.pool.acquire()
+                    self.pool.acquire()
+                    stats = self.pool.stats()
+                    if (stats["size"], stats["in_use"], stats["misses"]) == (2, 2, 2):
+                        self.pool.release(conn)
+                        code = 0
+            finally:
+                os._exit(code)
+        done.set()
+        holder.join()
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertEqual(self.pool.stats()["in_use"], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Unit tests for the query_profiler module."""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from parameterized import parameterized
+from query_profiler import Histogram, QueryProfiler, fingerprint
+
+
+class TestFingerprint(unittest.TestCase):
+    """Test cases for fingerprint."""
+
+    @parameterized.expand([
+        ("SELECT * FROM users WHERE id = 42", "select * from users where id = ?"),
+        ("select * from users where name = 'Ann'", "select * from users where name = ?"),
+        ("SELECT * FROM users WHERE id IN (1, 2,3)", "select * from users where id in (?)"),
+    ])
+    def test_fingerprint(self, query, expected):
+        """Test that literals are replaced and case and spacing ignored."""
+        self.assertEqual(fingerprint(query), expected)
+
+
+class TestHistogram(unittest.TestCase):
+    """Test cases for the Histogram class."""
+
+    def test_percentiles(self):
+        """Test that percentiles return the upper bound of their bucket."""
+        histogram = Histogram()
+        for _ in range(99):
+            histogram.add(0.0001)
+        histogram.add(0.5)
+        self.assertLessEqual(histogram.percentile(0.5), 0.000128)
+        self.assertGreaterEqual(histogram.percentile(1.0), 0.5)
+        self.assertEqual(histogram.count, 100)
+        self.assertIsNone(Histogram().percentile(0.5))
+
+
+class TestQueryProfiler(unittest.TestCase):
+    """Test cases for the QueryProfiler class."""
+
+    def setUp(self):
+        """Create a database for EXPLAIN and a profiler recording all calls."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        database = os.path.join(directory.name, "users.db")
+        with sqlite3.connect(database) as conn:
+            conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT)")
+        self.profiler = QueryProfiler(sample_rate=1, slow_threshold=0.5,
+                                      database=database)
+
+    def test_calls_counted_across_threads(self):
+        """Test that concurrent calls are all counted."""
+        def count():
+            for _ in range(10000):
+                self.profiler.should_record(0.0)
+
+        threads = [threading.Thread(target=count) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.profiler.calls, 40000)
+
+    def test_slow_query_plan(self):
+        """Test that a slow call gets its plan captured."""
+        self.profiler.record("SELECT * FROM users WHERE id = ?", 1.0, 1, (1,))
+        self.profiler.record("SELECT * FROM users WHERE id = ?", 0.1, 1, (2,))
+        self.profiler.drain()
+        report, = self.profiler.report()
+        self.assertEqual((report["count"], report["slow"], report["rows"]), (2, 1, 2))
+        self.assertIn("PRIMARY KEY", str(report["plan"]))
+
+    def test_explain_off_the_caller_path(self):
+        """Test that record returns without waiting for EXPLAIN."""
+        release = threading.Event()
+
+        def slow_explain(query, params=()):
+            release.wait(5)
+            return [("plan",)]
+
+        with patch.object(self.profiler, "explain", side_effect=slow_explain) as explain:
+            started = time.perf_counter()
+            for _ in range(3):
+                self.profiler.record("SELECT * FROM users", 1.0)
+            self.assertLess(time.perf_counter() - started, 1)
+            release.set()
+            self.profiler.drain()
+        # One EXPLAIN per fingerprint while one is pending
+        self.assertEqual(explain.call_count, 1)
+        self.assertEqual(self.profiler.report()[0]["plan"], [("plan",)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""Unit tests for the 3-retry_on_failure module."""
+import contextlib
+import io
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock
+from parameterized import parameterized
+from connection_pool import PoolTimeoutError
+
+retry = None
+
+
+def setUpModule():
+    """Import the module from a directory holding its demo users.db."""
+    global retry
+    directory = tempfile.TemporaryDirectory()
+    unittest.addModuleCleanup(directory.cleanup)
+    unittest.addModuleCleanup(os.chdir, os.getcwd())
+    os.chdir(directory.name)
+    with sqlite3.connect("users.db") as conn:
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT)")
+    with contextlib.redirect_stdout(io.StringIO()):
+        retry = __import__('3-retry_on_failure')
+
+
+def query(**kwargs):
+    """Return a mock standing in for a decorated query function."""
+    func = Mock(**kwargs)
+    func.__name__ = "query"
+    return func
+
+
+def busy():
+    """Return a transient SQLite error."""
+    return sqlite3.OperationalError("database is locked")
+
+
+def error_with_code(message, code):
+    """Return an OperationalError carrying a SQLite result code."""
+    error = sqlite3.OperationalError(message)
+    error.sqlite_errorcode = code
+    return error
+
+
+class TestIsTransient(unittest.TestCase):
+    """Test cases for is_transient."""
+
+    @parameterized.expand([
+        ("busy", error_with_code("database is locked", 5), True),
+        ("locked", error_with_code("database table is locked", 6), True),
+        ("busy_snapshot", error_with_code("database is locked", 517), True),
+        ("code_wins_over_message", error_with_code("database is locked", 1), False),
+        ("no_code", sqlite3.OperationalError("database is locked"), True),
+        ("no_code_table", sqlite3.OperationalError("no such table: locked_accounts"), False),
+        ("no_code_busy_word", sqlite3.OperationalError("busy_jobs is not a column"), False),
+        ("integrity", sqlite3.IntegrityError("database is locked"), False),
+        ("pool_timeout", PoolTimeoutError("pool exhausted"), False),
+        ("timeout", TimeoutError(), False),
+    ])
+    def test_is_transient(self, _, error, expected):
+        """Test that only busy or locked database errors are transient."""
+        self.assertIs(retry.is_transient(error), expected)
+
+    def test_real_schema_error(self):
+        """Test that a real error naming a 'locked' table is not transient."""
+        with sqlite3.connect(":memory:") as conn:
+            with self.assertRaises(sqlite3.OperationalError) as raised:
+                conn.execute("SELECT * FROM locked_accounts")
+        self.assertFalse(retry.is_transient(raised.exception))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test cases for the CircuitBreaker class."""
+
+    def setUp(self):
+        """Build a breaker that opens after two failures in four calls."""
+        self.breaker = retry.CircuitBreaker(failure_rate=0.5, min_calls=4,
+                                            reset_timeout=0.05)
+
+    def open_circuit(self):
+        """Record enough failures to open the circuit."""
+        for failed in (False, True, False, True):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record(failed)
+        self.assertEqual(self.breaker.state, 'open')
+
+    def test_opens_and_recovers(self):
+        """Test open, half-open after the timeout, and closed on success."""
+        self.open_circuit()
+        self.assertFalse(self.breaker.allow())
+        time.sleep(0.06)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_failed_trial_reopens(self):
+        """Test that a failed half-open trial opens the circuit again."""
+        self.open_circuit()
+        time.sleep(0.06)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(True)
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertEqual(self.breaker.opened, 2)
+
+    def test_released_trial(self):
+        """Test that a trial without an outcome frees the slot only."""
+        self.open_circuit()
+        time.sleep(0.06)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.release()
+        self.assertEqual(self.breaker.state, 'half-open')
+        self.assertTrue(self.breaker.allow())
+
+
+class TestRetryOnFailure(unittest.TestCase):
+    """Test cases for the retry_on_failure decorator."""
+
+    def setUp(self):
+        """Build a breaker that opens after two failures in four calls."""
+        self.breaker = retry.CircuitBreaker(failure_rate=0.5, min_calls=4,
+                                            reset_timeout=0.05)
+
+    def decorate(self, func, retries=2):
+        """Wrap func without backoff delays."""
+        return retry.retry_on_failure(retries=retries, delay=0, jitter=False,
+                                      breaker=self.breaker)(func)
+
+    def test_transient_errors_retried(self):
+        """Test that transient errors are retried until success."""
+        func = query(side_effect=[busy(), busy(), "rows"])
+        wrapper = self.decorate(func)
+        self.assertEqual(wrapper(), "rows")
+        self.assertEqual(func.call_count, 3)
+        metrics = wrapper.metrics.as_dict()
+        self.assertEqual((metrics["retries"], metrics["failures"]), (2, 2))
+
+    def test_gives_up(self):
+        """Test that the last transient error is raised after the retries."""
+        wrapper = self.decorate(query(side_effect=busy()), retries=1)
+        with self.assertRaises(sqlite3.OperationalError):
+            wrapper()
+        self.assertEqual(wrapper.metrics.as_dict()["gave_up"], 1)
+
+    def test_other_errors_not_retried(self):
+        """Test that a non-transient error is raised at once."""
+        func = query(side_effect=sqlite3.IntegrityError("UNIQUE"))
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.decorate(func)()
+        self.assertEqual(func.call_count, 1)
+
+    def test_pool_timeout_not_counted(self):
+        """Test that pool timeouts are neither retried nor open the circuit."""
+        func = query(side_effect=PoolTimeoutError("pool exhausted"))
+        wrapper = self.decorate(func)
+        for _ in range(6):
+            with self.assertRaises(PoolTimeoutError):
+                wrapper()
+        self.assertEqual(func.call_count, 6)
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_open_circuit_short_circuits(self):
+        """Test that calls fail fast while the circuit is open."""
+        func = query(side_effect=busy())
+        wrapper = self.decorate(func, retries=5)
+        with self.assertRaises(retry.CircuitOpenError):
+            wrapper()
+        self.assertEqual(func.call_count, 4)
+        self.assertEqual(wrapper.metrics.as_dict()["short_circuited"], 1)
+
+    def test_non_transient_error_does_not_close_circuit(self):
+        """Test that only a real success closes a half-open circuit."""
+        with self.assertRaises(retry.CircuitOpenError):
+            self.decorate(query(side_effect=busy()), retries=5)()
+        time.sleep(0.06)
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.decorate(query(side_effect=sqlite3.IntegrityError("UNIQUE")))()
+        self.assertEqual(self.breaker.state, 'half-open')
+        self.assertEqual(self.decorate(query(return_value="rows"))(), "rows")
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_interrupted_trial_frees_the_slot(self):
+        """Test that a BaseException in the trial does not wedge the circuit."""
+        with self.assertRaises(retry.CircuitOpenError):
+            self.decorate(query(side_effect=busy()), retries=5)()
+        time.sleep(0.06)
+        with self.assertRaises(KeyboardInterrupt):
+            self.decorate(query(side_effect=KeyboardInterrupt))()
+        self.assertEqual(self.decorate(query(return_value="rows"))(), "rows")
+
+
+if __name__ == '__main__':
+    unittest.main()
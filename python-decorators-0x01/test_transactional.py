@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Unit tests for the 2-transactional module."""
+import asyncio
+import contextlib
+import io
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest.mock import AsyncMock, patch
+import cache_engine
+import connection_pool
+
+transactional = None
+
+UPDATE = "UPDATE users SET email = ? WHERE id = ?"
+# Same effect as UPDATE, but a different statement signature
+UPDATE_OTHER = "UPDATE users SET email = ? WHERE id = ? AND 1 = 1"
+
+
+def setUpModule():
+    """Import the module from a directory holding its demo users.db."""
+    global transactional
+    directory = tempfile.TemporaryDirectory()
+    unittest.addModuleCleanup(directory.cleanup)
+    unittest.addModuleCleanup(os.chdir, os.getcwd())
+    os.chdir(directory.name)
+    with sqlite3.connect("users.db") as conn:
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT)")
+        conn.execute("INSERT INTO users VALUES (1, 'a@example.com')")
+        conn.execute("CREATE TABLE log (email TEXT)")
+    with contextlib.redirect_stdout(io.StringIO()):
+        transactional = __import__('2-transactional')
+
+
+def email(user_id=1):
+    """Return the stored email of a user."""
+    with connection_pool.get_pool("users.db").connection() as conn:
+        return conn.execute("SELECT email FROM users WHERE id = ?",
+                            (user_id,)).fetchone()[0]
+
+
+class TestGroupCommitter(unittest.TestCase):
+    """Test cases for the GroupCommitter class."""
+
+    def setUp(self):
+        """Build a committer that waits long enough to batch every submit."""
+        self.committer = transactional.GroupCommitter(max_delay=0.2)
+
+    def test_submission_order_kept(self):
+        """Test that writes apply in order across statement signatures."""
+        futures = [self.committer.submit([(UPDATE, ("A", 1))]),
+                   self.committer.submit([(UPDATE_OTHER, ("B", 1))]),
+                   self.committer.submit([(UPDATE, ("C", 1))])]
+        for future in futures:
+            future.result(5)
+        self.assertEqual(email(), "C")
+        self.assertEqual(self.committer.stats()["batches"], 1)
+
+    def test_multi_statement_writes_not_interleaved(self):
+        """Test that each caller's statements run before the next caller's."""
+        with connection_pool.get_pool("users.db").connection() as conn:
+            conn.execute("DELETE FROM log")
+            conn.commit()
+        statements = [UPDATE, "INSERT INTO log SELECT email FROM users WHERE id = ?"]
+        futures = [self.committer.submit([(statements[0], (value, 1)),
+                                          (statements[1], (1,))])
+                   for value in ("A", "B")]
+        for future in futures:
+            future.result(5)
+        with connection_pool.get_pool("users.db").connection() as conn:
+            logged = conn.execute("SELECT email FROM log ORDER BY rowid").fetchall()
+        self.assertEqual(logged, [("A",), ("B",)])
+
+    def test_failing_write_isolated(self):
+        """Test that only the caller whose write fails sees the error."""
+        good = self.committer.submit([(UPDATE, ("good", 1))], result="ok")
+        bad = self.committer.submit([("INSERT INTO users VALUES (1, 'x')", ())])
+        self.assertEqual(good.result(5), "ok")
+        with self.assertRaises(sqlite3.IntegrityError):
+            bad.result(5)
+        self.assertEqual(email(), "good")
+
+    def test_flush_error_reaches_every_caller(self):
+        """Test that a failure to get a connection fails all futures only."""
+        with patch.object(connection_pool, "get_pool",
+                          side_effect=RuntimeError("no pool")):
+            futures = [self.committer.submit([(UPDATE, ("lost", 1))])
+                       for _ in range(3)]
+            for future in futures:
+                with self.assertRaises(RuntimeError):
+                    future.result(5)
+        thread = self.committer._thread
+        self.committer.submit([(UPDATE, ("after", 1))]).result(5)
+        self.assertIs(self.committer._thread, thread)
+        self.assertEqual(email(), "after")
+
+    def test_cancelled_write_dropped(self):
+        """Test that a write cancelled while queued never runs."""
+        future = self.committer.submit([(UPDATE, ("cancelled", 1))])
+        self.assertTrue(future.cancel())
+        self.committer.submit([(UPDATE, ("kept", 1))]).result(5)
+        self.assertEqual(email(), "kept")
+
+
+class TestTransactional(unittest.TestCase):
+    """Test cases for the transactional decorator."""
+
+    def test_commit_invalidates_custom_cache(self):
+        """Test that a commit drops results of the table it wrote."""
+        cache = cache_engine.QueryCache()
+        cache.set("users", 1, tables={"users"})
+        cache.set("orders", 2, tables={"orders"})
+        transactional.update_user_email(user_id=1, new_email="new@example.com")
+        self.assertNotIn("users", cache)
+        self.assertEqual(cache.get("orders"), 2)
+
+    def test_rollback_on_error(self):
+        """Test that a failing function leaves no writes behind."""
+        @transactional.with_db_connection
+        @transactional.transactional
+        def update_then_fail(conn):
+            conn.execute(UPDATE, ("rolled back", 1))
+            raise ValueError("fail")
+
+        before = email()
+        with self.assertRaises(ValueError):
+            update_then_fail()
+        self.assertEqual(email(), before)
+
+    def test_async_rollback_on_cancel(self):
+        """Test that a cancelled coroutine's transaction is rolled back."""
+        @transactional.transactional
+        async def update(conn):
+            raise asyncio.CancelledError
+
+        conn = AsyncMock()
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(update(conn))
+        conn.rollback.assert_awaited_once()
+        conn.commit.assert_not_awaited()
+
+    def test_batched_timeout(self):
+        """Test that a batched call stops waiting after its timeout."""
+        committer = transactional.GroupCommitter()
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        @transactional.transactional(batch=True, committer=committer,
+                                     timeout=0.05)
+        def update(conn):
+            conn.execute(UPDATE, ("late", 1))
+
+        with patch.object(committer, "_flush",
+                          side_effect=lambda batch: release.wait(5)):
+            with self.assertRaises(TimeoutError):
+                update()
+
+
+if __name__ == '__main__':
+    unittest.main()
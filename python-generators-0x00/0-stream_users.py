@@ -1,21 +1,57 @@
 import mysql.connector
 
-def stream_users():
-    """Generator that streams rows from user_data table one by one"""
+import connection_pool
+import seed
+
+def stream_users(chunk_size=None, row_format="dict"):
+    """Generator that streams rows from user_data table one by one
+
+    Rows are dicts by default; row_format="row" yields compact seed.Row
+    tuples (key and attribute access) and "tuple" plain tuples. With
+    chunk_size set, rows are read through an unbuffered cursor with
+    fetchmany(chunk_size), so at most one chunk is held in client memory
+    however large the table is. The connection is borrowed from the shared
+    pool and returned as soon as the generator finishes, or closed if the
+    generator is abandoned early.
+    """
+    pool = connection_pool.get_pool()
+    connection = None
+    cursor = None
+    finished = False
     try:
-        connection = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",  # replace with your password
-            database="ALX_prodev"
-        )
-        cursor = connection.cursor(dictionary=True)
+        connection = pool.acquire(overflow=True)
+        if connection is None:
+            return
+        if chunk_size is None:
+            cursor = seed.open_cursor(connection, row_format)
+        else:
+            cursor = seed.open_cursor(connection, row_format, buffered=False)
+            cursor.arraysize = chunk_size
         cursor.execute("SELECT user_id, name, email, age FROM user_data")
 
-        for row in cursor:
-            yield row
-
-        cursor.close()
-        connection.close()
+        if chunk_size is None:
+            if row_format == "row":
+                make_row = seed.row_class(tuple(cursor.column_names))
+                for row in cursor:
+                    yield make_row(row)
+            else:
+                for row in cursor:
+                    yield row
+        else:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from seed.convert_rows(cursor, rows, row_format)
+        finished = True
     except mysql.connector.Error as err:
         print(f"Error: {err}")
+    finally:
+        if cursor is not None:
+            try:
+                cursor.close()
+            except mysql.connector.Error:
+                pass
+        # Abandoned mid-stream: unread rows are dropped with the connection
+        # instead of being drained from the server
+        pool.release(connection, discard=not finished)
@@ -3,57 +3,171 @@
 Batch processing module for streaming and processing user data in batches
 """
 
+import connection_pool
 import seed
 
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for the columnar mode
+    np = None
 
-def stream_users_in_batches(batch_size):
+
+def stream_batches(batch_size, mode="offset", cursor=None, row_format="dict"):
     """
-    Generator function that fetches users from database in batches
+    Generator function that fetches whole batches of users from database
     
     Args:
         batch_size (int): Number of users to fetch in each batch
+        mode (str): "offset" for LIMIT/OFFSET batches, or "keyset" to seek
+            on user_id so that deep batches cost the same as the first
+        cursor (str, optional): Keyset token to resume from, as produced by
+            seed.encode_cursor(user['user_id']) for the last user processed
+        row_format (str): "dict", "row" for compact seed.Row tuples with
+            key and attribute access, or "tuple" for plain tuples in
+            seed.USER_COLUMNS order
         
     Yields:
-        dict: Individual user records from the database
+        list: One batch of user records
     """
-    # Get database connection
-    connection = seed.connect_to_prodev()
-    
-    # Initialize offset for pagination
+    if mode not in ("offset", "keyset"):
+        raise ValueError(f"Unknown pagination mode: {mode!r}")
+    if cursor is not None and mode != "keyset":
+        raise ValueError("A cursor token can only be used in keyset mode")
+
+    # Initialize offset (or last user_id seen) for pagination
     offset = 0
+    after = seed.decode_cursor(cursor)
     
-    # Loop 1: Fetch data in batches using SQL queries
-    while True:
-        # SQL query to SELECT users FROM user_data table in batches
-        query = f"SELECT * FROM user_data LIMIT {batch_size} OFFSET {offset}"
-        
-        # Execute query and get batch results
-        batch_results = connection.execute(query)
-        
-        # Check if no more results
-        if not batch_results:
-            return
+    # Borrow a database connection from the shared pool
+    with connection_pool.pooled_connection(overflow=True) as connection:
+        # Loop 1: Fetch data in batches using SQL queries
+        while True:
+            if mode == "keyset":
+                # Seek past the last user_id seen instead of counting rows
+                batch_results = seed.fetch_page_after(
+                    connection, batch_size, after, row_format=row_format)
+            else:
+                # SQL query to SELECT users FROM user_data table in batches
+                query = (f"SELECT {', '.join(seed.USER_COLUMNS)} FROM user_data "
+                         f"LIMIT {batch_size} OFFSET {offset}")
+                
+                # Execute query and get batch results
+                db_cursor = seed.open_cursor(connection, row_format)
+                db_cursor.execute(query)
+                batch_results = seed.convert_rows(
+                    db_cursor, db_cursor.fetchall(), row_format)
+                db_cursor.close()
             
+            # Check if no more results
+            if not batch_results:
+                return
+                
+            yield batch_results
+                
+            # Move to next batch
+            offset += batch_size
+            after = seed.user_id_of(batch_results[-1])
+
+
+def stream_users_in_batches(batch_size, mode="offset", cursor=None, row_format="dict"):
+    """
+    Generator function that fetches users from database in batches
+    
+    Args:
+        batch_size (int): Number of users to fetch in each batch
+        mode (str): "offset" or "keyset", see stream_batches
+        cursor (str, optional): Keyset token to resume from
+        row_format (str): "dict", "row" or "tuple", see stream_batches
+        
+    Yields:
+        dict: Individual user records from the database
+    """
+    for batch_results in stream_batches(batch_size, mode, cursor, row_format):
         # Loop 2: Yield each user in the current batch
         for user in batch_results:
             yield user
-            
-        # Move to next batch
-        offset += batch_size
 
 
-def batch_processing(batch_size):
+def stream_column_batches(batch_size, mode="offset", cursor=None):
+    """
+    Generator function that fetches batches of users as NumPy columns
+    
+    Each batch is returned as one contiguous array per field, so filters
+    and aggregates over a column run vectorized instead of row by row.
+    
+    Args:
+        batch_size (int): Number of users to fetch in each batch
+        mode (str): "offset" or "keyset", see stream_batches
+        cursor (str, optional): Keyset token to resume from
+        
+    Yields:
+        tuple: (columns, rows) where columns maps each name in
+        seed.USER_COLUMNS to an array (age as float64, text fields as
+        object arrays) and rows are the fetched tuples, kept so that
+        surviving rows can be rebuilt without copying their values
+    """
+    if np is None:
+        raise ImportError("numpy is required for columnar batches")
+    for rows in stream_batches(batch_size, mode, cursor, row_format="tuple"):
+        columns = {}
+        for name, values in zip(seed.USER_COLUMNS, zip(*rows)):
+            if name == 'age':
+                columns[name] = np.array(values, dtype=np.float64)
+            else:
+                columns[name] = np.array(values, dtype=object)
+        yield columns, rows
+
+
+def stream_users_over_25_columnar(batch_size, mode="offset", cursor=None):
+    """
+    Generator function yielding users over 25 using vectorized filtering
+    
+    Args:
+        batch_size (int): Number of users to fetch in each batch
+        mode (str): "offset" or "keyset", see stream_batches
+        cursor (str, optional): Keyset token to resume from
+        
+    Yields:
+        dict: User records over 25, built only for rows that pass
+    """
+    for columns, rows in stream_column_batches(batch_size, mode, cursor):
+        for index in np.flatnonzero(columns['age'] > 25):
+            yield dict(zip(seed.USER_COLUMNS, rows[index]))
+
+
+def is_over_25(user):
+    """
+    Filter used by batch_processing: keep users older than 25
+    
+    Args:
+        user (dict): User record
+        
+    Returns:
+        bool: True if the user is over 25
+    """
+    return user.get('age', 0) > 25
+
+
+def batch_processing(batch_size, mode="offset", columnar=False):
     """
     Process users in batches and filter those over 25 years old
     
     Args:
         batch_size (int): Size of each batch to process
+        mode (str): Pagination mode passed to stream_users_in_batches
+        columnar (bool): Filter each batch as a NumPy column instead of
+            checking users one dict at a time
         
     Prints:
         Filtered users over 25 years old
     """
+    if columnar:
+        for user in stream_users_over_25_columnar(batch_size, mode=mode):
+            print(user)
+        return
+
     # Loop 3: Process each user from the generator
-    for user in stream_users_in_batches(batch_size):
+    for user in stream_users_in_batches(batch_size, mode=mode):
         # Filter users over 25 and print them
-        if user.get('age', 0) > 25:
+        if is_over_25(user):
             print(user)
@@ -3,44 +3,167 @@
 Lazy pagination module for fetching paginated data from users database
 """
 
+import queue
+import threading
+import time
+
+import connection_pool
 import seed
 
 
-def paginate_users(page_size, offset):
+class Page(list):
+    """
+    A page of users that also carries the cursor token to resume after it
+
+    Behaves exactly like the list returned by paginate_users, so existing
+    consumers keep working unchanged. next_cursor is a keyset token, so
+    it is None on pages fetched by offset.
+    """
+
+    def __init__(self, rows, next_cursor=None):
+        super().__init__(rows)
+        self.next_cursor = next_cursor
+
+
+def paginate_users(page_size, offset, row_format="dict"):
     """
     Fetch users from database with pagination
     
     Args:
         page_size (int): Number of users per page
         offset (int): Starting position for the query
+        row_format (str): "dict", "row" for compact seed.Row tuples, or
+            "tuple"
         
     Returns:
         list: List of user dictionaries for the current page
     """
-    connection = seed.connect_to_prodev()
-    cursor = connection.cursor(dictionary=True)
-    cursor.execute(f"SELECT * FROM user_data LIMIT {page_size} OFFSET {offset}")
-    rows = cursor.fetchall()
-    connection.close()
+    with connection_pool.pooled_connection() as connection:
+        cursor = seed.open_cursor(connection, row_format)
+        cursor.execute(f"SELECT {', '.join(seed.USER_COLUMNS)} FROM user_data "
+                       f"LIMIT {page_size} OFFSET {offset}")
+        rows = seed.convert_rows(cursor, cursor.fetchall(), row_format)
+        cursor.close()
     return rows
 
 
-def lazy_paginate(page_size):
+def paginate_users_after(page_size, cursor=None, row_format="dict"):
     """
-    Generator function that lazily loads paginated data
+    Fetch the page of users that follows a cursor token (keyset pagination)
     
     Args:
         page_size (int): Number of users per page
+        cursor (str, optional): Token from a previous page, None to start
+        row_format (str): "dict", "row" or "tuple", see paginate_users
+        
+    Returns:
+        Page: List of user dictionaries ordered by user_id, with the
+        token to resume after it in ``next_cursor``
+    """
+    with connection_pool.pooled_connection() as connection:
+        rows = seed.fetch_page_after(
+            connection, page_size, seed.decode_cursor(cursor), row_format=row_format)
+    next_cursor = seed.encode_cursor(seed.user_id_of(rows[-1])) if rows else cursor
+    return Page(rows, next_cursor)
+
+
+class PrefetchStats:
+    """
+    Counters describing how well prefetching overlaps work
+
+    Attributes:
+        pages (int): Pages handed to the consumer
+        consumer_wait (float): Seconds the consumer spent waiting for a page
+            (the database is the bottleneck)
+        producer_wait (float): Seconds the fetch thread spent waiting for
+            buffer space (the consumer is the bottleneck)
+    """
+
+    def __init__(self):
+        self.pages = 0
+        self.consumer_wait = 0.0
+        self.producer_wait = 0.0
+
+    def __repr__(self):
+        return (f"PrefetchStats(pages={self.pages}, "
+                f"consumer_wait={self.consumer_wait:.3f}s, "
+                f"producer_wait={self.producer_wait:.3f}s)")
+
+
+def prefetch_pages(pages, depth, stats=None):
+    """
+    Generator that fetches pages in a background thread ahead of the consumer
+    
+    While the consumer works on page N, the thread fetches up to depth
+    further pages, so database latency and processing overlap. Closing the
+    generator early stops the thread and closes the source.
+    
+    Args:
+        pages (generator): Source of pages, consumed only by the thread
+        depth (int): Maximum number of pages fetched ahead
+        stats (PrefetchStats, optional): Updated with stall times
         
     Yields:
-        list: Page of users as a list of dictionaries
+        list: Pages from the source, in order
     """
+    stats = stats if stats is not None else PrefetchStats()
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    end = object()
+
+    def put(item):
+        started = time.perf_counter()
+        try:
+            while not stop.is_set():
+                try:
+                    buffer.put(item, timeout=0.05)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            stats.producer_wait += time.perf_counter() - started
+
+    def produce():
+        try:
+            for page in pages:
+                if not put((page, None)):
+                    return
+            put((end, None))
+        except Exception as err:
+            put((end, err))
+        finally:
+            pages.close()
+
+    worker = threading.Thread(target=produce, name="lazy-paginate-prefetch", daemon=True)
+    worker.start()
+    try:
+        while True:
+            started = time.perf_counter()
+            page, error = buffer.get()
+            stats.consumer_wait += time.perf_counter() - started
+            if error is not None:
+                raise error
+            if page is end:
+                return
+            stats.pages += 1
+            yield page
+    finally:
+        stop.set()
+        worker.join()
+
+
+def _pages(page_size, mode, cursor, row_format):
+    """Fetch pages one after another until the table is exhausted"""
     offset = 0
     
     # Single loop to fetch pages lazily
     while True:
         # Fetch the next page using paginate_users
-        page_data = paginate_users(page_size, offset)
+        if mode == "keyset":
+            page_data = paginate_users_after(page_size, cursor, row_format)
+        else:
+            page_data = Page(paginate_users(page_size, offset, row_format))
         
         # If no data returned, we've reached the end
         if not page_data:
@@ -50,7 +173,43 @@ def lazy_paginate(page_size):
         yield page_data
         
         # Move to the next page
-        offset += page_size
+        if mode == "keyset":
+            cursor = page_data.next_cursor
+        else:
+            offset += page_size
+
+
+def lazy_paginate(page_size, mode="offset", cursor=None, prefetch=0, stats=None,
+                  row_format="dict"):
+    """
+    Generator function that lazily loads paginated data
+    
+    Args:
+        page_size (int): Number of users per page
+        mode (str): "offset" for LIMIT/OFFSET paging, or "keyset" to seek
+            on user_id so that every page costs the same
+        cursor (str, optional): Keyset token to resume from, e.g. the
+            ``next_cursor`` of the last page a crashed consumer finished
+        prefetch (int): Pages fetched ahead in a background thread while
+            the consumer works, 0 to fetch strictly on demand
+        stats (PrefetchStats, optional): Receives stall times when
+            prefetching
+        row_format (str): "dict", "row" or "tuple", see paginate_users
+        
+    Yields:
+        Page: Page of users as a list of dictionaries; next_cursor is set
+        in keyset mode and None in offset mode
+    """
+    if mode not in ("offset", "keyset"):
+        raise ValueError(f"Unknown pagination mode: {mode!r}")
+    if cursor is not None and mode != "keyset":
+        raise ValueError("A cursor token can only be used in keyset mode")
+
+    pages = _pages(page_size, mode, cursor, row_format)
+    if prefetch > 0:
+        yield from prefetch_pages(pages, prefetch, stats)
+    else:
+        yield from pages
 
 
 # Alias for the function name used in the test
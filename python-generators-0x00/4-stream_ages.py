@@ -3,41 +3,58 @@
 Memory-efficient aggregation module for computing average age using generators
 """
 
+import argparse
+import sys
+
+import connection_pool
 import seed
 
 
-def stream_user_ages():
+def stream_user_ages(chunk_size=1000):
     """
     Generator function that yields user ages one by one
     
+    Args:
+        chunk_size (int): Number of rows pulled from the cursor per fetch
+    
     Yields:
         int: User age from the database
     """
-    # Get database connection
-    connection = seed.connect_to_prodev()
-    cursor = connection.cursor(dictionary=True)
-    
-    # Execute query to get all users
-    cursor.execute("SELECT age FROM user_data")
-    
-    # Loop 1: Fetch and yield ages one by one
-    while True:
-        row = cursor.fetchone()
-        if row is None:
-            break
-        yield row['age']
-    
-    # Close connection
-    connection.close()
+    # Borrow a database connection from the shared pool
+    with connection_pool.pooled_connection(overflow=True) as connection:
+        cursor = connection.cursor(dictionary=True)
+        
+        # Execute query to get all users
+        cursor.execute("SELECT age FROM user_data")
+        
+        # Loop 1: Fetch rows a chunk at a time and yield ages one by one
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row['age']
 
 
-def calculate_average_age():
+def calculate_average_age(mode="stream"):
     """
     Calculate average age using the generator without loading all data into memory
     
+    Args:
+        mode (str): "stream" to scan every age through the generator, or
+            "materialized" to read the count and sum kept up to date by
+            seed.create_age_aggregate in constant time
+    
     Returns:
         float: Average age of all users
     """
+    if mode == "materialized":
+        with connection_pool.pooled_connection() as connection:
+            user_count, total_age, _ = seed.read_age_aggregate(connection)
+        return float(total_age) / user_count if user_count else 0
+    if mode != "stream":
+        raise ValueError(f"Unknown mode: {mode!r}")
+
     total_age = 0
     user_count = 0
     
@@ -53,11 +70,42 @@ def calculate_average_age():
         return 0
 
 
+def verify_age_aggregate(repair=False):
+    """
+    Reconcile the maintained age aggregate against a full table scan
+    
+    Args:
+        repair (bool): Overwrite the aggregate with the scanned values
+        
+    Returns:
+        bool: True if the aggregate matched the scan
+    """
+    with connection_pool.pooled_connection() as connection:
+        result = seed.reconcile_age_aggregate(connection, repair=repair)
+    print(f"maintained (count, sum, sum of squares): {result['maintained']}")
+    print(f"scanned    (count, sum, sum of squares): {result['scanned']}")
+    if result["matches"]:
+        print("Age aggregate is consistent")
+    else:
+        print("Age aggregate has drifted" + (", repaired" if repair else ""))
+    return result["matches"]
+
+
 def main():
     """
     Main function to calculate and print average age
     """
-    average_age = calculate_average_age()
+    parser = argparse.ArgumentParser(description="Average age of users")
+    parser.add_argument("--mode", choices=("stream", "materialized"), default="stream")
+    parser.add_argument("--verify", action="store_true",
+                        help="reconcile the maintained aggregate with a full scan")
+    parser.add_argument("--repair", action="store_true",
+                        help="with --verify, fix the aggregate if it has drifted")
+    args = parser.parse_args()
+
+    if args.verify:
+        sys.exit(0 if verify_age_aggregate(repair=args.repair) else 1)
+    average_age = calculate_average_age(mode=args.mode)
     print(f"Average age of users: {average_age}")
 
 
@@ -0,0 +1,282 @@
+#!/usr/bin/python3
+"""
+Async generator counterparts of the user streaming functions
+
+stream_users, lazy_paginate and stream_user_ages for asyncio code, backed
+by aiomysql against the ALX_prodev server or by aiosqlite when the SQLite
+stand-in is configured (see seed.SQLITE_ENV_VAR).
+
+Rows are only fetched when the consumer asks for them; the optional
+prefetch depth lets a background task run ahead by a bounded number of
+chunks or pages, so a slow consumer never causes unbounded buffering.
+"""
+
+import asyncio
+import os
+
+import seed
+
+try:
+    import aiomysql
+except ImportError:  # only needed against the MySQL server
+    aiomysql = None
+
+try:
+    import aiosqlite
+except ImportError:  # only needed against the SQLite stand-in
+    aiosqlite = None
+
+Page = __import__('2-lazy_paginate').Page
+
+
+class AsyncConnection:
+    """
+    Thin async connection over aiomysql or aiosqlite
+
+    Both backends take %s placeholders and return rows as dicts.
+    """
+
+    def __init__(self, connection, dialect):
+        self._connection = connection
+        self.dialect = dialect
+
+    def _query(self, query):
+        return query.replace("%s", "?") if self.dialect == "sqlite" else query
+
+    async def _execute(self, query, params, unbuffered):
+        if self.dialect == "sqlite":
+            return await self._connection.execute(self._query(query), params)
+        cursor_class = aiomysql.SSDictCursor if unbuffered else aiomysql.DictCursor
+        cursor = await self._connection.cursor(cursor_class)
+        await cursor.execute(query, params)
+        return cursor
+
+    async def fetchall(self, query, params=()):
+        """
+        Run a query and return every row
+
+        Args:
+            query (str): SQL with %s placeholders
+            params (tuple): Bound parameters
+
+        Returns:
+            list: Rows as dictionaries
+        """
+        cursor = await self._execute(query, params, unbuffered=False)
+        try:
+            rows = await cursor.fetchall()
+        finally:
+            await cursor.close()
+        return [dict(row) for row in rows]
+
+    async def stream(self, query, params=(), chunk_size=1000):
+        """
+        Run a query through an unbuffered cursor and yield chunks of rows
+
+        Args:
+            query (str): SQL with %s placeholders
+            params (tuple): Bound parameters
+            chunk_size (int): Rows per fetchmany call
+
+        Yields:
+            list: Up to chunk_size rows as dictionaries
+        """
+        cursor = await self._execute(query, params, unbuffered=True)
+        try:
+            while True:
+                rows = await cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [dict(row) for row in rows]
+        finally:
+            await cursor.close()
+
+    async def close(self):
+        """Close the underlying connection"""
+        if self.dialect == "sqlite":
+            await self._connection.close()
+        else:
+            self._connection.close()
+
+
+async def connect_to_prodev_async():
+    """
+    Open an async connection to ALX_prodev or the SQLite stand-in
+
+    Returns:
+        AsyncConnection: The open connection
+    """
+    path = os.environ.get(seed.SQLITE_ENV_VAR)
+    if path:
+        if aiosqlite is None:
+            raise ImportError("aiosqlite is required for the SQLite stand-in")
+        connection = await aiosqlite.connect(path)
+        connection.row_factory = aiosqlite.Row
+        return AsyncConnection(connection, "sqlite")
+    if aiomysql is None:
+        raise ImportError("aiomysql is required for async MySQL access")
+    connection = await aiomysql.connect(
+        host="localhost",
+        user="root",
+        password="",  # add your password here
+        db="ALX_prodev"
+    )
+    return AsyncConnection(connection, "mysql")
+
+
+async def prefetched(source, depth):
+    """
+    Run an async generator ahead of its consumer by at most depth items
+
+    Args:
+        source: Async generator to read from
+        depth (int): Items buffered ahead, 0 to fetch strictly on demand
+
+    Yields:
+        The items of source, in order
+    """
+    if depth <= 0:
+        try:
+            async for item in source:
+                yield item
+        finally:
+            await source.aclose()
+        return
+
+    queue = asyncio.Queue(maxsize=depth)
+    end = object()
+
+    async def produce():
+        try:
+            async for item in source:
+                await queue.put((item, None))
+            await queue.put((end, None))
+        except Exception as err:
+            await queue.put((end, err))
+
+    task = asyncio.create_task(produce())
+    try:
+        while True:
+            item, error = await queue.get()
+            if error is not None:
+                raise error
+            if item is end:
+                break
+            yield item
+    finally:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await source.aclose()
+
+
+async def _stream_rows(query, chunk_size, prefetch):
+    """Stream rows of a query through one connection, chunk by chunk"""
+    connection = await connect_to_prodev_async()
+    try:
+        async for rows in prefetched(connection.stream(query, (), chunk_size), prefetch):
+            for row in rows:
+                yield row
+    finally:
+        await connection.close()
+
+
+async def stream_users_async(chunk_size=1000, prefetch=0):
+    """
+    Async generator that streams rows from user_data one by one
+
+    Args:
+        chunk_size (int): Rows pulled from the unbuffered cursor per fetch
+        prefetch (int): Chunks fetched ahead of the consumer
+
+    Yields:
+        dict: User record
+    """
+    query = f"SELECT {', '.join(seed.USER_COLUMNS)} FROM user_data"
+    async for row in _stream_rows(query, chunk_size, prefetch):
+        yield row
+
+
+async def stream_user_ages_async(chunk_size=1000, prefetch=0):
+    """
+    Async generator that yields user ages one by one
+
+    Args:
+        chunk_size (int): Rows pulled from the unbuffered cursor per fetch
+        prefetch (int): Chunks fetched ahead of the consumer
+
+    Yields:
+        int: User age
+    """
+    async for row in _stream_rows("SELECT age FROM user_data", chunk_size, prefetch):
+        yield row['age']
+
+
+async def _pages(connection, page_size, mode, cursor):
+    """Fetch pages one at a time, as lazy_paginate does"""
+    offset = 0
+    after = seed.decode_cursor(cursor)
+    while True:
+        if mode == "keyset":
+            rows = await connection.fetchall(*seed.keyset_query(page_size, after))
+        else:
+            rows = await connection.fetchall(
+                f"SELECT {', '.join(seed.USER_COLUMNS)} FROM user_data "
+                "LIMIT %s OFFSET %s", (page_size, offset))
+        if not rows:
+            return
+        if mode == "keyset":
+            after = rows[-1]['user_id']
+            yield Page(rows, seed.encode_cursor(after))
+        else:
+            # A keyset token would resume in the other mode
+            offset += page_size
+            yield Page(rows)
+
+
+async def lazy_paginate_async(page_size, mode="offset", cursor=None, prefetch=0):
+    """
+    Async generator that lazily loads paginated data
+
+    Args:
+        page_size (int): Number of users per page
+        mode (str): "offset" for LIMIT/OFFSET paging, or "keyset" to seek
+            on user_id so that every page costs the same
+        cursor (str, optional): Keyset token to resume from
+        prefetch (int): Pages fetched ahead of the consumer
+
+    Yields:
+        Page: List of user dictionaries; next_cursor is set in keyset mode
+        and None in offset mode
+    """
+    if mode not in ("offset", "keyset"):
+        raise ValueError(f"Unknown pagination mode: {mode!r}")
+    if cursor is not None and mode != "keyset":
+        raise ValueError("A cursor token can only be used in keyset mode")
+
+    connection = await connect_to_prodev_async()
+    try:
+        async for page in prefetched(_pages(connection, page_size, mode, cursor), prefetch):
+            yield page
+    finally:
+        await connection.close()
+
+
+async def main():
+    """
+    Page through the users asynchronously and print the average age
+    """
+    pages = 0
+    async for _ in lazy_paginate_async(100, mode="keyset", prefetch=2):
+        pages += 1
+    total = count = 0
+    async for age in stream_user_ages_async():
+        total += age
+        count += 1
+    print(f"{pages} pages, average age of users: {total / count if count else 0}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,230 @@
+#!/usr/bin/python3
+"""
+Benchmark harness for the user_data streaming strategies
+
+Seeds a SQLite stand-in (or uses the local ALX_prodev MySQL database) with
+synthetic users, then runs stream_users, stream_users_in_batches,
+lazy_paginate and stream_user_ages at several batch sizes. Every run
+happens in a fresh process so peak RSS is measured per strategy. Results
+(rows/sec, time to first row, peak RSS, memory per in-flight row and
+garbage collections) are printed as a table and
+written as a JSON report for regression tracking.
+
+Usage:
+    ./benchmark.py [--rows N] [--batch-sizes N ...] [--sqlite PATH | --mysql]
+                   [--output report.json]
+"""
+
+import argparse
+import gc
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import seed
+
+
+def seed_sqlite(path, rows):
+    """
+    Create a SQLite stand-in holding exactly rows synthetic users
+
+    An existing file with the right row count is reused.
+
+    Args:
+        path (str): SQLite database file
+        rows (int): Number of users
+    """
+    connection = seed.connect_sqlite(path)
+    seed.create_table(connection)
+    cursor = connection.cursor()
+    cursor.execute("SELECT COUNT(*) FROM user_data")
+    if cursor.fetchone()[0] != rows:
+        cursor.execute("DELETE FROM user_data")
+        seed.seed_users(connection, rows, random_seed=0)
+    cursor.close()
+    connection.close()
+
+
+def strategies(batch_sizes, row_formats=("dict",)):
+    """
+    Build the list of benchmark cases
+
+    Args:
+        batch_sizes (list): Batch/page/chunk sizes to try
+        row_formats (list): Row representations to try where supported
+
+    Returns:
+        list: (name, batch size or None, row format) triples
+    """
+    cases = [("stream_users", None, row_format) for row_format in row_formats]
+    for size in batch_sizes:
+        for row_format in row_formats:
+            cases += [
+                ("stream_users", size, row_format),
+                ("stream_users_in_batches/offset", size, row_format),
+                ("stream_users_in_batches/keyset", size, row_format),
+                ("lazy_paginate/offset", size, row_format),
+                ("lazy_paginate/keyset", size, row_format),
+            ]
+        cases.append(("stream_user_ages", size, None))
+    return cases
+
+
+def _iterate(name, size, row_format):
+    """Return the row iterator for one benchmark case"""
+    if name == "stream_users":
+        return __import__('0-stream_users').stream_users(
+            chunk_size=size, row_format=row_format)
+    if name.startswith("stream_users_in_batches/"):
+        mode = name.split("/")[1]
+        return __import__('1-batch_processing').stream_users_in_batches(
+            size, mode=mode, row_format=row_format)
+    if name.startswith("lazy_paginate/"):
+        mode = name.split("/")[1]
+        pages = __import__('2-lazy_paginate').lazy_paginate(
+            size, mode=mode, row_format=row_format)
+        return (row for page in pages for row in page)
+    if name == "stream_user_ages":
+        return __import__('4-stream_ages').stream_user_ages(chunk_size=size)
+    raise ValueError(f"Unknown strategy: {name}")
+
+
+def _bytes_per_row(name, size, row_format, sample=1000):
+    """Traced memory per in-flight row while holding the first sample rows"""
+    rows = _iterate(name, size, row_format)
+    tracemalloc.start()
+    try:
+        held = list(itertools.islice(rows, sample))
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        rows.close()
+    return current / len(held) if held else 0.0
+
+
+def _peak_rss_kib():
+    """Peak resident set size of this process, in KiB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def run_case(name, size, row_format, environment):
+    """
+    Run one benchmark case (called in a fresh worker process)
+
+    Args:
+        name (str): Strategy name
+        size (int): Batch size, or None for the strategy default
+        row_format (str): Row representation, None where not applicable
+        environment (dict): Environment variables selecting the database
+
+    Returns:
+        dict: Measurements for the case
+    """
+    os.environ.update(environment)
+    baseline_rss = _peak_rss_kib()
+    collections = sum(stat["collections"] for stat in gc.get_stats())
+    start = time.perf_counter()
+    first_row = None
+    rows = 0
+    for _ in _iterate(name, size, row_format):
+        if first_row is None:
+            first_row = time.perf_counter() - start
+        rows += 1
+    seconds = time.perf_counter() - start
+    collections = sum(stat["collections"] for stat in gc.get_stats()) - collections
+    peak_rss = _peak_rss_kib()
+    return {
+        "strategy": name,
+        "batch_size": size,
+        "row_format": row_format,
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds else 0.0,
+        "time_to_first_row": first_row,
+        "baseline_rss_kib": baseline_rss,
+        "peak_rss_kib": peak_rss,
+        "gc_collections": collections,
+        "bytes_per_row": _bytes_per_row(name, size, row_format),
+    }
+
+
+def run(cases, environment):
+    """
+    Run every case, each in its own process
+
+    Args:
+        cases (list): (name, batch size, row format) triples
+        environment (dict): Environment variables selecting the database
+
+    Returns:
+        list: Measurements, one dict per case
+    """
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for name, size, row_format in cases:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results.append(
+                pool.submit(run_case, name, size, row_format, environment).result())
+    return results
+
+
+def main():
+    """
+    Parse arguments, seed the database, run the benchmark and report
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--row-formats", nargs="+", default=["dict", "row"],
+                        choices=seed.ROW_FORMATS)
+    parser.add_argument("--sqlite", default="benchmark.db",
+                        help="SQLite stand-in to seed and benchmark")
+    parser.add_argument("--mysql", action="store_true",
+                        help="benchmark the existing ALX_prodev database instead")
+    parser.add_argument("--output", default="benchmark_report.json")
+    args = parser.parse_args()
+
+    if args.mysql:
+        environment = {}
+        os.environ.pop(seed.SQLITE_ENV_VAR, None)
+    else:
+        seed_sqlite(args.sqlite, args.rows)
+        environment = {seed.SQLITE_ENV_VAR: os.path.abspath(args.sqlite)}
+
+    results = run(strategies(args.batch_sizes, args.row_formats), environment)
+    report = {
+        "backend": "mysql" if args.mysql else "sqlite",
+        "rows": args.rows,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'strategy':<32} | {'batch':>6} | {'rows':>5} | {'rows/s':>10} | "
+          f"{'first row ms':>12} | {'peak RSS MiB':>12} | {'B/row':>6} | {'GCs':>5}")
+    print("-" * 114)
+    for result in results:
+        first_row = result["time_to_first_row"]
+        print(f"{result['strategy']:<32} | {str(result['batch_size'] or '-'):>6} | "
+              f"{result['row_format'] or '-':>5} | "
+              f"{result['rows_per_second']:>10.0f} | "
+              f"{(first_row or 0) * 1000:>12.2f} | "
+              f"{result['peak_rss_kib'] / 1024:>12.1f} | "
+              f"{result['bytes_per_row']:>6.0f} | {result['gc_collections']:>5}")
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
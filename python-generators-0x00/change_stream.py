@@ -0,0 +1,259 @@
+#!/usr/bin/python3
+"""
+Incremental change streaming from user_data
+
+Yields only the users inserted or changed since a consumer's last
+acknowledged position instead of re-reading the whole table:
+
+    for batch in stream_changes("mailer"):
+        send(batch)
+        batch.ack()
+
+Rows are ordered by the (updated_at, user_id) high-water mark added by
+seed.enable_change_tracking. The position is persisted in
+stream_watermarks only when a batch is acknowledged, so a consumer that
+crashes mid-batch sees that batch again on its next run.
+
+updated_at is stamped when a row is written but only becomes visible on
+commit, so a slow transaction can commit behind a watermark that has
+already moved past it. Each run therefore re-scans overlap_seconds before
+the watermark and skips the rows the consumer already acknowledged, which
+are remembered in stream_seen for that long.
+"""
+
+import argparse
+
+import connection_pool
+import seed
+
+CHANGE_COLUMNS = seed.USER_COLUMNS + ("updated_at",)
+
+
+def _mark(value):
+    """Normalise an updated_at value (datetime on MySQL, text on SQLite)"""
+    return value if isinstance(value, str) else str(value)
+
+
+def _watermark_of(row):
+    """Return the (updated_at, user_id) watermark of a fetched row"""
+    if isinstance(row, dict):
+        return _mark(row["updated_at"]), row["user_id"]
+    return _mark(row[4]), row[0]
+
+
+class ChangeBatch(list):
+    """
+    A batch of changed users that can be acknowledged once processed
+
+    Behaves like the list of rows it holds; ``watermark`` is the
+    (updated_at, user_id) position just after its last row and
+    ``positions`` the position of every row.
+    """
+
+    def __init__(self, rows, watermark, acknowledge):
+        super().__init__(rows)
+        self.watermark = watermark
+        self.positions = [_watermark_of(row) for row in rows]
+        self._acknowledge = acknowledge
+
+    def ack(self):
+        """Persist the watermark so this batch is not streamed again"""
+        self._acknowledge(self)
+
+
+def read_watermark(consumer, connection=None):
+    """
+    Return the last acknowledged position of a consumer
+
+    Args:
+        consumer (str): Name the consumer streams under
+        connection: Open connection, or None to borrow one from the pool
+
+    Returns:
+        tuple: (updated_at, user_id), or None if nothing was acknowledged
+    """
+    if connection is None:
+        with connection_pool.pooled_connection() as connection:
+            return read_watermark(consumer, connection)
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT updated_at, user_id FROM stream_watermarks WHERE consumer = %s",
+        (consumer,))
+    row = cursor.fetchone()
+    cursor.close()
+    return tuple(row) if row is not None else None
+
+
+def write_watermark(consumer, watermark, connection=None):
+    """
+    Persist the position of a consumer, or forget it
+
+    Args:
+        consumer (str): Name the consumer streams under
+        watermark (tuple): (updated_at, user_id), or None to reset the
+            consumer so that its next run streams every row
+        connection: Open connection, or None to borrow one from the pool
+    """
+    if connection is None:
+        with connection_pool.pooled_connection() as connection:
+            return write_watermark(consumer, watermark, connection)
+    cursor = connection.cursor()
+    cursor.execute("DELETE FROM stream_watermarks WHERE consumer = %s", (consumer,))
+    if watermark is None:
+        cursor.execute("DELETE FROM stream_seen WHERE consumer = %s", (consumer,))
+    if watermark is not None:
+        cursor.execute(
+            "INSERT INTO stream_watermarks (consumer, updated_at, user_id) "
+            "VALUES (%s, %s, %s)", (consumer,) + tuple(watermark))
+    connection.commit()
+    cursor.close()
+
+
+def _time_before(connection, seconds, mark=None):
+    """Return the updated_at value seconds before mark, or before now"""
+    cursor = connection.cursor()
+    if seed.dialect(connection) == "sqlite":
+        cursor.execute("SELECT strftime('%Y-%m-%d %H:%M:%f', %s, %s)",
+                       (mark or "now", f"-{seconds} seconds"))
+    elif mark is None:
+        cursor.execute("SELECT NOW(6) - INTERVAL %s MICROSECOND",
+                       (int(seconds * 1000000),))
+    else:
+        cursor.execute("SELECT CAST(%s AS DATETIME(6)) - INTERVAL %s MICROSECOND",
+                       (mark, int(seconds * 1000000)))
+    value = _mark(cursor.fetchone()[0])
+    cursor.close()
+    return value
+
+
+def _remember(consumer, positions, since, connection):
+    """
+    Record acknowledged positions and forget those older than since
+
+    Only positions at or after since can be re-scanned, so older ones are
+    not stored. Runs in the caller's transaction, so the positions and the
+    watermark they belong to are committed together.
+    """
+    ignore = "OR IGNORE" if seed.dialect(connection) == "sqlite" else "IGNORE"
+    cursor = connection.cursor()
+    recent = [(consumer,) + position for position in positions if position[0] >= since]
+    if recent:
+        cursor.executemany(
+            f"INSERT {ignore} INTO stream_seen (consumer, updated_at, user_id) "
+            "VALUES (%s, %s, %s)", recent)
+    cursor.execute("DELETE FROM stream_seen WHERE consumer = %s AND updated_at < %s",
+                   (consumer, since))
+    cursor.close()
+
+
+def changes_query(batch_size, after=None, skip_seen=False):
+    """
+    Build the query for the next batch of changes
+
+    Args:
+        batch_size (int): Rows per batch
+        after (tuple, optional): (updated_at, user_id) to resume after
+        skip_seen (bool): Leave out the rows the consumer acknowledged,
+            as remembered in stream_seen
+
+    Returns:
+        str: Query taking the cutoff, then the watermark parameters if
+        any, then the consumer if skip_seen
+    """
+    query = f"SELECT {', '.join(CHANGE_COLUMNS)} FROM user_data WHERE updated_at <= %s"
+    if after is not None:
+        query += " AND (updated_at > %s OR (updated_at = %s AND user_id > %s))"
+    if skip_seen:
+        query += (" AND NOT EXISTS (SELECT 1 FROM stream_seen WHERE consumer = %s"
+                  " AND stream_seen.updated_at = user_data.updated_at"
+                  " AND stream_seen.user_id = user_data.user_id)")
+    return query + f" ORDER BY updated_at, user_id LIMIT {batch_size}"
+
+
+def stream_changes(consumer, batch_size=1000, settle_seconds=1.0, overlap_seconds=300.0,
+                   row_format="dict"):
+    """
+    Generator yielding batches of users changed since the consumer's watermark
+
+    One run reads every change up to a cutoff fixed when it starts and
+    then stops, so it terminates even under a steady stream of writes.
+    Changes younger than settle_seconds are left for the next run. The
+    run starts overlap_seconds before the watermark and skips rows the
+    consumer already acknowledged, so a transaction that commits after
+    the watermark moved past its rows is still delivered, once, as long
+    as it committed within overlap_seconds of writing them.
+
+    Args:
+        consumer (str): Name the position is persisted under
+        batch_size (int): Rows per batch
+        settle_seconds (float): Age a change must reach before it is read
+        overlap_seconds (float): How far behind the watermark to re-scan
+            for late commits
+        row_format (str): "dict", "row" or "tuple"; rows carry
+            seed.USER_COLUMNS plus updated_at
+
+    Yields:
+        ChangeBatch: Rows ordered by (updated_at, user_id); call ack() once
+        a batch is processed to persist the position after it
+    """
+    acknowledged = read_watermark(consumer)
+
+    def acknowledge(batch):
+        nonlocal acknowledged
+        # Acknowledging an older batch after a newer one keeps the newer
+        watermark = batch.watermark
+        if acknowledged is not None and acknowledged > watermark:
+            watermark = acknowledged
+        with connection_pool.pooled_connection() as connection:
+            since = _time_before(connection, overlap_seconds, watermark[0])
+            # Committed by write_watermark, in one transaction
+            _remember(consumer, batch.positions, since, connection)
+            write_watermark(consumer, watermark, connection)
+        acknowledged = watermark
+
+    with connection_pool.pooled_connection(overflow=True) as connection:
+        cutoff = _time_before(connection, settle_seconds)
+        if acknowledged is None:
+            after = None
+        else:
+            since = _time_before(connection, overlap_seconds, acknowledged[0])
+            # Every user_id sorts after "", so this starts at since itself
+            after = (since, "")
+        # Acknowledged rows are skipped by the database, so the overlap
+        # is never loaded into memory
+        skip_seen = acknowledged is not None
+        while True:
+            params = (cutoff,) if after is None else (cutoff,) + after[:1] + after
+            if skip_seen:
+                params += (consumer,)
+            cursor = seed.open_cursor(connection, row_format)
+            cursor.execute(changes_query(batch_size, after, skip_seen), params)
+            rows = seed.convert_rows(cursor, cursor.fetchall(), row_format)
+            cursor.close()
+            if not rows:
+                return
+            after = _watermark_of(rows[-1])
+            yield ChangeBatch(rows, after, acknowledge)
+
+
+def main():
+    """
+    Print the users changed since the last run of a consumer and ack them
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__.strip())
+    parser.add_argument("consumer", help="name the watermark is stored under")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--reset", action="store_true",
+                        help="forget the watermark and stream every row")
+    args = parser.parse_args()
+
+    if args.reset:
+        write_watermark(args.consumer, None)
+    for batch in stream_changes(args.consumer, args.batch_size):
+        for user in batch:
+            print(user)
+        batch.ack()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Bounded pool of reusable ALX_prodev connections for the generators
+
+Opening a MySQL connection costs a TCP and auth handshake, more than a
+short page query. The pool keeps up to max_size connections, hands an
+idle one to each borrower and rolls it back on return, so a borrower
+always starts with a fresh transaction.
+
+Generators hold their connection for as long as the caller keeps them
+suspended, so they borrow with overflow=True: once every pooled
+connection is in use they get a dedicated one, closed when they finish,
+instead of waiting on other suspended generators.
+"""
+
+import contextlib
+import os
+import threading
+import time
+
+import seed
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of ALX_prodev connections
+
+    Idle connections are reused (a hit) instead of opening a new one (a
+    miss). At most max_size pooled connections exist at once; borrowers
+    beyond that wait, or get a dedicated connection with overflow=True.
+    Connections idle longer than idle_timeout are closed, and ones idle
+    longer than ping_after are checked with is_connected() before being
+    handed out. Connections are never opened, pinged or closed while the
+    pool's lock is held.
+    """
+
+    def __init__(self, connect=None, max_size=8, idle_timeout=300.0, ping_after=30.0):
+        """
+        Args:
+            connect (callable): Opens a connection, or returns None on
+                failure; defaults to seed.connect_to_prodev
+            max_size (int): Most pooled connections open at once
+            idle_timeout (float): Seconds before an idle connection is closed
+            ping_after (float): Seconds idle before a connection is pinged
+        """
+        self._connect = connect or seed.connect_to_prodev
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self._condition = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = []  # (connection, time it was returned)
+        self._size = 0
+        self._dedicated = set()  # ids of overflow connections in use
+        self._stats = {
+            "hits": 0, "misses": 0, "overflow": 0, "waits": 0, "wait_seconds": 0.0,
+            "closed_idle": 0, "closed_dead": 0, "discarded": 0,
+        }
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _alive(connection):
+        try:
+            return connection.is_connected()
+        except Exception:
+            return False
+
+    def _prune(self, now):
+        """Take connections idle for longer than idle_timeout out of the pool"""
+        stale = []
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            stale.append(self._idle.pop(0)[0])
+            self._size -= 1
+            self._stats["closed_idle"] += 1
+        return stale
+
+    def _give_back(self, stat=None):
+        """Free the slot of a pooled connection that is gone"""
+        with self._condition:
+            self._size -= 1
+            if stat is not None:
+                self._stats[stat] += 1
+            self._condition.notify()
+
+    def acquire(self, timeout=30.0, overflow=False):
+        """
+        Borrow a connection
+
+        Args:
+            timeout (float): Seconds to wait for a pooled connection before
+                TimeoutError, None to wait forever
+            overflow (bool): Open a dedicated connection instead of waiting
+                when every pooled one is in use
+
+        Returns:
+            The connection, or None if it could not be opened
+        """
+        started = time.perf_counter()
+        waited = False
+        while True:
+            connection = returned = None
+            dedicated = retry = timed_out = False
+            with self._condition:
+                if self._pid != os.getpid():
+                    # Sockets inherited across fork must not be shared
+                    self._reset()
+                now = time.monotonic()
+                stale = self._prune(now)
+                if self._idle:
+                    connection, returned = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                elif overflow:
+                    dedicated = True
+                else:
+                    remaining = None if timeout is None else timeout - (time.perf_counter() - started)
+                    if remaining is not None and remaining <= 0:
+                        timed_out = True
+                    else:
+                        waited = retry = True
+                        self._stats["waits"] += 1
+                        self._condition.wait(remaining)
+            for old in stale:
+                self._close_quietly(old)
+            if timed_out:
+                raise TimeoutError("Timed out waiting for a pooled connection")
+            if retry:
+                continue
+
+            if connection is not None:
+                if now - returned > self.ping_after and not self._alive(connection):
+                    self._give_back("closed_dead")
+                    self._close_quietly(connection)
+                    continue
+                self._count("hits", started, waited)
+                return connection
+
+            try:
+                connection = self._connect()
+            finally:
+                if connection is None and not dedicated:
+                    self._give_back()
+            if connection is not None:
+                self._count("overflow" if dedicated else "misses", started, waited,
+                            connection if dedicated else None)
+            return connection
+
+    def _count(self, stat, started, waited, dedicated=None):
+        with self._condition:
+            self._stats[stat] += 1
+            if waited:
+                self._stats["wait_seconds"] += time.perf_counter() - started
+            if dedicated is not None:
+                self._dedicated.add(id(dedicated))
+
+    def release(self, connection, discard=False):
+        """Return a borrowed connection, or close it if discard is set"""
+        if connection is None:
+            return
+        with self._condition:
+            if self._pid != os.getpid():
+                return
+            if id(connection) in self._dedicated:
+                self._dedicated.discard(id(connection))
+                dedicated = True
+            else:
+                dedicated = False
+        if dedicated:
+            self._close_quietly(connection)
+            return
+        if not discard:
+            try:
+                connection.rollback()
+            except Exception:
+                discard = True
+        with self._condition:
+            if discard:
+                self._size -= 1
+                self._stats["discarded"] += 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+        if discard:
+            self._close_quietly(connection)
+
+    @contextlib.contextmanager
+    def connection(self, overflow=False):
+        """
+        Borrow a connection for a with block
+
+        The connection is discarded instead of reused if the block raises
+        (or a generator using it is closed early), since it may still hold
+        unread results.
+
+        Args:
+            overflow (bool): See acquire
+        """
+        connection = self.acquire(overflow=overflow)
+        try:
+            yield connection
+        except BaseException:
+            self.release(connection, discard=True)
+            raise
+        self.release(connection)
+
+    def stats(self):
+        """Return hit, miss, wait and close counters plus current sizes"""
+        with self._condition:
+            return dict(self._stats, size=self._size, idle=len(self._idle),
+                        dedicated=len(self._dedicated))
+
+    def close(self):
+        """Close every idle connection"""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for connection, _ in idle:
+            self._close_quietly(connection)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the shared connection pool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def pooled_connection(overflow=False):
+    """
+    Borrow a connection from the shared pool for a with block
+
+    Args:
+        overflow (bool): Set by generators, which may stay suspended
+            while holding it; see ConnectionPool.acquire
+    """
+    return get_pool().connection(overflow)
+
+
+def pool_stats():
+    """Return the statistics of the shared connection pool"""
+    return get_pool().stats()
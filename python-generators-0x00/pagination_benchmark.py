@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+"""
+Benchmark comparing OFFSET and keyset pagination over user_data
+
+For every depth, times fetching one page with LIMIT/OFFSET against
+fetching the same page by seeking past the user_id just before it.
+OFFSET cost grows with depth while keyset cost stays flat.
+
+Usage:
+    ./pagination_benchmark.py [--page-size N] [--repeat N] [--depths D ...]
+"""
+
+import argparse
+import time
+
+import seed
+
+COLUMNS = ", ".join(seed.USER_COLUMNS)
+
+
+def time_query(connection, query, params=(), repeat=5):
+    """
+    Run a query several times and return the best wall time in seconds
+
+    Args:
+        connection: Open database connection
+        query (str): SQL query to run
+        params (tuple): Bound parameters for the query
+        repeat (int): Number of runs
+
+    Returns:
+        float: Fastest run, in seconds
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        cursor = connection.cursor()
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        cursor.fetchall()
+        best = min(best, time.perf_counter() - start)
+        cursor.close()
+    return best
+
+
+def user_id_before(connection, depth):
+    """
+    Return the user_id of the row just before the given depth
+
+    Args:
+        connection: Open database connection
+        depth (int): Number of rows to skip
+
+    Returns:
+        str: The user_id to seek after, or None at depth 0 or past the end
+    """
+    if depth == 0:
+        return None
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT user_id FROM user_data ORDER BY user_id LIMIT 1 OFFSET %s",
+        (depth - 1,))
+    row = cursor.fetchone()
+    cursor.close()
+    return row[0] if row else None
+
+
+def run(connection, depths, page_size, repeat):
+    """
+    Benchmark both pagination strategies at each depth
+
+    Args:
+        connection: Open database connection
+        depths (list): Row offsets to measure at
+        page_size (int): Rows per page
+        repeat (int): Runs per measurement
+
+    Returns:
+        list: One dict per depth with offset and keyset timings in seconds
+    """
+    results = []
+    for depth in depths:
+        after = user_id_before(connection, depth)
+        if depth and after is None:
+            break
+        offset_time = time_query(
+            connection,
+            f"SELECT {COLUMNS} FROM user_data ORDER BY user_id LIMIT %s OFFSET %s",
+            (page_size, depth), repeat)
+        if after is None:
+            keyset_time = time_query(
+                connection,
+                f"SELECT {COLUMNS} FROM user_data ORDER BY user_id LIMIT %s",
+                (page_size,), repeat)
+        else:
+            keyset_time = time_query(
+                connection,
+                f"SELECT {COLUMNS} FROM user_data WHERE user_id > %s ORDER BY user_id LIMIT %s",
+                (after, page_size), repeat)
+        results.append({
+            "depth": depth,
+            "offset_s": offset_time,
+            "keyset_s": keyset_time,
+        })
+    return results
+
+
+def main():
+    """
+    Parse arguments, run the benchmark and print a results table
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--depths", type=int, nargs="+",
+                        default=[0, 1000, 10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    connection = seed.connect_to_prodev()
+    if connection is None:
+        return
+    results = run(connection, args.depths, args.page_size, args.repeat)
+    connection.close()
+
+    print(f"{'depth':>10} | {'offset ms':>10} | {'keyset ms':>10} | {'speedup':>8}")
+    print("-" * 48)
+    for row in results:
+        speedup = row["offset_s"] / row["keyset_s"] if row["keyset_s"] else 0
+        print(f"{row['depth']:>10} | {row['offset_s'] * 1000:>10.3f} | "
+              f"{row['keyset_s'] * 1000:>10.3f} | {speedup:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+"""
+Parallel partitioned scan of the user_data table
+
+Splits the user_id key space into ranges, scans each range with keyset
+pagination on its own connection inside a process pool, applies the
+batch_processing filter in the workers and merges the surviving rows back
+into a single generator.
+"""
+
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import seed
+
+is_over_25 = __import__('1-batch_processing').is_over_25
+
+# user_ids are lowercase UUID strings, so the first 8 hex digits spread
+# them evenly across the key space
+KEY_SPACE = 16 ** 8
+
+# Seconds the consumer waits on a queue before checking the workers are alive
+POLL_SECONDS = 1.0
+
+
+def partition_bounds(partitions):
+    """
+    Split the user_id key space into contiguous ranges
+
+    Args:
+        partitions (int): Number of ranges
+
+    Returns:
+        list: (after, before) pairs of exclusive bounds, None meaning open
+    """
+    if partitions < 1:
+        raise ValueError("At least one partition is required")
+    cuts = [format(i * KEY_SPACE // partitions, "08x") for i in range(1, partitions)]
+    lowers = [None] + cuts
+    uppers = cuts + [None]
+    return list(zip(lowers, uppers))
+
+
+def _put(out, message, stop):
+    """Put a message on a bounded queue, giving up once stop is set"""
+    while not stop.is_set():
+        try:
+            out.put(message, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _scan_partition(index, after, before, batch_size, predicate, out, stop):
+    """
+    Worker: scan one key range and send filtered batches to the consumer
+
+    Messages are ("rows", index, rows, scanned, matched),
+    ("done", index, scanned, matched, seconds) or ("error", index, text).
+    """
+    start = time.perf_counter()
+    scanned = matched = 0
+    connection = None
+    try:
+        connection = seed.connect_to_prodev()
+        while not stop.is_set():
+            batch = seed.fetch_page_after(connection, batch_size, after, before)
+            if not batch:
+                break
+            scanned += len(batch)
+            after = batch[-1]['user_id']
+            rows = [row for row in batch if predicate is None or predicate(row)]
+            matched += len(rows)
+            if not _put(out, ("rows", index, rows, scanned, matched), stop):
+                return
+            if len(batch) < batch_size:
+                break
+        _put(out, ("done", index, scanned, matched, time.perf_counter() - start), stop)
+    except Exception:
+        _put(out, ("error", index, traceback.format_exc()), stop)
+    finally:
+        if connection is not None:
+            connection.close()
+
+
+def _check_workers(futures, pending):
+    """
+    Raise if a partition still owed to the consumer has died
+
+    A worker killed outright (OOM killer, segfault) never sends its
+    "error" message; the pool marks its future as failed instead.
+    """
+    for index in pending:
+        future = futures[index]
+        if future.done() and future.exception() is not None:
+            raise RuntimeError(f"Partition {index} failed") from future.exception()
+
+
+def parallel_scan(partitions=None, batch_size=1000, predicate=is_over_25,
+                  ordered=False, workers=None, queue_size=8, progress=None):
+    """
+    Scan user_data in parallel and yield the rows that pass predicate
+
+    Args:
+        partitions (int): Number of key ranges, defaults to the CPU count
+        batch_size (int): Rows fetched per query in each worker
+        predicate (callable): Picklable filter run inside the workers,
+            None to keep every row
+        ordered (bool): Yield rows in user_id order. Later partitions then
+            only run ahead by queue_size batches while earlier ones drain
+        workers (int): Process pool size, defaults to partitions
+        queue_size (int): Batches buffered per queue before workers wait
+        progress (callable): Called as progress(index, scanned, matched,
+            done) in the consumer whenever a partition reports
+
+    Yields:
+        dict: User records that pass predicate
+    """
+    partitions = partitions or os.cpu_count() or 1
+    bounds = partition_bounds(partitions)
+    manager = multiprocessing.Manager()
+    stop = manager.Event()
+    if ordered:
+        queues = [manager.Queue(maxsize=queue_size) for _ in bounds]
+    else:
+        queues = [manager.Queue(maxsize=queue_size * partitions)] * partitions
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers or partitions) as pool:
+            try:
+                futures = [pool.submit(_scan_partition, index, after, before,
+                                       batch_size, predicate, queues[index], stop)
+                           for index, (after, before) in enumerate(bounds)]
+
+                pending = set(range(partitions))
+                current = 0
+                while pending:
+                    # Ordered scans drain partitions one after another
+                    source = queues[current] if ordered else queues[0]
+                    try:
+                        message = source.get(timeout=POLL_SECONDS)
+                    except queue.Empty:
+                        _check_workers(futures, pending)
+                        continue
+                    kind, index = message[0], message[1]
+                    if kind == "error":
+                        raise RuntimeError(f"Partition {index} failed:\n{message[2]}")
+                    if kind == "rows":
+                        _, _, rows, scanned, matched = message
+                        if progress is not None:
+                            progress(index, scanned, matched, False)
+                        yield from rows
+                    else:
+                        _, _, scanned, matched, _ = message
+                        pending.discard(index)
+                        current += 1
+                        if progress is not None:
+                            progress(index, scanned, matched, True)
+            finally:
+                # Lets workers blocked on a full queue exit if we stop early
+                stop.set()
+    finally:
+        manager.shutdown()
+
+
+def main():
+    """
+    Run a parallel scan and print per-partition progress and throughput
+    """
+    start = time.perf_counter()
+    total = 0
+
+    def report(index, scanned, matched, done):
+        if done:
+            print(f"partition {index}: scanned {scanned}, matched {matched}")
+
+    for _ in parallel_scan(progress=report):
+        total += 1
+    seconds = time.perf_counter() - start
+    print(f"{total} users over 25 in {seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
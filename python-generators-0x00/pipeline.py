@@ -0,0 +1,251 @@
+#!/usr/bin/python3
+"""
+Composable user_data pipelines with predicate and projection push-down
+
+    users().where("age", ">", 25).select("user_id", "name").batch(100)
+
+Column comparisons anywhere before the first map or batch are compiled
+into the SQL WHERE clause, and select stages before any callable
+predicate into the column list, so only the rows and columns a job needs
+cross the wire. Callable predicates, map, batch and anything after them
+run client-side.
+"""
+
+import operator
+
+import connection_pool
+import seed
+
+OPERATORS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda value, options: value in options,
+}
+
+
+def _check_column(column):
+    """Reject anything that is not a user_data column"""
+    if column not in seed.USER_COLUMNS:
+        raise ValueError(f"Unknown user_data column: {column!r}")
+
+
+class Pipeline:
+    """
+    Immutable chain of stages over user_data
+
+    Each builder method returns a new Pipeline, so partial pipelines can
+    be shared and extended. Iterating a pipeline runs it.
+    """
+
+    def __init__(self, stages=(), fetch_size=1000):
+        self.stages = tuple(stages)
+        self.fetch_size = fetch_size
+
+    def _then(self, stage):
+        return Pipeline(self.stages + (stage,), self.fetch_size)
+
+    def where(self, column_or_predicate, op=None, value=None):
+        """
+        Keep only matching rows
+
+        Args:
+            column_or_predicate: A column name compared with op and value
+                (pushed down to SQL when possible), or a callable taking a
+                row and returning a bool (always run in Python)
+            op (str): One of =, !=, <, <=, >, >=, in
+            value: Value to compare with (a sequence for "in")
+
+        Returns:
+            Pipeline: The extended pipeline
+        """
+        if callable(column_or_predicate):
+            return self._then(("filter", column_or_predicate))
+        _check_column(column_or_predicate)
+        if op not in OPERATORS:
+            raise ValueError(f"Unsupported operator: {op!r}")
+        if op == "in":
+            value = tuple(value)
+        return self._then(("where", (column_or_predicate, op, value)))
+
+    def select(self, *columns):
+        """
+        Keep only the given columns of each row
+
+        Args:
+            *columns (str): user_data column names, at least one
+
+        Returns:
+            Pipeline: The extended pipeline
+        """
+        if not columns:
+            raise ValueError("select needs at least one column")
+        for column in columns:
+            _check_column(column)
+        return self._then(("select", columns))
+
+    def batch(self, size):
+        """
+        Group items into lists of at most size
+
+        Args:
+            size (int): Items per batch
+
+        Returns:
+            Pipeline: The extended pipeline
+        """
+        return self._then(("batch", size))
+
+    def map(self, function):
+        """
+        Transform every item with a Python function
+
+        Args:
+            function (callable): Applied to each item (or batch)
+
+        Returns:
+            Pipeline: The extended pipeline
+        """
+        return self._then(("map", function))
+
+    def compile(self):
+        """
+        Split the pipeline into a SQL query and client-side stages
+
+        Column comparisons before the first map or batch still see whole
+        user_data rows, whatever was selected or filtered before them, so
+        they all go to SQL. A select is pushed down until a callable
+        predicate needs the columns it would drop.
+
+        Returns:
+            tuple: (query, params, client_stages)
+
+        Raises:
+            ValueError: If a select keeps a column an earlier one dropped
+        """
+        columns = seed.USER_COLUMNS
+        available = set(columns)
+        conditions = []
+        params = []
+        client_stages = []
+        rows = True
+        for stage in self.stages:
+            kind, argument = stage
+            if kind in ("map", "batch"):
+                rows = False
+            if not rows:
+                client_stages.append(stage)
+            elif kind == "where":
+                column, op, value = argument
+                if op != "in":
+                    conditions.append(f"{column} {op} %s")
+                    params.append(value)
+                elif value:
+                    placeholders = ", ".join(["%s"] * len(value))
+                    conditions.append(f"{column} IN ({placeholders})")
+                    params.extend(value)
+                else:
+                    conditions.append("1 = 0")
+            elif kind == "select":
+                missing = [column for column in argument if column not in available]
+                if missing:
+                    raise ValueError(f"select of columns already dropped: {missing}")
+                available = set(argument)
+                if client_stages:
+                    client_stages.append(stage)
+                else:
+                    columns = argument
+            else:
+                client_stages.append(stage)
+
+        query = f"SELECT {', '.join(columns)} FROM user_data"
+        if conditions:
+            query += " WHERE " + " AND ".join(f"({condition})" for condition in conditions)
+        return query, tuple(params), tuple(client_stages)
+
+    def explain(self):
+        """
+        Describe what runs in SQL and what runs in Python
+
+        Returns:
+            str: The compiled query and the client-side stages
+        """
+        query, params, client_stages = self.compile()
+        lines = [f"SQL: {query}", f"params: {params}"]
+        lines += [f"python: {kind} {argument!r}" for kind, argument in client_stages]
+        return "\n".join(lines)
+
+    def _rows(self, query, params):
+        """Stream the rows of the compiled query in fetch_size chunks"""
+        with connection_pool.pooled_connection(overflow=True) as connection:
+            cursor = connection.cursor(dictionary=True, buffered=False)
+            try:
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(self.fetch_size)
+                    if not rows:
+                        break
+                    yield from rows
+            finally:
+                cursor.close()
+
+    def __iter__(self):
+        query, params, client_stages = self.compile()
+        items = self._rows(query, params)
+        for kind, argument in client_stages:
+            items = _STAGES[kind](items, argument)
+        return iter(items)
+
+
+def _where(items, condition):
+    column, op, value = condition
+    compare = OPERATORS[op]
+    return (item for item in items if compare(item[column], value))
+
+
+def _filter(items, predicate):
+    return (item for item in items if predicate(item))
+
+
+def _select(items, columns):
+    return ({column: item[column] for column in columns} for item in items)
+
+
+def _batch(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _map(items, function):
+    return (function(item) for item in items)
+
+
+_STAGES = {
+    "where": _where,
+    "filter": _filter,
+    "select": _select,
+    "batch": _batch,
+    "map": _map,
+}
+
+
+def users(fetch_size=1000):
+    """
+    Start a pipeline over user_data
+
+    Args:
+        fetch_size (int): Rows pulled from the cursor per fetch
+
+    Returns:
+        Pipeline: An empty pipeline reading every user
+    """
+    return Pipeline(fetch_size=fetch_size)
@@ -1,7 +1,207 @@
+#!/usr/bin/python3
 import mysql.connector
+import argparse
+import base64
+import contextlib
 import csv
+import functools
+import itertools
+import json
+import operator
+import os
+import random
+import sqlite3
+import time
 import uuid
 
+# Set ALX_PRODEV_SQLITE to a file path to run everything against a local
+# SQLite stand-in instead of the MySQL server (handy for benchmarks)
+SQLITE_ENV_VAR = "ALX_PRODEV_SQLITE"
+
+# Columns of user_data, in table order
+USER_COLUMNS = ("user_id", "name", "email", "age")
+
+# Current time as stored in SQLite updated_at columns (UTC, milliseconds)
+SQLITE_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+class SQLiteCursor:
+    """Cursor over the SQLite stand-in mimicking mysql-connector's cursor"""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self.dictionary = dictionary
+        self.arraysize = 1
+
+    def _convert(self, row):
+        if row is None or not self.dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    @property
+    def column_names(self):
+        return tuple(column[0] for column in self._cursor.description or ())
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def execute(self, query, params=()):
+        self._cursor.execute(query.replace("%s", "?"), tuple(params or ()))
+
+    def executemany(self, query, seq_params):
+        self._cursor.executemany(query.replace("%s", "?"), seq_params)
+
+    def fetchone(self):
+        return self._convert(self._cursor.fetchone())
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size or self.arraysize)
+        return [self._convert(row) for row in rows]
+
+    def fetchall(self):
+        return [self._convert(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        for row in self._cursor:
+            yield self._convert(row)
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """
+    Local SQLite stand-in for the ALX_prodev MySQL database
+
+    Exposes the subset of the mysql-connector connection API used in this
+    project (``cursor(dictionary=...)``, ``%s`` placeholders, commit,
+    rollback, close) so the generators run unchanged without a server.
+    """
+
+    dialect = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self, dictionary=False, buffered=None):
+        return SQLiteCursor(self._connection.cursor(), dictionary=dictionary)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def is_connected(self):
+        try:
+            self._connection.execute("SELECT 1")
+        except sqlite3.ProgrammingError:
+            return False
+        return True
+
+    def close(self):
+        self._connection.close()
+
+
+def connect_sqlite(path=None):
+    """Connect to the SQLite stand-in, creating the file if needed"""
+    return SQLiteConnection(path or os.environ.get(SQLITE_ENV_VAR, "ALX_prodev.db"))
+
+
+def dialect(connection):
+    """Return "sqlite" for the local stand-in and "mysql" otherwise"""
+    return getattr(connection, "dialect", "mysql")
+
+
+class Row(tuple):
+    """
+    Compact result row: a tuple that also answers by column name
+
+    Subclasses are built once per column list by row_class, so every row
+    shares its field names instead of carrying its own dict of keys. Rows
+    support row.age, row['age'], row[3], row.get('age') and dict(row).
+    """
+
+    __slots__ = ()
+    _fields = ()
+    _index = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                key = self._index[key]
+            except KeyError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        index = self._index.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+
+    def keys(self):
+        return self._fields
+
+    def values(self):
+        return tuple(self)
+
+    def items(self):
+        return tuple(zip(self._fields, self))
+
+    def _asdict(self):
+        return dict(zip(self._fields, self))
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={value!r}" for name, value in zip(self._fields, self))
+        return f"{type(self).__name__}({fields})"
+
+@functools.lru_cache(maxsize=64)
+def row_class(column_names):
+    """Return the Row subclass for a tuple of column names, built once"""
+    namespace = {
+        "__slots__": (),
+        "_fields": column_names,
+        "_index": {name: index for index, name in enumerate(column_names)},
+    }
+    for index, name in enumerate(column_names):
+        namespace[name] = property(operator.itemgetter(index))
+    return type("UserRow", (Row,), namespace)
+
+ROW_FORMATS = ("dict", "row", "tuple")
+
+def open_cursor(connection, row_format="dict", buffered=None):
+    """Open a cursor whose rows suit row_format
+
+    "dict" rows are dicts (the dictionary cursor), "row" rows are compact
+    Row tuples with key and attribute access (see convert_rows), and
+    "tuple" rows are plain tuples in column order.
+    """
+    if row_format not in ROW_FORMATS:
+        raise ValueError(f"Unknown row format: {row_format!r}")
+    if buffered is None:
+        return connection.cursor(dictionary=row_format == "dict")
+    return connection.cursor(dictionary=row_format == "dict", buffered=buffered)
+
+def convert_rows(cursor, rows, row_format="dict"):
+    """Turn rows fetched from open_cursor(..., row_format) into that format"""
+    if row_format != "row" or not rows:
+        return rows
+    make_row = row_class(tuple(cursor.column_names))
+    return [make_row(row) for row in rows]
+
+def user_id_of(row):
+    """Return the user_id of a row in any row format"""
+    return row[0] if type(row) is tuple else row['user_id']
+
 def connect_db():
     """Connect to MySQL server (no database selected)"""
     try:
@@ -17,18 +217,23 @@ def connect_db():
 
 def create_database(connection):
     """Create the ALX_prodev database if it doesn't exist"""
+    if dialect(connection) == "sqlite":
+        return
     cursor = connection.cursor()
     cursor.execute("CREATE DATABASE IF NOT EXISTS ALX_prodev")
     cursor.close()
 
-def connect_to_prodev():
-    """Connect to ALX_prodev database"""
+def connect_to_prodev(allow_local_infile=False):
+    """Connect to ALX_prodev database (or the SQLite stand-in if configured)"""
+    if os.environ.get(SQLITE_ENV_VAR):
+        return connect_sqlite()
     try:
         connection = mysql.connector.connect(
             host="localhost",
             user="root",
             password="",  # add your password here
-            database="ALX_prodev"
+            database="ALX_prodev",
+            allow_local_infile=allow_local_infile
         )
         return connection
     except mysql.connector.Error as err:
@@ -47,6 +252,10 @@ def create_table(connection):
         INDEX (user_id)
     )
     """
+    if dialect(connection) == "sqlite":
+        # SQLite has no inline INDEX clause; the primary key is indexed
+        create_table_query = create_table_query.replace(
+            "NOT NULL,\n        INDEX (user_id)", "NOT NULL")
     cursor.execute(create_table_query)
     connection.commit()
     print("Table user_data created successfully")
@@ -69,3 +278,479 @@ def insert_data(connection, csv_file):
                 """, (row['user_id'], row['name'], row['email'], row['age']))
         connection.commit()
     cursor.close()
+
+AGE_AGGREGATE_TRIGGERS = {
+    "insert": ("AFTER INSERT",
+               "user_count = user_count + 1, "
+               "age_sum = age_sum + NEW.age, "
+               "age_sum_squares = age_sum_squares + NEW.age * NEW.age"),
+    "update": ("AFTER UPDATE",
+               "age_sum = age_sum - OLD.age + NEW.age, "
+               "age_sum_squares = age_sum_squares - OLD.age * OLD.age + NEW.age * NEW.age"),
+    "delete": ("AFTER DELETE",
+               "user_count = user_count - 1, "
+               "age_sum = age_sum - OLD.age, "
+               "age_sum_squares = age_sum_squares - OLD.age * OLD.age"),
+}
+
+@contextlib.contextmanager
+def _age_aggregate_lock(connection):
+    """Hold off writes to user_data while the aggregate is rebuilt
+
+    Yields a cursor. On SQLite, BEGIN IMMEDIATE takes the write lock, and
+    the triggers and the rebuilt row commit together. MySQL commits DDL
+    implicitly, so it uses LOCK TABLES instead (the lock survives those
+    commits). Either way, no write can land between the scan and the
+    triggers going live, where it would be counted twice or not at all.
+    """
+    connection.commit()
+    cursor = connection.cursor()
+    if dialect(connection) == "sqlite":
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            yield cursor
+        except BaseException:
+            connection.rollback()
+            raise
+        connection.commit()
+    else:
+        cursor.execute("LOCK TABLES user_data WRITE, user_age_stats WRITE")
+        try:
+            yield cursor
+            connection.commit()
+        finally:
+            cursor.execute("UNLOCK TABLES")
+    cursor.close()
+
+def _write_age_aggregate(cursor, scanned):
+    cursor.execute("DELETE FROM user_age_stats WHERE id = 1")
+    cursor.execute(
+        "INSERT INTO user_age_stats (id, user_count, age_sum, age_sum_squares) "
+        "VALUES (1, %s, %s, %s)", tuple(scanned))
+
+def create_age_aggregate(connection):
+    """Create the maintained count/sum/sum-of-squares aggregate of user ages
+
+    The single-row user_age_stats table is filled from a full scan, then
+    kept current by triggers on every insert, update and delete of
+    user_data (including bulk loads), so the average and variance of ages
+    can be read in constant time. Safe to run again; it rebuilds the row.
+    The scan and the trigger creation run under a write lock on
+    user_data, so writers wait for the rebuild.
+
+    Trade-off: every write to user_data also updates the one id = 1 row,
+    so concurrent writers serialise on that row's lock until they commit.
+    Drop the triggers on write-heavy tables and use the streamed average.
+    """
+    kind = dialect(connection)
+    number = "NUMERIC" if kind == "sqlite" else "DECIMAL(38, 4)"
+    cursor = connection.cursor()
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS user_age_stats (
+        id INTEGER PRIMARY KEY,
+        user_count BIGINT NOT NULL,
+        age_sum {number} NOT NULL,
+        age_sum_squares {number} NOT NULL
+    )
+    """)
+    cursor.close()
+    with _age_aggregate_lock(connection) as cursor:
+        for event, (timing, assignments) in AGE_AGGREGATE_TRIGGERS.items():
+            name = f"user_data_age_{event}"
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            statement = f"UPDATE user_age_stats SET {assignments} WHERE id = 1"
+            if kind == "sqlite":
+                cursor.execute(f"CREATE TRIGGER {name} {timing} ON user_data "
+                               f"BEGIN {statement}; END")
+            else:
+                cursor.execute(f"CREATE TRIGGER {name} {timing} ON user_data "
+                               f"FOR EACH ROW {statement}")
+        _write_age_aggregate(cursor, _scan_age_aggregate(connection))
+    print("Age aggregate user_age_stats created successfully")
+
+def _scan_age_aggregate(connection):
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT COUNT(age), COALESCE(SUM(age), 0), COALESCE(SUM(age * age), 0) "
+        "FROM user_data")
+    row = cursor.fetchone()
+    cursor.close()
+    return row
+
+def read_age_aggregate(connection):
+    """Return (count, sum, sum of squares) of user ages from user_age_stats"""
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT user_count, age_sum, age_sum_squares FROM user_age_stats WHERE id = 1")
+    row = cursor.fetchone()
+    cursor.close()
+    if row is None:
+        raise ValueError("user_age_stats is empty; run create_age_aggregate first")
+    return row
+
+def _compare_age_aggregate(connection):
+    scanned = tuple(_scan_age_aggregate(connection))
+    try:
+        maintained = tuple(read_age_aggregate(connection))
+    except ValueError:
+        maintained = None
+    matches = maintained is not None and all(
+        float(a) == float(b) for a, b in zip(maintained, scanned))
+    return {"matches": matches, "maintained": maintained, "scanned": scanned}
+
+def reconcile_age_aggregate(connection, repair=False):
+    """Compare user_age_stats with a full scan of user_data
+
+    Returns a dict with the maintained and scanned (count, sum, sum of
+    squares) and whether they match. With repair=True the comparison runs
+    under the same write lock as create_age_aggregate and the maintained
+    row is overwritten with the scanned values.
+    """
+    if not repair:
+        return _compare_age_aggregate(connection)
+    with _age_aggregate_lock(connection) as cursor:
+        result = _compare_age_aggregate(connection)
+        if not result["matches"]:
+            _write_age_aggregate(cursor, result["scanned"])
+    return result
+
+CHANGE_TRACKING_TRIGGERS = {
+    "user_data_touch_insert": (
+        "AFTER INSERT ON user_data WHEN NEW.updated_at IS NULL"),
+    "user_data_touch_update": (
+        "AFTER UPDATE OF name, email, age ON user_data"),
+}
+
+def _has_column(connection, table, column):
+    cursor = connection.cursor()
+    if dialect(connection) == "sqlite":
+        cursor.execute(f"PRAGMA table_info({table})")
+        found = any(row[1] == column for row in cursor.fetchall())
+    else:
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.columns "
+            "WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s",
+            (table, column))
+        found = cursor.fetchone()[0] > 0
+    cursor.close()
+    return found
+
+def enable_change_tracking(connection):
+    """Add the updated_at high-water mark column to user_data
+
+    Every insert and every change to name, email or age stamps the row
+    with the current time (ON UPDATE CURRENT_TIMESTAMP on MySQL, triggers
+    on SQLite), so incremental readers can select only the rows changed
+    since their last acknowledged (updated_at, user_id) watermark. Existing
+    rows are stamped with the migration time. Also creates the
+    stream_watermarks table the readers persist their position in, and
+    stream_seen, where they remember the rows they acknowledged recently
+    so a re-scanned overlap is not delivered twice. Safe to run again.
+    """
+    kind = dialect(connection)
+    cursor = connection.cursor()
+    if not _has_column(connection, "user_data", "updated_at"):
+        if kind == "sqlite":
+            # SQLite cannot add a column with a non-constant default
+            cursor.execute("ALTER TABLE user_data ADD COLUMN updated_at TEXT")
+            cursor.execute(f"UPDATE user_data SET updated_at = {SQLITE_NOW}")
+        else:
+            cursor.execute(
+                "ALTER TABLE user_data ADD COLUMN updated_at TIMESTAMP(6) NOT NULL "
+                "DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)")
+        cursor.execute(
+            "CREATE INDEX user_data_updated_at ON user_data (updated_at, user_id)")
+    if kind == "sqlite":
+        for name, timing in CHANGE_TRACKING_TRIGGERS.items():
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(
+                f"CREATE TRIGGER {name} {timing} BEGIN "
+                f"UPDATE user_data SET updated_at = {SQLITE_NOW} "
+                f"WHERE user_id = NEW.user_id; END")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS stream_watermarks (
+        consumer VARCHAR(255) PRIMARY KEY,
+        updated_at VARCHAR(32) NOT NULL,
+        user_id VARCHAR(36) NOT NULL
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS stream_seen (
+        consumer VARCHAR(255) NOT NULL,
+        updated_at VARCHAR(32) NOT NULL,
+        user_id VARCHAR(36) NOT NULL,
+        PRIMARY KEY (consumer, updated_at, user_id)
+    )
+    """)
+    connection.commit()
+    cursor.close()
+    print("Change tracking on user_data enabled successfully")
+
+BULK_INSERT_QUERIES = {
+    ("mysql", "ignore"): """
+        INSERT IGNORE INTO user_data (user_id, name, email, age)
+        VALUES (%s, %s, %s, %s)
+    """,
+    ("mysql", "update"): """
+        INSERT INTO user_data (user_id, name, email, age)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            name = VALUES(name), email = VALUES(email), age = VALUES(age)
+    """,
+    ("sqlite", "ignore"): """
+        INSERT OR IGNORE INTO user_data (user_id, name, email, age)
+        VALUES (%s, %s, %s, %s)
+    """,
+    ("sqlite", "update"): """
+        INSERT INTO user_data (user_id, name, email, age)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (user_id) DO UPDATE SET
+            name = excluded.name, email = excluded.email, age = excluded.age
+    """,
+}
+
+def _load_stats(rows, start):
+    """Build and print the throughput report of a bulk load"""
+    seconds = time.perf_counter() - start
+    stats = {
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds else 0.0,
+    }
+    print(f"Loaded {rows} rows in {seconds:.2f}s "
+          f"({stats['rows_per_second']:.0f} rows/s)")
+    return stats
+
+def bulk_insert_rows(connection, chunks, commit_every=10000, on_duplicate="ignore"):
+    """Bulk insert chunks of (user_id, name, email, age) rows into user_data
+
+    Each chunk is written with a single executemany (which mysql-connector
+    turns into one multi-row INSERT), committing every commit_every rows.
+    Existing user_ids are skipped (on_duplicate="ignore") or overwritten
+    (on_duplicate="update").
+
+    Returns a dict with rows, seconds and rows_per_second.
+    """
+    kind = dialect(connection)
+    if (kind, on_duplicate) not in BULK_INSERT_QUERIES:
+        raise ValueError(f"Unknown on_duplicate mode: {on_duplicate!r}")
+    query = BULK_INSERT_QUERIES[(kind, on_duplicate)]
+
+    cursor = connection.cursor()
+    start = time.perf_counter()
+    rows = 0
+    uncommitted = 0
+    for chunk in chunks:
+        cursor.executemany(query, chunk)
+        rows += len(chunk)
+        uncommitted += len(chunk)
+        if uncommitted >= commit_every:
+            connection.commit()
+            uncommitted = 0
+    connection.commit()
+    cursor.close()
+    return _load_stats(rows, start)
+
+def read_csv_chunks(csv_file, chunk_size=1000):
+    """Yield the rows of a user_data CSV file as lists of tuples"""
+    with open(csv_file, newline='') as f:
+        reader = csv.DictReader(f)
+        while True:
+            chunk = [
+                (row['user_id'], row['name'], row['email'], row['age'])
+                for row in itertools.islice(reader, chunk_size)
+            ]
+            if not chunk:
+                return
+            yield chunk
+
+def bulk_insert_data(connection, csv_file, chunk_size=1000, commit_every=10000,
+                     on_duplicate="ignore", load_data_infile=False):
+    """Bulk load a CSV file into user_data and report throughput
+
+    Reads the CSV in chunks of chunk_size rows and writes them with
+    bulk_insert_rows. With load_data_infile=True the file is handed to
+    MySQL's LOAD DATA LOCAL INFILE instead; the connection must allow
+    local infile.
+
+    Returns a dict with rows, seconds and rows_per_second.
+    """
+    if not load_data_infile:
+        return bulk_insert_rows(connection, read_csv_chunks(csv_file, chunk_size),
+                                commit_every, on_duplicate)
+
+    if dialect(connection) != "mysql":
+        raise ValueError("LOAD DATA LOCAL INFILE is only available on MySQL")
+    if on_duplicate not in ("ignore", "update"):
+        raise ValueError(f"Unknown on_duplicate mode: {on_duplicate!r}")
+    cursor = connection.cursor()
+    start = time.perf_counter()
+    duplicate_clause = "REPLACE" if on_duplicate == "update" else "IGNORE"
+    cursor.execute(f"""
+        LOAD DATA LOCAL INFILE %s {duplicate_clause} INTO TABLE user_data
+        FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+        LINES TERMINATED BY '\\n'
+        IGNORE 1 LINES
+        (user_id, name, email, age)
+    """, (os.path.abspath(csv_file),))
+    rows = cursor.rowcount
+    connection.commit()
+    cursor.close()
+    return _load_stats(rows, start)
+
+FIRST_NAMES = (
+    "Alma", "Dan", "Glenda", "Daniel", "Ronnie", "Molly", "Delia", "Sandra",
+    "Miriam", "Shelly", "Grace", "Henry", "Ivy", "Jack", "Frank", "Diana",
+)
+LAST_NAMES = (
+    "Altenwerth", "Wisozk", "Fahey", "Bechtelar", "Lesch", "Balistreri",
+    "Cartwright", "Crawford", "Kuhn", "Schmidt", "Okuneva", "Hansen",
+)
+EMAIL_DOMAINS = ("gmail.com", "yahoo.com", "hotmail.com", "example.com")
+
+def _age_sampler(rng, distribution, min_age, max_age, mean_age, stddev_age):
+    """Return a function drawing one age from the requested distribution"""
+    if callable(distribution):
+        return lambda: distribution(rng)
+    if distribution == "uniform":
+        return lambda: rng.randint(min_age, max_age)
+    if distribution == "normal":
+        return lambda: min(max_age, max(min_age, round(rng.gauss(mean_age, stddev_age))))
+    raise ValueError(f"Unknown age distribution: {distribution!r}")
+
+def generate_users(count, random_seed=None, chunk_size=10000, age_distribution="uniform",
+                   min_age=18, max_age=100, mean_age=40, stddev_age=15, start=0):
+    """Generate synthetic user_data rows in chunks
+
+    Yields lists of up to chunk_size (user_id, name, email, age) tuples.
+    user_ids are version 4 UUIDs and emails are unique (they embed the row
+    number, counted from start). With the same random_seed the output is
+    identical from run to run. age_distribution is "uniform" over
+    [min_age, max_age], "normal" around mean_age (clamped to the range),
+    or a callable taking a random.Random and returning an age.
+    """
+    rng = random.Random(random_seed)
+    draw_age = _age_sampler(rng, age_distribution, min_age, max_age, mean_age, stddev_age)
+    first_names = [rng.choice(FIRST_NAMES) for _ in range(256)]
+    last_names = [rng.choice(LAST_NAMES) for _ in range(256)]
+    domains = EMAIL_DOMAINS
+    getrandbits = rng.getrandbits
+    make_uuid = uuid.UUID
+
+    for chunk_start in range(start, start + count, chunk_size):
+        chunk = []
+        for index in range(chunk_start, min(chunk_start + chunk_size, start + count)):
+            # version=4 sets the version and variant bits over the draw
+            user_id = str(make_uuid(int=getrandbits(128), version=4))
+            # Names come from their own draw: reusing UUID bits would make
+            # the user_id prefix (and so the key range) predict the name
+            picks = getrandbits(18)
+            first = first_names[picks & 0xff]
+            last = last_names[(picks >> 8) & 0xff]
+            domain = domains[picks >> 16]
+            chunk.append((user_id, f"{first} {last}",
+                          f"{first}.{last}{index}@{domain}", draw_age()))
+        yield chunk
+
+def write_users_csv(csv_file, count, **options):
+    """Write count synthetic users to a CSV file in the user_data.csv format
+
+    Accepts the options of generate_users. Returns the number of rows.
+    """
+    rows = 0
+    with open(csv_file, "w", newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(USER_COLUMNS)
+        for chunk in generate_users(count, **options):
+            writer.writerows(chunk)
+            rows += len(chunk)
+    return rows
+
+def seed_users(connection, count, commit_every=100000, **options):
+    """Insert count synthetic users straight into user_data
+
+    Accepts the options of generate_users and writes through
+    bulk_insert_rows. Returns its throughput report.
+    """
+    return bulk_insert_rows(connection, generate_users(count, **options), commit_every)
+
+def encode_cursor(user_id):
+    """Encode the last user_id seen as an opaque, resumable cursor token"""
+    payload = json.dumps({"after": user_id}).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+def decode_cursor(token):
+    """Decode a cursor token back into the user_id to resume after"""
+    if not token:
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode("ascii")))["after"]
+    except (ValueError, KeyError, TypeError) as err:
+        raise ValueError(f"Invalid cursor token: {token!r}") from err
+
+def keyset_query(page_size, after=None, before=None):
+    """Build the keyset page query over user_data and its parameters
+
+    Only user_ids greater than after and, if given, less than before are
+    selected, in user_id order.
+    """
+    conditions = []
+    params = []
+    if after is not None:
+        conditions.append("user_id > %s")
+        params.append(after)
+    if before is not None:
+        conditions.append("user_id < %s")
+        params.append(before)
+    where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+    query = (f"SELECT {', '.join(USER_COLUMNS)} FROM user_data {where}"
+             "ORDER BY user_id LIMIT %s")
+    return query, (*params, page_size)
+
+def fetch_page_after(connection, page_size, after=None, before=None, row_format="dict"):
+    """Fetch the next keyset page of user_data, ordered by user_id
+
+    Seeks on the primary key instead of using OFFSET, so every page costs
+    the same no matter how deep into the table it is. Rows come back in
+    the given row_format (see open_cursor).
+    """
+    cursor = open_cursor(connection, row_format)
+    cursor.execute(*keyset_query(page_size, after, before))
+    rows = convert_rows(cursor, cursor.fetchall(), row_format)
+    cursor.close()
+    return rows
+
+def main():
+    """Generate synthetic users into ALX_prodev (or the stand-in) or a CSV file"""
+    parser = argparse.ArgumentParser(description="Generate synthetic user_data rows")
+    parser.add_argument("count", type=int)
+    parser.add_argument("--csv", help="write to this CSV file instead of the database")
+    parser.add_argument("--seed", type=int, help="random seed for reproducible output")
+    parser.add_argument("--ages", choices=("uniform", "normal"), default="uniform")
+    parser.add_argument("--min-age", type=int, default=18)
+    parser.add_argument("--max-age", type=int, default=100)
+    parser.add_argument("--mean-age", type=float, default=40)
+    parser.add_argument("--stddev-age", type=float, default=15)
+    args = parser.parse_args()
+    options = {
+        "random_seed": args.seed,
+        "age_distribution": args.ages,
+        "min_age": args.min_age,
+        "max_age": args.max_age,
+        "mean_age": args.mean_age,
+        "stddev_age": args.stddev_age,
+    }
+
+    if args.csv:
+        rows = write_users_csv(args.csv, args.count, **options)
+        print(f"Wrote {rows} users to {args.csv}")
+        return
+    connection = connect_to_prodev()
+    if connection is None:
+        return
+    create_table(connection)
+    seed_users(connection, args.count, **options)
+    connection.close()
+
+if __name__ == "__main__":
+    main()
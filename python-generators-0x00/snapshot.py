@@ -0,0 +1,391 @@
+#!/usr/bin/python3
+"""
+Memory-mapped local snapshots of the user_data table
+
+export_snapshot writes user_data to a compact fixed-width binary file;
+Snapshot maps it with mmap and offers the same generator interfaces as the
+database-backed modules (stream_users, stream_user_ages,
+stream_users_in_batches) without a round trip to MySQL. refresh_snapshot
+appends only the rows added since the snapshot was written.
+
+File layout (little endian):
+    header   magic (8s), version (H), name width (H), email width (H),
+             padding, row count (Q), high-water updated_at (32s) and
+             user_id (36s) -- HEADER_SIZE bytes; version 1 files end the
+             header after the row count
+    records  row count x (user_id 36s, name, email, age q), where name
+             and email are NUL-padded UTF-8 of the widths in the header
+"""
+
+import argparse
+import mmap
+import os
+import struct
+
+import connection_pool
+import seed
+
+MAGIC = b"USERSNAP"
+VERSION = 2
+MARK_WIDTH = 32
+USER_ID_WIDTH = 36
+HEADER = struct.Struct(f"<8sHHH2xQ{MARK_WIDTH}s{USER_ID_WIDTH}s")
+HEADER_SIZE = HEADER.size
+# Version 1 header, also the common prefix of every version
+HEADER_V1 = struct.Struct("<8sHHH2xQ")
+
+
+def _record_struct(name_width, email_width):
+    """Fixed-width record layout for the given text column widths"""
+    return struct.Struct(f"<{USER_ID_WIDTH}s{name_width}s{email_width}sq")
+
+
+def _encode(row):
+    """Encode a (user_id, name, email, age) row for storage"""
+    user_id, name, email, age = row
+    return user_id.encode("ascii"), name.encode("utf-8"), email.encode("utf-8"), int(age)
+
+
+def _pack_header(name_width, email_width, count, mark):
+    """Header bytes; mark is the (updated_at, user_id) high-water or None"""
+    updated_at, user_id = mark if mark is not None else ("", "")
+    return HEADER.pack(MAGIC, VERSION, name_width, email_width, count,
+                       updated_at.encode("ascii"), user_id.encode("ascii"))
+
+
+def _high_water(connection):
+    """
+    Return the greatest (updated_at, user_id) in user_data
+
+    None when the table has no change tracking (see
+    seed.enable_change_tracking) or no rows.
+    """
+    if not seed._has_column(connection, "user_data", "updated_at"):
+        return None
+    cursor = connection.cursor()
+    cursor.execute("SELECT updated_at, user_id FROM user_data "
+                   "ORDER BY updated_at DESC, user_id DESC LIMIT 1")
+    row = cursor.fetchone()
+    cursor.close()
+    return (str(row[0]), row[1]) if row is not None else None
+
+
+def _column_widths(connection):
+    """Longest name and email, in bytes, currently in user_data"""
+    if seed.dialect(connection) == "sqlite":
+        query = ("SELECT MAX(LENGTH(CAST(name AS BLOB))), "
+                 "MAX(LENGTH(CAST(email AS BLOB))) FROM user_data")
+    else:
+        query = "SELECT MAX(LENGTH(name)), MAX(LENGTH(email)) FROM user_data"
+    cursor = connection.cursor()
+    cursor.execute(query)
+    name_width, email_width = cursor.fetchone()
+    cursor.close()
+    return int(name_width or 1), int(email_width or 1)
+
+
+def _write(path, rows, name_width, email_width, mark=None):
+    """Write encoded rows to a new snapshot file, returning the row count"""
+    record = _record_struct(name_width, email_width)
+    count = 0
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(_pack_header(name_width, email_width, 0, mark))
+        for row in rows:
+            f.write(record.pack(*row))
+            count += 1
+        f.seek(0)
+        f.write(_pack_header(name_width, email_width, count, mark))
+        f.flush()
+        # On disk before it replaces the old snapshot
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    return count
+
+
+def _table_rows(connection, batch_size):
+    """Encoded rows of user_data, read with keyset pagination"""
+    after = None
+    while True:
+        batch = seed.fetch_page_after(connection, batch_size, after, row_format="tuple")
+        if not batch:
+            return
+        for row in batch:
+            yield _encode(row)
+        after = batch[-1][0]
+
+
+def export_snapshot(path, batch_size=10000):
+    """
+    Write the whole user_data table to a snapshot file
+
+    Args:
+        path (str): Snapshot file to create or replace
+        batch_size (int): Rows fetched per query
+
+    Returns:
+        int: Number of rows written
+    """
+    with connection_pool.pooled_connection() as connection:
+        # Taken first: rows written during the export are re-read by the
+        # next refresh rather than missed
+        mark = _high_water(connection)
+        name_width, email_width = _column_widths(connection)
+        return _write(path, _table_rows(connection, batch_size), name_width,
+                      email_width, mark)
+
+
+def _missing_rows(connection, known_ids, batch_size):
+    """Rows of user_data whose user_id is not in known_ids"""
+    cursor = connection.cursor()
+    cursor.execute("SELECT user_id FROM user_data")
+    missing = []
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        missing.extend(row[0] for row in rows if row[0] not in known_ids)
+    cursor.close()
+    for start in range(0, len(missing), batch_size):
+        chunk = missing[start:start + batch_size]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        cursor = connection.cursor()
+        cursor.execute(
+            f"SELECT {', '.join(seed.USER_COLUMNS)} FROM user_data "
+            f"WHERE user_id IN ({placeholders})", chunk)
+        rows = cursor.fetchall()
+        cursor.close()
+        for row in rows:
+            yield _encode(row)
+
+
+def _rows_after(connection, mark, batch_size):
+    """Rows of user_data past an (updated_at, user_id) position, in order"""
+    query = (f"SELECT {', '.join(seed.USER_COLUMNS)}, updated_at FROM user_data "
+             "WHERE updated_at > %s OR (updated_at = %s AND user_id > %s) "
+             f"ORDER BY updated_at, user_id LIMIT {batch_size}")
+    updated_at, user_id = mark
+    while True:
+        cursor = connection.cursor()
+        cursor.execute(query, (updated_at, updated_at, user_id))
+        rows = cursor.fetchall()
+        cursor.close()
+        if not rows:
+            return
+        for row in rows:
+            yield row[:4]
+        updated_at, user_id = str(rows[-1][4]), rows[-1][0]
+
+
+def _snapshot_ids(path):
+    with Snapshot(path) as snapshot:
+        return set(snapshot.user_ids())
+
+
+def refresh_snapshot(path, batch_size=1000):
+    """
+    Append the rows added to user_data since the snapshot was written
+
+    user_ids are random UUIDs, so new rows cannot be found by a user_id
+    range. When user_data has change tracking, only rows past the
+    (updated_at, user_id) high-water mark stored in the snapshot are read,
+    and those already in it (changed rather than added) are skipped.
+    Otherwise, or for a version 1 snapshot, every user_id is compared
+    against the snapshot. If a new name or email is wider than the file
+    allows, the snapshot is rewritten with wider columns.
+
+    Args:
+        path (str): Existing snapshot file
+        batch_size (int): Rows fetched per query
+
+    Returns:
+        int: Number of rows appended
+    """
+    with Snapshot(path) as snapshot:
+        name_width = snapshot.name_width
+        email_width = snapshot.email_width
+        count = len(snapshot)
+        mark = snapshot.mark
+        header_size = snapshot.header_size
+
+    with connection_pool.pooled_connection() as connection:
+        new_mark = _high_water(connection)
+        if mark is not None and new_mark is not None:
+            # From the mark's updated_at itself: a row stamped in the same
+            # instant may sort before the mark's user_id
+            new_rows = list(_rows_after(connection, (mark[0], ""), batch_size))
+            if new_rows:
+                known_ids = _snapshot_ids(path)
+                new_rows = [row for row in new_rows if row[0] not in known_ids]
+            new_rows = [_encode(row) for row in new_rows]
+        else:
+            new_rows = list(_missing_rows(connection, _snapshot_ids(path), batch_size))
+    if new_mark is None:
+        new_mark = mark
+    if not new_rows:
+        if new_mark != mark and header_size == HEADER_SIZE:
+            with open(path, "r+b") as f:
+                f.write(_pack_header(name_width, email_width, count, new_mark))
+                f.flush()
+                os.fsync(f.fileno())
+        return 0
+
+    needed_name = max(len(row[1]) for row in new_rows)
+    needed_email = max(len(row[2]) for row in new_rows)
+    # A version 1 header has no room for the high-water mark either
+    if needed_name > name_width or needed_email > email_width or header_size != HEADER_SIZE:
+        with Snapshot(path) as snapshot:
+            old_rows = [_encode(tuple(user.values())) for user in snapshot.stream_users()]
+        _write(path, old_rows + new_rows,
+               max(name_width, needed_name), max(email_width, needed_email), new_mark)
+        return len(new_rows)
+
+    record = _record_struct(name_width, email_width)
+    with open(path, "r+b") as f:
+        f.seek(HEADER_SIZE + count * record.size)
+        for row in new_rows:
+            f.write(record.pack(*row))
+        f.truncate()
+        # The records reach the disk before the row count that covers
+        # them, so a crash leaves the previous snapshot readable
+        f.flush()
+        os.fsync(f.fileno())
+        f.seek(0)
+        f.write(_pack_header(name_width, email_width, count + len(new_rows), new_mark))
+        f.flush()
+        os.fsync(f.fileno())
+    return len(new_rows)
+
+
+class Snapshot:
+    """
+    Read-only, memory-mapped view of a snapshot file
+
+    Records are decoded straight from the mapping with struct.unpack_from,
+    so scans never copy the file into Python buffers.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Snapshot file written by export_snapshot
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.name_width, self.email_width, self._count = \
+            HEADER_V1.unpack_from(self._map, 0)
+        if magic != MAGIC or version not in (1, VERSION):
+            self.close()
+            raise ValueError(f"Not a user_data snapshot: {path}")
+        # (updated_at, user_id) high-water of user_data when written, if known
+        self.mark = None
+        self.header_size = HEADER_V1.size
+        if version == VERSION:
+            updated_at, user_id = HEADER.unpack_from(self._map, 0)[-2:]
+            self.header_size = HEADER_SIZE
+            mark = (updated_at.rstrip(b"\0").decode("ascii"),
+                    user_id.rstrip(b"\0").decode("ascii"))
+            # Empty when written without change tracking or from no rows
+            self.mark = mark if mark != ("", "") else None
+        self._record = _record_struct(self.name_width, self.email_width)
+        self._age = struct.Struct("<q")
+        self._age_offset = self._record.size - self._age.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        """Unmap and close the snapshot file"""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def _decode(self, index):
+        user_id, name, email, age = self._record.unpack_from(
+            self._map, self.header_size + index * self._record.size)
+        return {
+            "user_id": user_id.rstrip(b"\0").decode("ascii"),
+            "name": name.rstrip(b"\0").decode("utf-8"),
+            "email": email.rstrip(b"\0").decode("utf-8"),
+            "age": age,
+        }
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("snapshot index out of range")
+        return self._decode(index)
+
+    def user_ids(self):
+        """
+        Generator that yields every user_id in the snapshot
+
+        Yields:
+            str: user_id
+        """
+        for index in range(self._count):
+            offset = self.header_size + index * self._record.size
+            yield self._map[offset:offset + USER_ID_WIDTH].rstrip(b"\0").decode("ascii")
+
+    def stream_users(self):
+        """
+        Generator that streams users from the snapshot one by one
+
+        Yields:
+            dict: User record
+        """
+        for index in range(self._count):
+            yield self._decode(index)
+
+    def stream_user_ages(self):
+        """
+        Generator that yields user ages one by one
+
+        Yields:
+            int: User age
+        """
+        offset = self.header_size + self._age_offset
+        for _ in range(self._count):
+            yield self._age.unpack_from(self._map, offset)[0]
+            offset += self._record.size
+
+    def stream_users_in_batches(self, batch_size):
+        """
+        Generator that yields users from the snapshot in batches
+
+        Args:
+            batch_size (int): Number of users per batch
+
+        Yields:
+            list: Batch of user records
+        """
+        for start in range(0, self._count, batch_size):
+            stop = min(start + batch_size, self._count)
+            yield [self._decode(index) for index in range(start, stop)]
+
+
+def main():
+    """
+    Export or refresh a snapshot from the command line
+    """
+    parser = argparse.ArgumentParser(description="user_data snapshots")
+    parser.add_argument("command", choices=("export", "refresh"))
+    parser.add_argument("path")
+    args = parser.parse_args()
+    if args.command == "export":
+        print(f"Exported {export_snapshot(args.path)} rows to {args.path}")
+    else:
+        print(f"Appended {refresh_snapshot(args.path)} rows to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+#!/usr/bin/python3
+"""
+One-pass streaming statistics over user ages
+
+Computes count, mean, variance (Welford), min/max and approximate
+percentiles (a merging t-digest) in a single scan of stream_user_ages with
+bounded memory, or pushes COUNT/AVG/MIN/MAX down to SQL when exact
+aggregates are all that is needed.
+"""
+
+import math
+
+import connection_pool
+import seed
+
+stream_user_ages = __import__('4-stream_ages').stream_user_ages
+
+
+class TDigest:
+    """
+    Merging t-digest for approximate quantiles in bounded memory
+
+    Values are buffered and periodically merged into a sorted list of
+    centroids whose size limit is smallest at the tails, so extreme
+    percentiles stay accurate while the digest keeps O(compression)
+    centroids however many values are added.
+    """
+
+    def __init__(self, compression=100):
+        """
+        Args:
+            compression (int): Accuracy/size trade-off, higher is more
+                accurate and keeps more centroids
+        """
+        self.compression = compression
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._centroids = []
+        self._buffer = []
+
+    def add(self, value, weight=1):
+        """
+        Add a value to the digest
+
+        Args:
+            value (float): The value to add
+            weight (int): How many times the value was observed
+        """
+        self._buffer.append((value, weight))
+        self.count += weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self._buffer) >= self.compression * 10:
+            self._compress()
+
+    def merge(self, other):
+        """
+        Fold another digest into this one
+
+        Args:
+            other (TDigest): Digest built over a different set of values
+        """
+        other._compress()
+        self._buffer.extend(other._centroids)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+    def _scale(self, q):
+        """k1 scale function: centroids span at most 1 unit of k"""
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _scale_inverse(self, k):
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(2 * math.pi * k / self.compression) + 1) / 2
+
+    def _compress(self):
+        """Merge buffered values into the sorted centroid list"""
+        if not self._buffer:
+            return
+        items = sorted(self._centroids + self._buffer)
+        self._buffer = []
+        merged = []
+        mean, weight = items[0]
+        weight_before = 0
+        q_limit = self._scale_inverse(self._scale(0) + 1)
+        for next_mean, next_weight in items[1:]:
+            if (weight_before + weight + next_weight) / self.count <= q_limit:
+                weight += next_weight
+                mean += (next_mean - mean) * next_weight / weight
+            else:
+                merged.append((mean, weight))
+                weight_before += weight
+                q_limit = self._scale_inverse(self._scale(weight_before / self.count) + 1)
+                mean, weight = next_mean, next_weight
+        merged.append((mean, weight))
+        self._centroids = merged
+
+    def quantile(self, q):
+        """
+        Estimate the value at quantile q
+
+        Args:
+            q (float): Quantile between 0 and 1
+
+        Returns:
+            float: Estimated value, or None if the digest is empty
+        """
+        if not 0 <= q <= 1:
+            raise ValueError(f"Quantile must be between 0 and 1: {q}")
+        self._compress()
+        if not self._centroids:
+            return None
+        target = q * self.count
+        # Interpolate between centroid centres, anchored at min and max
+        previous_position, previous_mean = 0.0, self.min
+        cumulative = 0
+        for mean, weight in self._centroids:
+            position = cumulative + weight / 2
+            if target <= position:
+                if position == previous_position:
+                    return mean
+                fraction = (target - previous_position) / (position - previous_position)
+                return previous_mean + fraction * (mean - previous_mean)
+            previous_position, previous_mean = position, mean
+            cumulative += weight
+        if self.count == previous_position:
+            return self.max
+        fraction = (target - previous_position) / (self.count - previous_position)
+        return previous_mean + fraction * (self.max - previous_mean)
+
+
+class StreamingStats:
+    """
+    Single-pass count, mean, variance, min/max and percentile accumulator
+
+    Mean and variance use Welford's algorithm, which stays numerically
+    stable on long streams; two accumulators can be merged, so partial
+    results from separate scans combine exactly.
+    """
+
+    def __init__(self, compression=100):
+        """
+        Args:
+            compression (int): t-digest compression used for percentiles
+        """
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+        self.digest = TDigest(compression)
+
+    def add(self, value):
+        """
+        Add one observation
+
+        Args:
+            value (number): The observation (Decimal values are accepted)
+        """
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.digest.add(value)
+
+    def update(self, values):
+        """
+        Add every observation from an iterable
+
+        Args:
+            values (iterable): Observations to add
+
+        Returns:
+            StreamingStats: self, to allow chaining
+        """
+        for value in values:
+            self.add(value)
+        return self
+
+    def merge(self, other):
+        """
+        Combine another accumulator into this one (Chan et al.)
+
+        Args:
+            other (StreamingStats): Accumulator over a disjoint stream
+        """
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.mean, self._m2 = other.mean, other._m2
+        else:
+            total = self.count + other.count
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / total
+            self._m2 += other._m2 + delta * delta * self.count * other.count / total
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.digest.merge(other.digest)
+
+    @property
+    def variance(self):
+        """Population variance, or None when no values were seen"""
+        return self._m2 / self.count if self.count else None
+
+    @property
+    def sample_variance(self):
+        """Sample (n - 1) variance, or None with fewer than two values"""
+        return self._m2 / (self.count - 1) if self.count > 1 else None
+
+    @property
+    def stddev(self):
+        """Population standard deviation, or None when empty"""
+        variance = self.variance
+        return math.sqrt(variance) if variance is not None else None
+
+    def percentile(self, q):
+        """
+        Approximate percentile from the t-digest
+
+        Args:
+            q (float): Quantile between 0 and 1
+
+        Returns:
+            float: Estimated value, or None when empty
+        """
+        return self.digest.quantile(q)
+
+    def summary(self, percentiles=(0.5, 0.9, 0.99)):
+        """
+        Return all statistics as a dictionary
+
+        Args:
+            percentiles (tuple): Quantiles to estimate
+
+        Returns:
+            dict: count, mean, variance, stddev, min, max and percentiles
+        """
+        return {
+            "count": self.count,
+            "mean": self.mean if self.count else None,
+            "variance": self.variance,
+            "stddev": self.stddev,
+            "min": self.min,
+            "max": self.max,
+            "percentiles": {q: self.percentile(q) for q in percentiles},
+        }
+
+
+def age_stats_sql(connection=None):
+    """
+    Exact aggregates computed by the database in a single query
+
+    Args:
+        connection: Open connection, or None to borrow one from the pool
+
+    Returns:
+        dict: count, mean, variance, stddev, min and max of user ages
+    """
+    if connection is None:
+        with connection_pool.pooled_connection() as connection:
+            return age_stats_sql(connection)
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT COUNT(age), AVG(age), MIN(age), MAX(age), SUM(age * age) "
+        "FROM user_data")
+    count, mean, minimum, maximum, sum_squares = cursor.fetchone()
+    cursor.close()
+
+    if not count:
+        return {"count": 0, "mean": None, "variance": None, "stddev": None,
+                "min": None, "max": None}
+    mean = float(mean)
+    variance = max(float(sum_squares) / count - mean * mean, 0.0)
+    return {
+        "count": count,
+        "mean": mean,
+        "variance": variance,
+        "stddev": math.sqrt(variance),
+        "min": float(minimum),
+        "max": float(maximum),
+    }
+
+
+def age_stats_materialized(connection=None):
+    """
+    Count, mean and variance read from the maintained aggregate in O(1)
+
+    Args:
+        connection: Open connection, or None to borrow one from the pool
+
+    Returns:
+        dict: count, mean, variance and stddev of user ages
+    """
+    if connection is None:
+        with connection_pool.pooled_connection() as connection:
+            return age_stats_materialized(connection)
+    count, total, sum_squares = seed.read_age_aggregate(connection)
+    if not count:
+        return {"count": 0, "mean": None, "variance": None, "stddev": None}
+    mean = float(total) / count
+    variance = max(float(sum_squares) / count - mean * mean, 0.0)
+    return {
+        "count": count,
+        "mean": mean,
+        "variance": variance,
+        "stddev": math.sqrt(variance),
+    }
+
+
+def age_stats(mode="stream", percentiles=(0.5, 0.9, 0.99), compression=100):
+    """
+    Statistics over every user age
+
+    Args:
+        mode (str): "stream" for a single pass over stream_user_ages with
+            approximate percentiles, "sql" to push exact COUNT/AVG/MIN/MAX
+            down to the database (no percentiles), or "materialized" to
+            read count, mean and variance from seed.create_age_aggregate
+            in constant time
+        percentiles (tuple): Quantiles to estimate in stream mode
+        compression (int): t-digest compression in stream mode
+
+    Returns:
+        dict: The computed statistics
+    """
+    if mode == "sql":
+        return age_stats_sql()
+    if mode == "materialized":
+        return age_stats_materialized()
+    if mode != "stream":
+        raise ValueError(f"Unknown statistics mode: {mode!r}")
+    stats = StreamingStats(compression).update(stream_user_ages())
+    return stats.summary(percentiles)
+
+
+def main():
+    """
+    Print age statistics computed in a single streaming pass
+    """
+    for name, value in age_stats().items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
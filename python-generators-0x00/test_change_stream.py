@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Unit tests for the change_stream module."""
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import change_stream
+import connection_pool
+import seed
+
+# Fixed updated_at stamps, so the overlap arithmetic does not depend on now
+T0 = "2020-01-01 00:00:00.000"
+T10 = "2020-01-01 00:00:10.000"
+T60 = "2020-01-01 00:01:00.000"
+T90 = "2020-01-01 00:01:30.000"
+T120 = "2020-01-01 00:02:00.000"
+
+
+class TestChangesQuery(unittest.TestCase):
+    """Test cases for changes_query."""
+
+    def test_first_run(self):
+        """Test that a first run reads up to the cutoff only."""
+        query = change_stream.changes_query(10)
+        self.assertIn("WHERE updated_at <= %s ORDER BY updated_at, user_id", query)
+        self.assertNotIn("stream_seen", query)
+
+    def test_skip_seen_in_sql(self):
+        """Test that acknowledged rows are left out by the database."""
+        query = change_stream.changes_query(10, (T0, ""), skip_seen=True)
+        self.assertEqual(query.count("%s"), 5)
+        self.assertIn("NOT EXISTS (SELECT 1 FROM stream_seen WHERE consumer = %s", query)
+
+
+class TestStreamChanges(unittest.TestCase):
+    """Test cases for stream_changes on the SQLite stand-in."""
+
+    def setUp(self):
+        """Create a tracked user_data table and a pool connecting to it."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "prodev.db")
+        pool = connection_pool.ConnectionPool(lambda: seed.connect_sqlite(path))
+        patcher = patch.object(connection_pool, "_pool", pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(pool.close)
+        with pool.connection() as connection, \
+                contextlib.redirect_stdout(io.StringIO()):
+            seed.create_table(connection)
+            seed.enable_change_tracking(connection)
+        self.stamp(a=T0, b=T60, c=T120)
+
+    def stamp(self, **stamps):
+        """Write users (by id) and set their updated_at."""
+        with connection_pool.pooled_connection() as connection:
+            cursor = connection.cursor()
+            for user_id, updated_at in stamps.items():
+                cursor.execute(
+                    "INSERT OR IGNORE INTO user_data (user_id, name, email, age) "
+                    "VALUES (%s, %s, %s, %s)", (user_id, user_id, user_id, 30))
+                cursor.execute("UPDATE user_data SET updated_at = %s WHERE user_id = %s",
+                               (updated_at, user_id))
+            connection.commit()
+            cursor.close()
+
+    def stream(self, ack=True):
+        """Run the consumer once and return the user_ids it received."""
+        received = []
+        for batch in change_stream.stream_changes(
+                "test", batch_size=2, settle_seconds=0, overlap_seconds=90,
+                row_format="tuple"):
+            received += [row[0] for row in batch]
+            if ack:
+                batch.ack()
+        return received
+
+    def seen(self):
+        """Return the positions remembered in stream_seen."""
+        with connection_pool.pooled_connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("SELECT updated_at, user_id FROM stream_seen "
+                           "ORDER BY updated_at")
+            rows = [tuple(row) for row in cursor.fetchall()]
+            cursor.close()
+        return rows
+
+    def test_acknowledged_rows_not_repeated(self):
+        """Test that a re-run skips the acknowledged overlap."""
+        self.assertEqual(self.stream(), ["a", "b", "c"])
+        self.assertEqual(change_stream.read_watermark("test"), (T120, "c"))
+        self.assertEqual(self.stream(), [])
+
+    def test_unacknowledged_batches_repeated(self):
+        """Test that a consumer that did not ack gets the rows again."""
+        self.assertEqual(self.stream(ack=False), ["a", "b", "c"])
+        self.assertIsNone(change_stream.read_watermark("test"))
+        self.assertEqual(self.stream(), ["a", "b", "c"])
+
+    def test_late_commit_in_overlap_delivered(self):
+        """Test that a row landing behind the watermark is still streamed."""
+        self.stream()
+        self.stamp(d=T90, e=T10)
+        # d is within 90 seconds of the watermark, e is not
+        self.assertEqual(self.stream(), ["d"])
+        self.assertEqual(self.stream(), [])
+
+    def test_only_overlap_remembered(self):
+        """Test that stream_seen keeps only positions within the overlap."""
+        self.stream()
+        self.assertEqual(self.seen(), [(T60, "b"), (T120, "c")])
+        self.stamp(f="2020-01-01 00:05:00.000")
+        self.stream()
+        self.assertEqual(self.seen(), [("2020-01-01 00:05:00.000", "f")])
+
+    def test_reset_forgets_seen(self):
+        """Test that resetting the watermark streams everything again."""
+        self.stream()
+        change_stream.write_watermark("test", None)
+        self.assertEqual(self.seen(), [])
+        self.assertEqual(self.stream(), ["a", "b", "c"])
+
+
+if __name__ == '__main__':
+    unittest.main()
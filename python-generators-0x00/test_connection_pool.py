@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Unit tests for the connection_pool module."""
+import threading
+import unittest
+from unittest.mock import Mock
+from connection_pool import ConnectionPool
+
+
+def fake_connection(alive=True):
+    """Return a mock standing in for a MySQL connection."""
+    connection = Mock()
+    connection.is_connected.return_value = alive
+    return connection
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Test cases for the ConnectionPool class."""
+
+    def setUp(self):
+        """Build a pool of two mock connections."""
+        self.connect = Mock(side_effect=lambda: fake_connection())
+        self.pool = ConnectionPool(self.connect, max_size=2)
+
+    def test_reuse(self):
+        """Test that a returned connection is handed out again."""
+        first = self.pool.acquire()
+        self.pool.release(first)
+        self.assertIs(self.pool.acquire(), first)
+        first.rollback.assert_called_once()
+        self.assertEqual(self.connect.call_count, 1)
+        stats = self.pool.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_bounded(self):
+        """Test that borrowers beyond max_size time out."""
+        self.pool.acquire()
+        self.pool.acquire()
+        with self.assertRaises(TimeoutError):
+            self.pool.acquire(timeout=0.05)
+        self.assertEqual(self.pool.stats()["size"], 2)
+
+    def test_waiter_gets_released_connection(self):
+        """Test that a waiting borrower is woken by a release."""
+        first = self.pool.acquire()
+        self.pool.acquire()
+        timer = threading.Timer(0.05, self.pool.release, (first,))
+        timer.start()
+        self.assertIs(self.pool.acquire(timeout=5), first)
+        timer.join()
+
+    def test_overflow(self):
+        """Test that suspended generators beyond max_size do not wait."""
+        held = [self.pool.acquire(timeout=0.05, overflow=True) for _ in range(9)]
+        self.assertEqual(len({id(connection) for connection in held}), 9)
+        stats = self.pool.stats()
+        self.assertEqual((stats["size"], stats["overflow"], stats["dedicated"]), (2, 7, 7))
+        for connection in held:
+            self.pool.release(connection)
+        stats = self.pool.stats()
+        self.assertEqual((stats["idle"], stats["dedicated"]), (2, 0))
+        self.assertEqual(sum(connection.close.called for connection in held), 7)
+
+    def test_generators_beyond_max_size(self):
+        """Test that nine suspended generators can all hold a connection."""
+        def rows():
+            with self.pool.connection(overflow=True) as connection:
+                yield connection
+
+        generators = [rows() for _ in range(9)]
+        for generator in generators:
+            next(generator)
+        for generator in generators:
+            generator.close()
+        self.assertEqual(self.pool.stats()["dedicated"], 0)
+
+    def test_connect_raises(self):
+        """Test that a failed connect gives its slot back."""
+        self.connect.side_effect = [OSError("refused"), fake_connection(), fake_connection()]
+        with self.assertRaises(OSError):
+            self.pool.acquire()
+        self.pool.acquire(timeout=0.05)
+        self.pool.acquire(timeout=0.05)
+        self.assertEqual(self.pool.stats()["size"], 2)
+
+    def test_connect_returns_none(self):
+        """Test that connect returning None gives its slot back."""
+        self.connect.side_effect = [None, fake_connection()]
+        self.assertIsNone(self.pool.acquire())
+        self.assertEqual(self.pool.stats()["size"], 0)
+
+    def test_dead_connection_replaced(self):
+        """Test that an idle connection failing its ping is closed."""
+        pool = ConnectionPool(self.connect, max_size=1, ping_after=0)
+        dead = pool.acquire()
+        dead.is_connected.return_value = False
+        pool.release(dead)
+        replacement = pool.acquire(timeout=0.05)
+        self.assertIsNot(replacement, dead)
+        dead.close.assert_called_once()
+        self.assertEqual(pool.stats()["closed_dead"], 1)
+
+    def test_discard_on_error(self):
+        """Test that a connection is discarded when the with block raises."""
+        with self.assertRaises(ValueError):
+            with self.pool.connection() as connection:
+                raise ValueError("boom")
+        connection.close.assert_called_once()
+        self.assertEqual(self.pool.stats()["size"], 0)
+
+    def test_close_outside_lock(self):
+        """Test that connections are closed without holding the pool lock."""
+        pool = ConnectionPool(self.connect, max_size=1, idle_timeout=0)
+        connection = pool.acquire()
+        other = threading.Thread(target=pool.stats)
+
+        def close():
+            other.start()
+            other.join(1)
+
+        connection.close.side_effect = close
+        pool.release(connection)
+        pool.acquire()
+        self.assertFalse(other.is_alive())
+        self.assertEqual(pool.stats()["closed_idle"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Unit tests for the 2-lazy_paginate module and its async counterpart."""
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+from parameterized import parameterized
+import async_streams
+import seed
+
+lazy = __import__('2-lazy_paginate')
+
+
+def rows(*user_ids):
+    """Return user rows with the given ids."""
+    return [{"user_id": user_id, "name": "n", "email": "e", "age": 30}
+            for user_id in user_ids]
+
+
+class TestLazyPaginate(unittest.TestCase):
+    """Test cases for lazy_paginate."""
+
+    def test_offset_pages_have_no_cursor(self):
+        """Test that offset pages carry no keyset token."""
+        pages = [rows("a", "b"), rows("c"), []]
+        with patch.object(lazy, "paginate_users", side_effect=pages):
+            result = list(lazy.lazy_paginate(2))
+        self.assertEqual([len(page) for page in result], [2, 1])
+        self.assertTrue(all(page.next_cursor is None for page in result))
+
+    def test_keyset_pages_resume(self):
+        """Test that keyset pages carry the token of their last row."""
+        pages = [lazy.Page(rows("a", "b"), seed.encode_cursor("b")), lazy.Page([])]
+        with patch.object(lazy, "paginate_users_after", side_effect=pages) as after:
+            result = list(lazy.lazy_paginate(2, mode="keyset"))
+        self.assertEqual(seed.decode_cursor(result[0].next_cursor), "b")
+        self.assertEqual(after.call_args_list[1].args[1], result[0].next_cursor)
+
+    def test_cursor_needs_keyset_mode(self):
+        """Test that a token cannot be used in offset mode."""
+        with self.assertRaises(ValueError):
+            next(lazy.lazy_paginate(2, cursor=seed.encode_cursor("a")))
+
+
+class TestLazyPaginateAsync(unittest.TestCase):
+    """Test cases for the pages of lazy_paginate_async."""
+
+    def pages(self, mode):
+        """Collect the pages _pages yields over a fake connection."""
+        connection = AsyncMock()
+        connection.fetchall.side_effect = [rows("a", "b"), rows("c"), []]
+
+        async def collect():
+            return [page async for page in async_streams._pages(connection, 2, mode, None)]
+
+        return asyncio.run(collect())
+
+    @parameterized.expand([
+        ("offset", [None, None]),
+        ("keyset", ["b", "c"]),
+    ])
+    def test_next_cursor(self, mode, expected):
+        """Test that only keyset pages carry a resumable token."""
+        cursors = [seed.decode_cursor(page.next_cursor) for page in self.pages(mode)]
+        self.assertEqual(cursors, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
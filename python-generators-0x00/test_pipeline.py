@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Unit tests for the pipeline module."""
+import unittest
+from unittest.mock import MagicMock, patch
+from parameterized import parameterized
+from pipeline import users
+
+
+class TestCompile(unittest.TestCase):
+    """Test cases for Pipeline.compile."""
+
+    def test_where_and_select_are_pushed_down(self):
+        """Test that leading where and select stages become SQL."""
+        query, params, stages = users().where("age", ">", 25) \
+            .select("user_id", "name").compile()
+        self.assertEqual(
+            query, "SELECT user_id, name FROM user_data WHERE (age > %s)")
+        self.assertEqual(params, (25,))
+        self.assertEqual(stages, ())
+
+    def test_where_on_unselected_column(self):
+        """Test that a where on a column dropped by select still runs."""
+        query, params, stages = users().select("name") \
+            .where("age", ">", 25).compile()
+        self.assertEqual(query, "SELECT name FROM user_data WHERE (age > %s)")
+        self.assertEqual(params, (25,))
+        self.assertEqual(stages, ())
+
+    def test_where_after_filter_is_pushed_down(self):
+        """Test that a where behind a callable predicate still goes to SQL."""
+        predicate = bool
+        query, params, stages = users().where(predicate) \
+            .where("email", "=", "a@b.c").compile()
+        self.assertEqual(query, "SELECT user_id, name, email, age "
+                                "FROM user_data WHERE (email = %s)")
+        self.assertEqual(stages, (("filter", predicate),))
+
+    def test_select_after_filter_stays_client_side(self):
+        """Test that a select does not drop columns a predicate reads."""
+        predicate = bool
+        query, _, stages = users().where(predicate).select("name").compile()
+        self.assertEqual(query, "SELECT user_id, name, email, age FROM user_data")
+        self.assertEqual(stages, (("filter", predicate), ("select", ("name",))))
+
+    def test_where_after_map_stays_client_side(self):
+        """Test that a where on mapped items is not pushed down."""
+        query, params, stages = users().map(dict) \
+            .where("age", "<", 30).compile()
+        self.assertNotIn("WHERE", query)
+        self.assertEqual(params, ())
+        self.assertEqual(stages, (("map", dict), ("where", ("age", "<", 30))))
+
+    @parameterized.expand([
+        ([1, 2], "(age IN (%s, %s))", (1, 2)),
+        ([], "(1 = 0)", ()),
+    ])
+    def test_in(self, options, condition, params):
+        """Test that in lists compile to IN, and an empty one to no rows."""
+        query, compiled, _ = users().where("age", "in", options).compile()
+        self.assertTrue(query.endswith("WHERE " + condition))
+        self.assertEqual(compiled, params)
+
+    def test_select_without_columns(self):
+        """Test that select with no columns is rejected."""
+        with self.assertRaises(ValueError):
+            users().select()
+
+    def test_select_of_dropped_column(self):
+        """Test that selecting a column an earlier select dropped fails."""
+        with self.assertRaises(ValueError):
+            users().select("name").select("age").compile()
+
+    @parameterized.expand([
+        ("where", ("password", "=", "x")),
+        ("select", ("password",)),
+    ])
+    def test_unknown_column(self, method, args):
+        """Test that columns outside user_data are rejected."""
+        with self.assertRaises(ValueError):
+            getattr(users(), method)(*args)
+
+
+class TestRows(unittest.TestCase):
+    """Test cases for running a pipeline."""
+
+    def setUp(self):
+        """Patch the pool with a connection serving two rows."""
+        self.cursor = MagicMock()
+        self.cursor.fetchmany.side_effect = [
+            [{"name": "a", "age": 30}, {"name": "b", "age": 40}], []]
+        connection = MagicMock()
+        connection.cursor.return_value = self.cursor
+        patcher = patch("pipeline.connection_pool.pooled_connection")
+        self.pooled_connection = patcher.start()
+        self.pooled_connection.return_value.__enter__.return_value = connection
+        self.addCleanup(patcher.stop)
+
+    def test_client_stages(self):
+        """Test that client-side stages run over the fetched rows."""
+        result = list(users().where(lambda row: row["age"] > 35).select("name"))
+        self.assertEqual(result, [{"name": "b"}])
+
+    def test_cursor_closed_when_abandoned(self):
+        """Test that the cursor is closed when iteration stops early."""
+        items = iter(users())
+        next(items)
+        items.close()
+        self.cursor.close.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Unit tests for the seed module."""
+import itertools
+import unittest
+import uuid
+from seed import generate_users
+
+
+class TestGenerateUsers(unittest.TestCase):
+    """Test cases for generate_users."""
+
+    def users(self, count, **options):
+        """Return the generated rows as one list."""
+        return list(itertools.chain.from_iterable(generate_users(count, **options)))
+
+    def test_user_ids_are_version_4_uuids(self):
+        """Test that every user_id is a valid random UUID."""
+        users = self.users(2000, random_seed=1)
+        for user_id, _, _, _ in users:
+            parsed = uuid.UUID(user_id)
+            self.assertEqual(str(parsed), user_id)
+            self.assertEqual(parsed.version, 4)
+            self.assertEqual(parsed.variant, uuid.RFC_4122)
+        # The variant digit does not follow the last digit of the id
+        pairs = {(user_id[19], user_id[-1]) for user_id, _, _, _ in users}
+        self.assertEqual(len(pairs), 4 * 16)
+
+    def test_repeatable(self):
+        """Test that the same seed gives the same rows."""
+        self.assertEqual(self.users(100, random_seed=7), self.users(100, random_seed=7))
+        self.assertNotEqual(self.users(100, random_seed=7), self.users(100, random_seed=8))
+
+    def test_chunks_and_unique_emails(self):
+        """Test chunk sizes and that emails are unique."""
+        chunks = list(generate_users(25, random_seed=1, chunk_size=10, start=5))
+        self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 5])
+        emails = [row[2] for chunk in chunks for row in chunk]
+        self.assertEqual(len(set(emails)), 25)
+        self.assertTrue(emails[0].split("@")[0].endswith("5"))
+
+
+if __name__ == '__main__':
+    unittest.main()
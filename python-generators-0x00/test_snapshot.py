@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Unit tests for the snapshot module."""
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import connection_pool
+import seed
+import snapshot
+
+
+class TestSnapshot(unittest.TestCase):
+    """Test cases for export_snapshot, refresh_snapshot and Snapshot."""
+
+    def setUp(self):
+        """Create a tracked user_data table and a pool connecting to it."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        database = os.path.join(directory.name, "prodev.db")
+        self.path = os.path.join(directory.name, "users.snap")
+        pool = connection_pool.ConnectionPool(lambda: seed.connect_sqlite(database))
+        patcher = patch.object(connection_pool, "_pool", pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(pool.close)
+        with pool.connection() as connection, \
+                contextlib.redirect_stdout(io.StringIO()):
+            seed.create_table(connection)
+            seed.enable_change_tracking(connection)
+        self.insert("b", "c")
+
+    def insert(self, *user_ids, name="user"):
+        """Insert users named after their ids."""
+        with connection_pool.pooled_connection() as connection:
+            cursor = connection.cursor()
+            cursor.executemany(
+                "INSERT INTO user_data (user_id, name, email, age) "
+                "VALUES (%s, %s, %s, %s)",
+                [(user_id, name, f"{user_id}@example.com", 30) for user_id in user_ids])
+            connection.commit()
+            cursor.close()
+
+    def user_ids(self):
+        """Return the user_ids in the snapshot file."""
+        with snapshot.Snapshot(self.path) as snap:
+            return list(snap.user_ids())
+
+    def test_export_and_read(self):
+        """Test that an export reads back through every interface."""
+        self.assertEqual(snapshot.export_snapshot(self.path), 2)
+        with snapshot.Snapshot(self.path) as snap:
+            self.assertEqual(len(snap), 2)
+            self.assertEqual(snap[0]["email"], "b@example.com")
+            self.assertEqual(list(snap.stream_user_ages()), [30, 30])
+            self.assertIsNotNone(snap.mark)
+
+    def test_refresh_reads_past_the_high_water_mark(self):
+        """Test that a tracked refresh skips the full user_id comparison."""
+        snapshot.export_snapshot(self.path)
+        # A random user_id can sort before every exported one
+        self.insert("a")
+        with patch.object(snapshot, "_missing_rows") as missing_rows:
+            self.assertEqual(snapshot.refresh_snapshot(self.path), 1)
+            self.assertEqual(snapshot.refresh_snapshot(self.path), 0)
+        missing_rows.assert_not_called()
+        self.assertEqual(self.user_ids(), ["b", "c", "a"])
+
+    def test_changed_rows_not_appended(self):
+        """Test that a row changed since the export is not appended again."""
+        snapshot.export_snapshot(self.path)
+        with connection_pool.pooled_connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("UPDATE user_data SET age = 31 WHERE user_id = 'b'")
+            connection.commit()
+            cursor.close()
+        self.assertEqual(snapshot.refresh_snapshot(self.path), 0)
+        self.assertEqual(self.user_ids(), ["b", "c"])
+
+    def test_refresh_widens_columns(self):
+        """Test that a wider name rewrites the file with wider columns."""
+        snapshot.export_snapshot(self.path)
+        self.insert("d", name="a much longer name")
+        self.assertEqual(snapshot.refresh_snapshot(self.path), 1)
+        with snapshot.Snapshot(self.path) as snap:
+            self.assertEqual(snap[2]["name"], "a much longer name")
+
+    def test_data_synced_before_header(self):
+        """Test that appended records are on disk before the new count."""
+        snapshot.export_snapshot(self.path)
+        self.insert("d")
+        counts = []
+
+        def fsync(fd):
+            with snapshot.Snapshot(self.path) as snap:
+                counts.append(len(snap))
+
+        with patch.object(snapshot.os, "fsync", side_effect=fsync):
+            snapshot.refresh_snapshot(self.path)
+        self.assertEqual(counts, [2, 3])
+
+    def test_untracked_table_compares_ids(self):
+        """Test that without change tracking every user_id is compared."""
+        with patch.object(snapshot, "_high_water", return_value=None):
+            snapshot.export_snapshot(self.path)
+            self.insert("a")
+            self.assertEqual(snapshot.refresh_snapshot(self.path), 1)
+        self.assertEqual(self.user_ids(), ["b", "c", "a"])
+
+
+if __name__ == '__main__':
+    unittest.main()
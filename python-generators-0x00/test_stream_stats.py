@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Unit tests for the stream_stats module."""
+import random
+import statistics
+import unittest
+from parameterized import parameterized
+from stream_stats import StreamingStats, TDigest
+
+
+def exact_quantile(values, q):
+    """Return the quantile of sorted values by nearest rank."""
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class TestTDigest(unittest.TestCase):
+    """Test cases for the TDigest class."""
+
+    def setUp(self):
+        """Build a digest over a skewed sample."""
+        rng = random.Random(12)
+        self.values = sorted(rng.expovariate(0.05) for _ in range(50000))
+        self.digest = TDigest(compression=100)
+        for value in self.values:
+            self.digest.add(value)
+
+    @parameterized.expand([(0.01,), (0.1,), (0.5,), (0.9,), (0.99,), (0.999,)])
+    def test_quantile_accuracy(self, q):
+        """Test that quantiles stay within a small rank error."""
+        estimate = self.digest.quantile(q)
+        lower = exact_quantile(self.values, max(0.0, q - 0.005))
+        upper = exact_quantile(self.values, min(1.0, q + 0.005))
+        self.assertGreaterEqual(estimate, lower)
+        self.assertLessEqual(estimate, upper)
+
+    def test_extremes(self):
+        """Test that quantiles 0 and 1 are the exact min and max."""
+        self.assertEqual(self.digest.quantile(0), self.values[0])
+        self.assertEqual(self.digest.quantile(1), self.values[-1])
+
+    def test_bounded_size(self):
+        """Test that the centroid count stays O(compression)."""
+        self.digest.quantile(0.5)
+        self.assertLess(len(self.digest._centroids), 2 * self.digest.compression)
+
+    def test_merge(self):
+        """Test that merged digests match one built over all values."""
+        left, right = TDigest(), TDigest()
+        for index, value in enumerate(self.values):
+            (left if index % 2 else right).add(value)
+        left.merge(right)
+        self.assertEqual(left.count, len(self.values))
+        self.assertAlmostEqual(left.quantile(0.5), self.digest.quantile(0.5),
+                               delta=0.01 * self.digest.quantile(0.5))
+
+    def test_empty(self):
+        """Test that an empty digest has no quantiles."""
+        self.assertIsNone(TDigest().quantile(0.5))
+
+    @parameterized.expand([(-0.1,), (1.5,)])
+    def test_invalid_quantile(self, q):
+        """Test that quantiles outside [0, 1] are rejected."""
+        with self.assertRaises(ValueError):
+            self.digest.quantile(q)
+
+
+class TestStreamingStats(unittest.TestCase):
+    """Test cases for the StreamingStats class."""
+
+    def test_matches_statistics_module(self):
+        """Test that Welford mean and variance match exact results."""
+        rng = random.Random(3)
+        values = [rng.uniform(18, 90) for _ in range(1000)]
+        stats = StreamingStats().update(values)
+        self.assertGreater(statistics.pvariance(values), 100)
+        self.assertAlmostEqual(stats.mean, statistics.fmean(values))
+        self.assertAlmostEqual(stats.variance, statistics.pvariance(values))
+        self.assertAlmostEqual(stats.sample_variance, statistics.variance(values))
+
+    def test_merge(self):
+        """Test that merging partial accumulators is exact."""
+        values = list(range(1, 101))
+        whole = StreamingStats().update(values)
+        part = StreamingStats().update(values[:30])
+        part.merge(StreamingStats().update(values[30:]))
+        self.assertEqual(part.count, whole.count)
+        self.assertAlmostEqual(part.mean, whole.mean)
+        self.assertAlmostEqual(part.variance, whole.variance)
+        self.assertEqual((part.min, part.max), (1, 100))
+
+
+if __name__ == '__main__':
+    unittest.main()